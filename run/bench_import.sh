@@ -0,0 +1,2 @@
+# fail when importing the run entry pulls torch/transformers/nltk or exceeds the startup budget
+python ./src/bench_import.py --budget 2.0 --repeat 3
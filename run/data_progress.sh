@@ -0,0 +1,9 @@
+source .env
+
+db_mode=$DB_MODE
+db_path=$DB_ROOT
+
+# artifacts go to $ARTIFACT_CACHE_DIR (read by the main run as well), extra flags e.g. --force / --no_values
+python ./src/process.py --data_mode "$db_mode" \
+                        --data_path "$db_path" \
+                        "$@"
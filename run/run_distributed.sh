@@ -0,0 +1,32 @@
+source .env
+
+db_mode=$DB_MODE
+db_path=$DB_ROOT
+model_path=$MODEL_PATH
+schema_generator=$SCHEMA_GENERATOR
+
+# usage: bash run/run_distributed.sh [local workers, default 2]
+# every machine runs this script against the same QUEUE_PATH (shared filesystem); the workers pull tasks from
+# the queue and write result/<output_name>/original_result.<worker>.json, the shards are merged once all finished
+queue=${QUEUE_PATH:-./result/queue.sqlite}
+workers=${1:-2}
+
+export TRANSFORMERS_NO_TQDM=1
+export HF_HUB_DISABLE_PROGRESS_BARS=1
+
+for i in $(seq 1 "$workers"); do
+    python ./src/main.py --data_mode "$db_mode" \
+                         --data_path "$db_path" \
+                         --model_path "$model_path" \
+                         --schema_generator "$schema_generator" \
+                         --queue "$queue" \
+                         --worker_id "$(hostname)-$i" &
+done
+wait
+
+python ./src/main.py --data_mode "$db_mode" \
+                     --data_path "$db_path" \
+                     --model_path "$model_path" \
+                     --schema_generator "$schema_generator" \
+                     --queue "$queue" \
+                     --merge
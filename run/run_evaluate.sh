@@ -0,0 +1,9 @@
+source .env
+
+db_mode=$DB_MODE
+db_path=$DB_ROOT
+predictions=$1
+
+python ./src/evaluate.py --data_mode "$db_mode" \
+                         --data_path "$db_path" \
+                         --predictions "$predictions"
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-19 10:12
+# @Author  : jwm
+# @File    : bench_import.py
+# @description: Guard the startup cost of API-only / evaluation-only runs.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Any
+
+# Entry modules imported by main.py (and later evaluation-only runs) before any model is called.
+ENTRY_MODULES: List[str] = ["runner.run_manager"]
+# Backends that must stay lazy until a local model / the legacy tokenizer is really used.
+FORBIDDEN_MODULES: List[str] = ["torch", "transformers", "nltk"]
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"elapsed": elapsed, "loaded": sorted(m for m in {forbidden!r} if m in sys.modules)}}))
+"""
+
+
+def parse_augements() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="import-time benchmark")
+    parser.add_argument("--budget", type=float, default=2.0, help="max seconds allowed for importing entry modules")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--modules", type=str, nargs="*", default=ENTRY_MODULES)
+    return parser.parse_args()
+
+
+def probe(modules: List[str]) -> Dict[str, Any]:
+    """
+        Import modules in a fresh interpreter and report wall time and forbidden backends loaded.
+    """
+    src_dir: str = os.path.dirname(os.path.abspath(__file__))
+    code: str = _PROBE.format(modules=modules, forbidden=FORBIDDEN_MODULES)
+    out = subprocess.run([sys.executable, "-c", code], cwd=src_dir, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    args: argparse.Namespace = parse_augements()
+    runs: List[Dict[str, Any]] = [probe(args.modules) for _ in range(args.repeat)]
+    best: float = min(run["elapsed"] for run in runs)
+    loaded: List[str] = sorted({m for run in runs for m in run["loaded"]})
+
+    print(f"import {args.modules}: best {best:.3f}s over {args.repeat} runs (budget {args.budget:.3f}s)")
+    failed: bool = False
+    if loaded:
+        print(f"FAIL: heavy backends imported at startup: {loaded}")
+        failed = True
+    if best > args.budget:
+        print("FAIL: startup import exceeded budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
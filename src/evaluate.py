@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-19 11:20
+# @Author  : jwm
+# @File    : evaluate.py
+# @description: Evaluation-only entry, re-score a predictions file without any agent or model.
+
+import argparse
+import json
+import os
+from typing import List, Dict, Any
+
+from loguru import logger
+
+from runner.evaluate import load_predictions
+from runner.rescore import join_predictions, rescore, summarize, save_rescore
+
+
+def parse_augements() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="re-score existing predictions")
+    parser.add_argument("--data_mode", type=str, required=True)
+    parser.add_argument("--data_path", type=str, required=True)
+    parser.add_argument("--predictions", type=str, required=True, help="e.g. ./result/<output_name>/original_result.json")
+    parser.add_argument("--output_dir", type=str, default=None, help="defaults to the predictions folder")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--timeout", type=float, default=30.0, help="per query seconds")
+    parser.add_argument("--quick", action="store_true", help="accept agreements on the downsampled copies (process.py --downsample), final numbers without it")
+    args: argparse.Namespace = parser.parse_args()
+    return args
+
+
+def main() -> None:
+    args: argparse.Namespace = parse_augements()
+
+    with open(os.path.join(args.data_path, f"{args.data_mode}.json"), "r") as f:
+        dataset: List[Dict[str, Any]] = json.load(f)
+    predictions: List[Dict[str, Any]] = load_predictions(args.predictions)
+    items, unmatched = join_predictions(dataset, predictions)
+    logger.info(f"{len(items)} predictions joined with {len(dataset)} tasks, {unmatched} unmatched")
+
+    results: List[Dict[str, Any]] = rescore(items, args.data_path, args.data_mode, args.workers, args.timeout, args.quick)
+    summary: Dict[str, Dict[str, Any]] = summarize(results)
+    output_dir: str = args.output_dir or os.path.dirname(os.path.abspath(args.predictions))
+    save_rescore(output_dir, results, summary)
+
+    for difficulty, row in summary.items():
+        logger.info(f"{difficulty:>12}: {row['correct']}/{row['total']} = {row['accuracy']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
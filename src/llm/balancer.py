@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-21 10:20
+# @Author  : jwm
+# @File    : balancer.py
+# @description: Least-outstanding-requests balancing over the endpoints of one logical model.
+
+import time
+import random
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple, Callable, Generator, Any
+
+from loguru import logger
+
+from runner.enum_aggretion import Model, Endpoint
+from llm.resilience import classify_error
+
+
+class EndpointState:
+    def __init__(self, endpoint: Endpoint) -> None:
+        self.endpoint: Endpoint = endpoint
+        self.outstanding: int = 0
+        self.failures: int = 0          # consecutive failures
+        self.ejections: int = 0         # consecutive ejections, grows the cooldown
+        self.ejected_until: float = 0.0
+        self.trial: bool = False        # a half-open trial request is in flight
+        self.served: int = 0
+
+    def available(self, now: float) -> bool:
+        if self.ejected_until <= 0:
+            return True
+        # cooldown over: one trial request decides whether the endpoint comes back
+        return now >= self.ejected_until and not self.trial
+
+
+class Balancer:
+    """
+        Routes each request to the healthy endpoint with the fewest outstanding requests.
+
+        Attributes:
+            max_failures: consecutive failures before an endpoint is ejected
+            cooldown: first ejection seconds, doubled on each consecutive ejection up to max_cooldown
+    """
+    def __init__(
+            self,
+            endpoints: List[Endpoint],
+            max_failures: int = 3,
+            cooldown: float = 10.0,
+            max_cooldown: float = 300.0
+        ) -> None:
+        if not endpoints:
+            raise ValueError("Balancer needs at least one endpoint")
+        self.states: List[EndpointState] = [EndpointState(e) for e in endpoints]
+        self.max_failures: int = max_failures
+        self.cooldown: float = cooldown
+        self.max_cooldown: float = max_cooldown
+        self._lock = threading.Lock()
+        self._probe_thread: Optional[threading.Thread] = None
+
+    def _pick(self) -> EndpointState:
+        now: float = time.monotonic()
+        candidates: List[EndpointState] = [s for s in self.states if s.available(now)]
+        if not candidates:
+            # every endpoint is ejected: use the one that comes back first rather than failing the run
+            return min(self.states, key=lambda s: (s.ejected_until, s.outstanding))
+        least: int = min(s.outstanding for s in candidates)
+        state: EndpointState = random.choice([s for s in candidates if s.outstanding == least])
+        if state.ejected_until > 0:
+            state.trial = True
+        return state
+
+    @contextmanager
+    def acquire(self) -> Generator[Endpoint, None, None]:
+        """
+            Lease an endpoint for one request, an endpoint related error escaping the block counts against it.
+        """
+        with self._lock:
+            state: EndpointState = self._pick()
+            state.outstanding += 1
+        ok: bool = True
+        try:
+            yield state.endpoint
+        except Exception as e:
+            ok = not _endpoint_fault(e)
+            raise
+        finally:
+            self._report(state, ok)
+
+    def _report(self, state: EndpointState, ok: bool) -> None:
+        with self._lock:
+            state.outstanding -= 1
+            state.trial = False
+            if ok:
+                state.served += 1
+                state.failures = 0
+                state.ejections = 0
+                state.ejected_until = 0.0
+                return
+            state.failures += 1
+            if state.failures >= self.max_failures or state.ejected_until > 0:
+                state.ejections += 1
+                seconds: float = min(self.max_cooldown, self.cooldown * (2 ** (state.ejections - 1)))
+                state.ejected_until = time.monotonic() + seconds
+                state.failures = 0
+                logger.warning(f"Endpoint {state.endpoint.BASE_URL} ejected for {seconds:.0f}s")
+
+    def start_health_checks(self, probe: Callable[[Endpoint], Any], interval: float = 15.0) -> None:
+        """
+            Actively probe ejected endpoints (e.g. list models) and bring them back early on success.
+        """
+        def loop() -> None:
+            while True:
+                time.sleep(interval)
+                with self._lock:
+                    ejected: List[EndpointState] = [s for s in self.states if s.ejected_until > 0]
+                for state in ejected:
+                    try:
+                        probe(state.endpoint)
+                    except Exception:
+                        continue
+                    with self._lock:
+                        state.failures = state.ejections = 0
+                        state.ejected_until = 0.0
+                    logger.info(f"Endpoint {state.endpoint.BASE_URL} healthy again")
+
+        with self._lock:
+            if self._probe_thread is None:
+                self._probe_thread = threading.Thread(target=loop, name="endpoint-health", daemon=True)
+                self._probe_thread.start()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now: float = time.monotonic()
+        with self._lock:
+            return [{
+                "BASE_URL": s.endpoint.BASE_URL,
+                "outstanding": s.outstanding,
+                "served": s.served,
+                "ejected_for": max(0.0, s.ejected_until - now),
+            } for s in self.states]
+
+
+def _endpoint_fault(exc: BaseException) -> bool:
+    # only errors that say something about the endpoint (429, 5xx, timeouts, connection) count against it
+    return classify_error(exc) is not None
+
+
+def model_endpoints(model_info: Model) -> List[Endpoint]:
+    if model_info.endpoints:
+        return list(model_info.endpoints)
+    return [Endpoint(BASE_URL=model_info.BASE_URL, API_KEY=model_info.API_KEY)]
+
+
+_BALANCERS: Dict[Tuple[str, Tuple[Optional[str], ...]], Balancer] = {}
+_BALANCERS_LOCK = threading.Lock()
+
+
+def get_balancer(model_info: Model, probe: Optional[Callable[[Endpoint], Any]] = None) -> Balancer:
+    """
+        Process wide balancer of a logical model (same model_name and endpoint list).
+    """
+    endpoints: List[Endpoint] = model_endpoints(model_info)
+    key = (model_info.model_name, tuple(e.BASE_URL for e in endpoints))
+    with _BALANCERS_LOCK:
+        balancer: Optional[Balancer] = _BALANCERS.get(key)
+        if balancer is None:
+            balancer = Balancer(endpoints)
+            _BALANCERS[key] = balancer
+            if probe is not None and len(endpoints) > 1:
+                balancer.start_health_checks(probe)
+        return balancer
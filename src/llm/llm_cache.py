@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-19 13:40
+# @Author  : jwm
+# @File    : llm_cache.py
+# @description: Persistent LLM response cache (single SQLite file).
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from os import getenv
+from typing import Optional, Dict, Any
+
+from loguru import logger
+
+CACHE_MODES = ("read_write", "read_only", "bypass")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model_name TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed);
+"""
+
+
+class LlmCache:
+    """
+        Disk-backed response cache keyed by (model_name, BASE_URL, generation params, prompt hash).
+
+        Attributes:
+            path: the SQLite file
+            mode: read_write | read_only (serve hits, never write) | bypass (never touch the cache)
+            max_bytes: evict least recently used responses above this total size, None for no limit
+            max_age: seconds a response stays valid, None for no limit
+    """
+    # run an eviction pass every EVICT_EVERY writes
+    EVICT_EVERY: int = 256
+
+    def __init__(
+            self,
+            path: str,
+            mode: str = "read_write",
+            max_bytes: Optional[int] = None,
+            max_age: Optional[float] = None
+        ) -> None:
+        if mode not in CACHE_MODES:
+            raise ValueError(f"LLM cache mode must be one of {CACHE_MODES}, got {mode}")
+        self.path: str = path
+        self.mode: str = mode
+        self.max_bytes: Optional[int] = max_bytes
+        self.max_age: Optional[float] = max_age
+        self.hits: int = 0
+        self.misses: int = 0
+        self.writes: int = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if self.mode != "bypass":
+            self._open()
+
+    def _open(self) -> None:
+        if self.mode == "read_only" and not os.path.exists(self.path):
+            logger.warning(f"LLM cache {self.path} doesn't exist, read_only cache is empty")
+            return
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        if self.mode == "read_write":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            self.evict()
+        elif self._conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'responses'").fetchone() is None:
+            logger.warning(f"LLM cache {self.path} has no responses table, read_only cache is empty")
+            self._conn.close()
+            self._conn = None
+
+    @staticmethod
+    def make_key(model_name: str, base_url: Optional[str], params: Dict[str, Any], prompt: str) -> str:
+        prompt_hash: str = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        payload: str = json.dumps([model_name, base_url or "", params, prompt_hash], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        if self._conn is None:
+            if self.mode != "bypass":
+                with self._lock:
+                    self.misses += 1
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.max_age is not None and time.time() - row[1] > self.max_age:
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if self.mode == "read_write":
+                self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+                self._conn.commit()
+            return row[0]
+
+    def put(self, key: str, model_name: str, response: str) -> None:
+        if self._conn is None or self.mode != "read_write":
+            return
+        now: float = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_name, response, len(response.encode("utf-8")), now, now)
+            )
+            self._conn.commit()
+            self.writes += 1
+        if self.writes % self.EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self) -> int:
+        """
+            Drop expired responses, then least recently used ones until the size budget holds.
+        """
+        if self._conn is None or self.mode != "read_write":
+            return 0
+        removed: int = 0
+        with self._lock:
+            if self.max_age is not None:
+                removed += self._conn.execute(
+                    "DELETE FROM responses WHERE created < ?", (time.time() - self.max_age,)
+                ).rowcount
+            if self.max_bytes is not None:
+                total: int = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                if total > self.max_bytes:
+                    cursor = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed")
+                    stale = []
+                    for key, size in cursor:
+                        if total <= self.max_bytes:
+                            break
+                        stale.append((key,))
+                        total -= size
+                    self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+                    removed += len(stale)
+            self._conn.commit()
+        if removed:
+            logger.debug(f"LLM cache evicted {removed} responses")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        lookups: int = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_CACHE: Optional[LlmCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_llm_cache() -> LlmCache:
+    """
+        Process wide cache configured from the environment (.env):
+            LLM_CACHE_MODE: read_write (default) | read_only | bypass
+            LLM_CACHE_PATH: default ./cache/llm_cache.sqlite
+            LLM_CACHE_MAX_MB, LLM_CACHE_MAX_AGE_DAYS: eviction limits, unset for none
+    """
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            max_mb: Optional[str] = getenv("LLM_CACHE_MAX_MB")
+            max_days: Optional[str] = getenv("LLM_CACHE_MAX_AGE_DAYS")
+            _CACHE = LlmCache(
+                path=getenv("LLM_CACHE_PATH") or "./cache/llm_cache.sqlite",
+                mode=getenv("LLM_CACHE_MODE") or "read_write",
+                max_bytes=int(float(max_mb) * 1024 * 1024) if max_mb else None,
+                max_age=float(max_days) * 86400 if max_days else None,
+            )
+        return _CACHE
+
+
+def peek_llm_cache() -> Optional[LlmCache]:
+    """
+        The process wide cache if an LLM call already opened it, never opens (or creates) the file.
+    """
+    with _CACHE_LOCK:
+        return _CACHE
@@ -1,10 +1,127 @@
-from openai import OpenAI
-from typing import Optional
-from transformers import AutoTokenizer, AutoModelForCausalLM
+from __future__ import annotations
+
+import importlib
+import threading
+import time
+from functools import lru_cache
+from concurrent.futures import Executor, Future, as_completed
+from typing import Optional, Tuple, Any, Callable, Dict, List, Iterator, TYPE_CHECKING
 from pathlib import Path
 from loguru import logger
 
-from runner.enum_aggretion import Model, Request
+from runner.enum_aggretion import Model, Request, Endpoint
+from llm.llm_cache import LlmCache, get_llm_cache
+from llm.stopping import AnswerStop, sql_fence_end
+from llm.resilience import ResilientCaller
+from llm.balancer import Balancer, get_balancer
+from process_data.parser_sql import IncrementalSqlExtractor
+from runner.metrics import LLM_SECONDS
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+
+# Backends are resolved lazily per model_type: heavy SDKs (openai, transformers/torch)
+# are only imported the first time a model of that type is actually called.
+LOCAL_MODEL_TYPES: Tuple[str, ...] = ("local",)
+SYSTEM_PROMPT: str = "You are a helpful assistant."
+LOCAL_MAX_NEW_TOKENS: int = 32768
+
+# tokens generated by local models vs. tokens up to the end of the answer block
+_TOKEN_USAGE: Dict[str, int] = {"calls": 0, "generated": 0, "used": 0}
+_TOKEN_USAGE_LOCK = threading.Lock()
+
+
+def token_usage() -> Dict[str, int]:
+    with _TOKEN_USAGE_LOCK:
+        return dict(_TOKEN_USAGE)
+
+
+# streamed completions: time to first token / time to a complete sql block, summed seconds
+_STREAM_STATS: Dict[str, float] = {"calls": 0, "early_stops": 0, "ttft_sum": 0.0, "ttft_n": 0, "tsql_sum": 0.0, "tsql_n": 0}
+
+
+def record_stream(ttft: Optional[float], time_to_sql: Optional[float], early_stop: bool) -> None:
+    with _TOKEN_USAGE_LOCK:
+        _STREAM_STATS["calls"] += 1
+        _STREAM_STATS["early_stops"] += int(early_stop)
+        if ttft is not None:
+            _STREAM_STATS["ttft_sum"] += ttft
+            _STREAM_STATS["ttft_n"] += 1
+        if time_to_sql is not None:
+            _STREAM_STATS["tsql_sum"] += time_to_sql
+            _STREAM_STATS["tsql_n"] += 1
+
+
+def stream_stats() -> Dict[str, float]:
+    """
+        calls, early stops and mean time-to-first-token / time-to-sql of streamed completions.
+    """
+    with _TOKEN_USAGE_LOCK:
+        stats = dict(_STREAM_STATS)
+    return {
+        "calls": stats["calls"],
+        "early_stops": stats["early_stops"],
+        "mean_ttft": stats["ttft_sum"] / stats["ttft_n"] if stats["ttft_n"] else 0.0,
+        "mean_time_to_sql": stats["tsql_sum"] / stats["tsql_n"] if stats["tsql_n"] else 0.0,
+    }
+
+
+@lru_cache(maxsize=None)
+def _openai_client(api_key: Optional[str], base_url: Optional[str]) -> "OpenAI":
+    from openai import OpenAI
+
+    # retries are handled by ResilientCaller
+    return OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+
+
+# model path -> (model, tokenizer), kept for the whole run; one load lock per path
+_LOCAL_MODELS: Dict[str, Tuple[Any, Any]] = {}
+_LOCAL_LOADING: Dict[str, threading.Lock] = {}
+_LOCAL_LOCK = threading.Lock()
+
+
+def _local_model(model_path: str) -> Tuple[Any, Any]:
+    """
+        Local causal LM with its tokenizer, loaded once per path even when tasks or DAG branches
+        ask for it concurrently (a second copy could exhaust GPU memory).
+    """
+    with _LOCAL_LOCK:
+        loaded: Optional[Tuple[Any, Any]] = _LOCAL_MODELS.get(model_path)
+        if loaded is not None:
+            return loaded
+        loading: threading.Lock = _LOCAL_LOADING.setdefault(model_path, threading.Lock())
+    with loading:
+        with _LOCAL_LOCK:
+            loaded = _LOCAL_MODELS.get(model_path)
+        if loaded is None:
+            loaded = _load_local_model(model_path)
+            with _LOCAL_LOCK:
+                _LOCAL_MODELS[model_path] = loaded
+        return loaded
+
+
+def _load_local_model(model_path: str) -> Tuple[Any, Any]:
+    """
+        transformers/torch are imported here only.
+    """
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+
+    logger.info(f"Loading local model from {model_path}")
+    model = AutoModelForCausalLM.from_pretrained(
+        Path(model_path),
+        torch_dtype="auto",
+        device_map="auto",
+        ignore_mismatched_sizes=True,
+        output_loading_info=False  # 关键参数
+    )
+    tokenizer = AutoTokenizer.from_pretrained(Path(model_path))
+    return model, tokenizer
+
+
+def _probe_endpoint(endpoint: Endpoint) -> None:
+    _openai_client(endpoint.API_KEY, endpoint.BASE_URL).models.list(timeout=5)
+
 
 class Llm:
     def __init__(
@@ -15,42 +132,211 @@ class Llm:
         self.model_info = model_info
         self.request = request
 
-    def _run(self) -> str | None:
-        if self.model_info.model_type == "local":
-            return self.llm_local_call()
+    def backend(self) -> Callable[[], str | None]:
+        if self.model_info.model_type in LOCAL_MODEL_TYPES:
+            return self.llm_local_call
+        return self.llm_chain_call
+
+    def generation_params(self, sample: Optional[int] = None) -> Dict[str, Any]:
+        """
+            Everything besides model and prompt that changes the completion, part of the cache key.
+            `sample` tells apart the independent draws of a multi-candidate run.
+        """
+        params: Dict[str, Any]
+        if self.model_info.model_type in LOCAL_MODEL_TYPES:
+            max_new_tokens, stop_on_fence, stop_strings = self.stop_options()
+            params = {
+                "backend": "local",
+                "max_new_tokens": max_new_tokens,
+                "stop_on_sql_fence": stop_on_fence,
+                "stop_strings": stop_strings,
+            }
         else:
-            return self.llm_chain_call()
+            params = {"backend": "chain", "system": SYSTEM_PROMPT, "stream": self.model_info.stream}
+        if self.model_info.temperature is not None:
+            params["temperature"] = self.model_info.temperature
+        if sample is not None:
+            params["sample"] = sample
+        return params
+
+    def stop_options(self) -> Tuple[int, bool, List[str]]:
+        """
+            (max_new_tokens, stop on closed sql fence, stop strings) of local generation,
+            template module constants first, models.json fields override.
+        """
+        template = None
+        if self.model_info.template_name:
+            try:
+                template = importlib.import_module("prompt_template." + self.model_info.template_name)
+            except ImportError:
+                logger.warning(f"Template {self.model_info.template_name} not found, default stop options used")
+        max_new_tokens: int = self.model_info.max_new_tokens or getattr(template, "MAX_NEW_TOKENS", LOCAL_MAX_NEW_TOKENS)
+        stop_on_fence: bool = getattr(template, "STOP_ON_SQL_FENCE", False)
+        stop_strings: List[str] = list(getattr(template, "STOP_STRINGS", [])) + list(self.model_info.stop_strings)
+        return max_new_tokens, stop_on_fence, stop_strings
+
+    def base_url_key(self) -> Optional[str]:
+        """
+            Replicas of one logical model answer alike, they share cache entries.
+        """
+        if self.model_info.endpoints:
+            return "|".join(sorted(e.BASE_URL or "" for e in self.model_info.endpoints))
+        return self.model_info.BASE_URL
+
+    def cache_key(self, sample: Optional[int] = None) -> str:
+        if self.request is None:
+            raise ValueError("Request object is None or missing 'template' attribute.")
+        return get_llm_cache().make_key(
+            self.model_info.model_name,
+            self.base_url_key(),
+            self.generation_params(sample),
+            self.request.template
+        )
+
+    def _cached_call(self, call: Callable[[], str | None], sample: Optional[int] = None) -> str | None:
+        cache: LlmCache = get_llm_cache()
+        key: str = self.cache_key(sample)
+        cached: Optional[str] = cache.get(key)
+        if cached is not None:
+            return cached
+        answer: str | None = call()
+        if answer is not None:
+            cache.put(key, self.model_info.model_name, answer)
+        return answer
+
+    def _run(self) -> str | None:
+        if self.request is None:
+            return self.backend()()
+        return self._cached_call(self.backend())
+
+    def _run_many(self, n: int, executor: Executor) -> Iterator[str | None]:
+        """
+            Draw n samples and yield them as they arrive.
+            API models: n concurrent requests on `executor`; local models: one batched generate.
+            Closing the iterator early cancels the requests that haven't started yet.
+        """
+        if self.request is None:
+            raise ValueError("Request object is None or missing 'template' attribute.")
+
+        if self.model_info.model_type in LOCAL_MODEL_TYPES:
+            cache: LlmCache = get_llm_cache()
+            keys: List[str] = [self.cache_key(i) for i in range(n)]
+            cached: List[Optional[str]] = [cache.get(key) for key in keys]
+            missing: List[int] = [i for i, answer in enumerate(cached) if answer is None]
+            if missing:
+                for i, answer in zip(missing, self._local_generate(len(missing), sample=True)):
+                    cached[i] = answer
+                    cache.put(keys[i], self.model_info.model_name, answer)
+            yield from cached
+            return
+
+        futures: List[Future] = [executor.submit(self._cached_call, self.llm_chain_call, i) for i in range(n)]
+        try:
+            for future in as_completed(futures):
+                try:
+                    yield future.result()
+                except Exception as e:
+                    logger.warning(f"Sample of {self.model_info.model_name} failed: {e}")
+                    yield None
+        finally:
+            for future in futures:
+                future.cancel()
 
     def llm_chain_call(self) -> str | None:
         if self.request is None or not hasattr(self.request, "template"):
             raise ValueError("Request object is None or missing 'template' attribute.")
-        
-        client = OpenAI(api_key=self.model_info.API_KEY, base_url=self.model_info.BASE_URL)
-        resp = client.chat.completions.create(
+
+        balancer: Balancer = get_balancer(self.model_info, probe=_probe_endpoint)
+        kwargs: Dict[str, Any] = {}
+        if self.model_info.temperature is not None:
+            kwargs["temperature"] = self.model_info.temperature
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": self.request.template}
+        ]
+
+        def attempt(timeout: Optional[float]) -> str | None:
+            call_kwargs: Dict[str, Any] = {**kwargs, "timeout": timeout} if timeout is not None else kwargs
+            # every attempt (retry or hedge) is routed again, so failures move to another replica
+            with balancer.acquire() as endpoint:
+                client = _openai_client(endpoint.API_KEY, endpoint.BASE_URL)
+                if self.model_info.stream:
+                    return self._stream_chain_call(client, messages, call_kwargs)
+                resp = client.chat.completions.create(
+                    model = self.model_info.model_name,
+                    messages = messages,
+                    **call_kwargs
+                )
+                return resp.choices[0].message.content
+
+        caller: ResilientCaller = ResilientCaller(
+            self.model_info.model_name,
+            deadline=self.model_info.deadline,
+            request_timeout=self.model_info.request_timeout,
+            hedge=self.model_info.hedge,
+            max_retries=self.model_info.max_retries,
+        )
+        begin: float = time.perf_counter()
+        try:
+            return caller.call(attempt)
+        finally:
+            LLM_SECONDS.observe(time.perf_counter() - begin, self.model_info.model_name)
+
+    def _stream_chain_call(self, client: "OpenAI", messages: List[Dict[str, str]], kwargs: Dict[str, Any]) -> str | None:
+        """
+            Consume the completion as deltas and close the stream once a complete ```sql block arrived,
+            the returned text ends with that block so parse_result sees the same SQL.
+        """
+        begin: float = time.perf_counter()
+        first_token: Optional[float] = None
+        extractor: IncrementalSqlExtractor = IncrementalSqlExtractor()
+        stream = client.chat.completions.create(
             model = self.model_info.model_name,
-            messages = [
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": self.request.template}
-            ]
+            messages = messages,
+            stream = True,
+            **kwargs
         )
-        answer = resp.choices[0].message.content
-        return answer 
+        try:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta: Optional[str] = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter() - begin
+                if extractor.feed(delta) is not None:
+                    break
+        finally:
+            stream.close()
+
+        to_sql: Optional[float] = time.perf_counter() - begin if extractor.end is not None else None
+        record_stream(first_token, to_sql, extractor.end is not None)
+        logger.debug(f"{self.model_info.model_name} stream: ttft {first_token}s, time to sql {to_sql}s")
+        if not extractor.buffer:
+            return None
+        return extractor.buffer[:extractor.end] if extractor.end is not None else extractor.buffer
 
     def llm_local_call(self) -> str:
-        model_path: Path = Path(self.model_info.model_path + self.model_info.model_name)
-
-        model = AutoModelForCausalLM.from_pretrained(
-            model_path,
-            torch_dtype="auto",
-            device_map="auto",
-            ignore_mismatched_sizes=True,
-            output_loading_info=False  # 关键参数
-        )
-        tokenizer = AutoTokenizer.from_pretrained(model_path)
+        return self._local_generate(1)[0]
+
+    def _local_generate(self, num_return_sequences: int, sample: bool = False) -> List[str]:
+        """
+            sample=True draws candidates (always sampled, even one), otherwise decoding is greedy
+            unless the model has a temperature.
+        """
+        begin: float = time.perf_counter()
+        try:
+            return self._local_generate_timed(num_return_sequences, sample)
+        finally:
+            LLM_SECONDS.observe(time.perf_counter() - begin, self.model_info.model_name)
+
+    def _local_generate_timed(self, num_return_sequences: int, sample: bool = False) -> List[str]:
+        model, tokenizer = _local_model(self.model_info.model_path + self.model_info.model_name)
 
         if self.request is None or not hasattr(self.request, "template"):
             raise ValueError("Request object is None or missing 'template' attribute.")
-        
+
         prompt: str = self.request.template
         messages = [
             {"role": "user", "content": prompt}
@@ -62,12 +348,43 @@ class Llm:
         )
         model_inputs = tokenizer([text], return_tensors="pt").to(model.device)
 
+        kwargs: Dict[str, Any] = {}
+        if sample or num_return_sequences > 1:
+            # independent samples in one batched decode, a lone missing candidate is a sample too
+            kwargs.update(do_sample=True, num_return_sequences=num_return_sequences)
+        if self.model_info.temperature is not None and self.model_info.temperature > 0:
+            kwargs.update(do_sample=True, temperature=self.model_info.temperature)
+
+        prompt_len: int = model_inputs.input_ids.shape[1]
+        max_new_tokens, stop_on_fence, stop_strings = self.stop_options()
+        if stop_on_fence or stop_strings:
+            from transformers import StoppingCriteriaList
+            kwargs["stopping_criteria"] = StoppingCriteriaList([AnswerStop(tokenizer, prompt_len, stop_on_fence, stop_strings)])
+
         generated_ids = model.generate(
             **model_inputs,
-            max_new_tokens=32768
+            max_new_tokens=max_new_tokens,
+            **kwargs
         )
-        generated_ids = [
-            output_ids[len(input_ids):] for input_ids, output_ids in zip(model_inputs.input_ids, generated_ids)
-        ]
-        response: str = tokenizer.batch_decode(generated_ids, skip_special_tokens=True)[0]
-        return response
+        # a single prompt, every returned sequence shares the same prefix
+        new_ids = generated_ids[:, prompt_len:]
+        responses: List[str] = tokenizer.batch_decode(new_ids, skip_special_tokens=True)
+        self.record_usage(tokenizer, new_ids, responses)
+        return responses
+
+    def record_usage(self, tokenizer: Any, new_ids: Any, responses: List[str]) -> None:
+        # generate pads finished rows with pad (or eos when the tokenizer has no pad token)
+        pad_id: Optional[int] = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+        generated: int = int((new_ids != pad_id).sum()) if pad_id is not None else int(new_ids.numel())
+        used: int = 0
+        for row, response in zip(new_ids, responses):
+            end: Optional[int] = sql_fence_end(response)
+            if end is None:
+                used += int((row != pad_id).sum()) if pad_id is not None else int(row.numel())
+            else:
+                used += len(tokenizer(response[:end], add_special_tokens=False).input_ids)
+        with _TOKEN_USAGE_LOCK:
+            _TOKEN_USAGE["calls"] += 1
+            _TOKEN_USAGE["generated"] += generated
+            _TOKEN_USAGE["used"] += used
+        logger.debug(f"{self.model_info.model_name} generated {generated} tokens, {used} used")
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-20 14:05
+# @Author  : jwm
+# @File    : resilience.py
+# @description: Retry, backoff, deadlines and hedged requests for API-backed LLM calls.
+
+import time
+import random
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Optional, TypeVar, Deque, Set, Any
+
+from loguru import logger
+
+T = TypeVar("T")
+
+
+class RetryPolicy:
+    """
+        Jittered exponential backoff of one error class.
+
+        Attributes:
+            max_attempts: total attempts (first try included)
+            base_delay: delay before the first retry, doubled each retry
+            max_delay: cap of a single delay
+    """
+    def __init__(self, max_attempts: int, base_delay: float, max_delay: float) -> None:
+        self.max_attempts: int = max_attempts
+        self.base_delay: float = base_delay
+        self.max_delay: float = max_delay
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+            Full-jitter delay after `attempt` failed attempts, never shorter than Retry-After.
+        """
+        backoff: float = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+        if retry_after is not None:
+            return max(backoff, min(retry_after, self.max_delay))
+        return backoff
+
+
+DEFAULT_POLICIES: Dict[str, RetryPolicy] = {
+    "rate_limit": RetryPolicy(max_attempts=6, base_delay=2.0, max_delay=60.0),
+    "server": RetryPolicy(max_attempts=4, base_delay=1.0, max_delay=30.0),
+    "timeout": RetryPolicy(max_attempts=3, base_delay=0.5, max_delay=10.0),
+    "connection": RetryPolicy(max_attempts=4, base_delay=1.0, max_delay=20.0),
+}
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+def classify_error(exc: BaseException) -> Optional[str]:
+    """
+        Retry class of an exception (openai errors are recognised by name, the SDK is not imported), None if not retryable.
+    """
+    status: Optional[int] = getattr(exc, "status_code", None)
+    if status == 429:
+        return "rate_limit"
+    if status is not None and status >= 500:
+        return "server"
+    names: Set[str] = {cls.__name__ for cls in type(exc).__mro__}
+    if "APITimeoutError" in names or (isinstance(exc, TimeoutError) and not isinstance(exc, DeadlineExceeded)):
+        return "timeout"
+    if "APIConnectionError" in names or isinstance(exc, ConnectionError):
+        return "connection"
+    return None
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """
+        Seconds asked by a Retry-After / retry-after-ms response header.
+    """
+    response: Any = getattr(exc, "response", None)
+    headers: Any = getattr(response, "headers", None)
+    if headers is None:
+        return None
+    try:
+        if headers.get("retry-after-ms") is not None:
+            return float(headers["retry-after-ms"]) / 1000
+        value: Optional[str] = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class LatencyTracker:
+    """
+        Recent successful latencies of one model, used to pick the hedging delay.
+    """
+    def __init__(self, window: int = 200) -> None:
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, latency: float) -> None:
+        with self._lock:
+            self._samples.append(latency)
+
+    def quantile(self, q: float, min_samples: int = 20) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+_TRACKERS: Dict[str, LatencyTracker] = {}
+_TRACKERS_LOCK = threading.Lock()
+_HEDGE_EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-hedge")
+
+
+def latency_tracker(name: str) -> LatencyTracker:
+    with _TRACKERS_LOCK:
+        if name not in _TRACKERS:
+            _TRACKERS[name] = LatencyTracker()
+        return _TRACKERS[name]
+
+
+class ResilientCaller:
+    """
+        Runs `fn(timeout)` with per-error-class retries, an overall deadline and optional hedging.
+
+        Attributes:
+            name: latency tracker key (model name)
+            deadline: seconds for the whole call including retries, None for no deadline
+            request_timeout: upper bound of a single attempt
+            hedge: fire a duplicate attempt once the first one is slower than the p95 latency
+            max_retries: optional cap of retries for every error class
+    """
+    HEDGE_QUANTILE: float = 0.95
+
+    def __init__(
+            self,
+            name: str,
+            deadline: Optional[float] = None,
+            request_timeout: Optional[float] = None,
+            hedge: bool = False,
+            max_retries: Optional[int] = None,
+            policies: Optional[Dict[str, RetryPolicy]] = None
+        ) -> None:
+        self.name: str = name
+        self.deadline: Optional[float] = deadline
+        self.request_timeout: Optional[float] = request_timeout
+        self.hedge: bool = hedge
+        self.max_retries: Optional[int] = max_retries
+        self.policies: Dict[str, RetryPolicy] = policies or DEFAULT_POLICIES
+        self.tracker: LatencyTracker = latency_tracker(name)
+
+    def _attempt_timeout(self, expires: Optional[float]) -> Optional[float]:
+        if expires is None:
+            return self.request_timeout
+        remaining: float = expires - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"{self.name}: deadline of {self.deadline}s exceeded")
+        return remaining if self.request_timeout is None else min(remaining, self.request_timeout)
+
+    def _timed(self, fn: Callable[[Optional[float]], T], timeout: Optional[float]) -> T:
+        begin: float = time.monotonic()
+        result: T = fn(timeout)
+        self.tracker.add(time.monotonic() - begin)
+        return result
+
+    def _hedged(self, fn: Callable[[Optional[float]], T], timeout: Optional[float]) -> T:
+        delay: Optional[float] = self.tracker.quantile(self.HEDGE_QUANTILE)
+        if delay is None or (timeout is not None and delay >= timeout):
+            return self._timed(fn, timeout)
+
+        primary: Future = _HEDGE_EXECUTOR.submit(self._timed, fn, timeout)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        logger.debug(f"{self.name}: hedging after {delay:.2f}s")
+        hedge_timeout: Optional[float] = None if timeout is None else max(0.1, timeout - delay)
+        pending: Set[Future] = {primary, _HEDGE_EXECUTOR.submit(self._timed, fn, hedge_timeout)}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # the slower request keeps running in the background, its result is dropped
+                    return future.result()
+                error = future.exception()
+        assert error is not None
+        raise error
+
+    def call(self, fn: Callable[[Optional[float]], T]) -> T:
+        expires: Optional[float] = time.monotonic() + self.deadline if self.deadline is not None else None
+        attempts: Dict[str, int] = {}
+        while True:
+            timeout: Optional[float] = self._attempt_timeout(expires)
+            try:
+                if self.hedge:
+                    return self._hedged(fn, timeout)
+                return self._timed(fn, timeout)
+            except Exception as e:
+                kind: Optional[str] = classify_error(e)
+                if kind is None or kind not in self.policies:
+                    raise
+                policy: RetryPolicy = self.policies[kind]
+                attempts[kind] = attempts.get(kind, 0) + 1
+                max_attempts: int = policy.max_attempts
+                if self.max_retries is not None:
+                    max_attempts = min(max_attempts, self.max_retries + 1)
+                if attempts[kind] >= max_attempts:
+                    raise
+                sleep: float = policy.delay(attempts[kind], retry_after(e))
+                if expires is not None and time.monotonic() + sleep >= expires:
+                    raise DeadlineExceeded(f"{self.name}: deadline of {self.deadline}s exceeded after {kind} error") from e
+                logger.warning(f"{self.name}: {kind} error ({e}), retry {attempts[kind]} in {sleep:.2f}s")
+                time.sleep(sleep)
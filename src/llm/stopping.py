@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-20 09:30
+# @Author  : jwm
+# @File    : stopping.py
+# @description: Stop criteria of local generation tied to the prompt answer format.
+
+from typing import Any, List, Optional, Sequence
+
+SQL_FENCE_OPEN: str = "```sql"
+FENCE: str = "```"
+
+# tokens decoded from the tail when looking for an opening fence or a stop string
+_TAIL_TOKENS: int = 24
+
+
+def sql_fence_end(text: str) -> Optional[int]:
+    """
+        End offset of the first closed ```sql ... ``` block, None while it is still open.
+        This is the block extract_sql takes the answer from.
+    """
+    begin: int = text.find(SQL_FENCE_OPEN)
+    if begin < 0:
+        return None
+    close: int = text.find(FENCE, begin + len(SQL_FENCE_OPEN))
+    if close < 0:
+        return None
+    return close + len(FENCE)
+
+
+class AnswerStop:
+    """
+        transformers stopping criterion (duck typed, torch is only touched at call time).
+
+        A row is finished once its first sql fence is closed or any stop string appears.
+        Only a short tail is decoded until the fence opens, then the open block alone,
+        so the check stays cheap for long reasoning prefixes.
+    """
+    def __init__(self, tokenizer: Any, prompt_len: int, stop_on_sql_fence: bool = True, stop_strings: Sequence[str] = ()) -> None:
+        self.tokenizer = tokenizer
+        self.prompt_len: int = prompt_len
+        self.stop_on_sql_fence: bool = stop_on_sql_fence
+        self.stop_strings: List[str] = [s for s in stop_strings if s]
+        # per row: absolute token index from where the open sql block is decoded
+        self._open_from: List[Optional[int]] = []
+
+    def _decode(self, ids: Any) -> str:
+        return self.tokenizer.decode(ids, skip_special_tokens=True)
+
+    def _row_done(self, row: int, ids: Any) -> bool:
+        cur: int = ids.shape[-1]
+        tail_from: int = max(self.prompt_len, cur - _TAIL_TOKENS)
+        tail: str = self._decode(ids[tail_from:])
+        if any(s in tail for s in self.stop_strings):
+            return True
+        if not self.stop_on_sql_fence:
+            return False
+
+        open_from: Optional[int] = self._open_from[row]
+        if open_from is None:
+            if SQL_FENCE_OPEN not in tail:
+                return False
+            self._open_from[row] = open_from = tail_from
+        return sql_fence_end(self._decode(ids[open_from:])) is not None
+
+    def __call__(self, input_ids: Any, scores: Any, **kwargs: Any) -> Any:
+        import torch
+
+        if not self._open_from:
+            self._open_from = [None] * input_ids.shape[0]
+        done: List[bool] = [self._row_done(row, input_ids[row]) for row in range(input_ids.shape[0])]
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
@@ -6,6 +6,9 @@
 
 import argparse
 import json
+import os
+import socket
+import sys
 from typing import List, Dict, Any
 from runner.run_manager import RunManager
 
@@ -15,6 +18,10 @@ def parse_augements() -> argparse.Namespace:
     parser.add_argument("--data_path", type=str, required=True)
     parser.add_argument("--model_path", type=str, required=True)
     parser.add_argument("--schema_generator", type=str, required=True)
+    # distributed run: workers sharing --queue (a SQLite file) pull tasks from it, --merge joins their result shards
+    parser.add_argument("--queue", type=str, default=None)
+    parser.add_argument("--worker_id", type=str, default=None)
+    parser.add_argument("--merge", action="store_true")
     args: argparse.Namespace = parser.parse_args()
     return args
 
@@ -29,6 +36,9 @@ def parse_augements_debug() -> argparse.Namespace:
     debug_args.data_path = "../data/BIRD/dev/"  
     debug_args.model_path = "./src/llm/models.json"
     debug_args.schema_generator = "M_Schema"
+    debug_args.queue = None
+    debug_args.worker_id = None
+    debug_args.merge = False
     
     print(f"[DEBUG] Using Debug")
     print(f"[DEBUG] data_mode: {debug_args.data_mode}")
@@ -50,17 +60,30 @@ def load_dataset(data_path: str) -> List[Dict[str, Any]]:
     return dataset
 
 def main() -> None:
-    # Debug model, if True using debug, or use cli model.
-    DEBUG_MODE: bool = True
+    # Debug model, if True using debug, or use cli model. Debug presets only when started without arguments.
+    DEBUG_MODE: bool = len(sys.argv) == 1
     if DEBUG_MODE:
         args: argparse.Namespace = parse_augements_debug()
     else:
         args = parse_augements()
-        
+
+    if args.merge:
+        from runner.work_queue import WorkQueue, merge_shards
+        queue: WorkQueue | None = WorkQueue(args.queue) if args.queue else None
+        if queue is not None and not queue.finished():
+            print(f"[WARN] queue {args.queue} is not finished: {queue.counts()}")
+        merge_shards("./result", queue)
+        return
+
     dataset: List[Dict[str, Any]] = load_dataset(args.data_path + f"{args.data_mode}.json")
     runner: RunManager = RunManager(args)
     runner.initialize_tasks(dataset)
-    runner.run_task()
+    if args.queue:
+        from runner.work_queue import WorkQueue
+        worker_id: str = args.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        runner.run_distributed(WorkQueue(args.queue), worker_id)
+    else:
+        runner.run_task()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
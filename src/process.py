@@ -1,25 +1,65 @@
 # -*- coding: utf-8 -*-
 # @Time    : 2025-07-17 15:29
 # @Author  : jwm
-# @File    : test.py
-# @description: For the High King
-        
+# @File    : process.py
+# @description: Preprocessing entry, builds every per-database artifact before the main run.
+
 import argparse
-import os 
-from multiprocessing import Pool
+import json
+import os
+from collections import Counter, defaultdict
+from typing import List, Dict, Any, Optional
+
+from loguru import logger
+from dotenv import find_dotenv, load_dotenv
+
+from runner.preprocess import preprocess
+from runner.evaluate import load_predictions
+
+# same .env as the main run, so both agree on ARTIFACT_CACHE_DIR
+load_dotenv(find_dotenv(usecwd=True), override=False, encoding="utf-8")
+
+
+def parse_augements() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="process data command line")
+    parser.add_argument("--data_mode", type=str, required=True)
+    parser.add_argument("--data_path", type=str, required=True, help="e.g. ./data/BIRD/dev/")
+    parser.add_argument("--cache_dir", type=str, default=None, help="defaults to ARTIFACT_CACHE_DIR, else next to the databases")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--timeout", type=float, default=60.0, help="per gold query seconds")
+    parser.add_argument("--no_values", action="store_true", help="skip the value index")
+    parser.add_argument("--downsample", type=int, default=0, help="max rows per table of the quick-eval copies, 0 to skip")
+    parser.add_argument("--indexes", action="store_true", help="indexed working copies advised from the gold SQL")
+    parser.add_argument("--index_predictions", type=str, default=None, help="predictions file whose SQL also feeds the index advisor")
+    parser.add_argument("--force", action="store_true", help="rebuild unchanged databases too")
+    args: argparse.Namespace = parser.parse_args()
+    return args
+
 
-# def argparse_augements() -> argparse.Namespace:
-#     args = argparse.ArgumentParser(description="process data command line")
-#     args.add_argument("--data_path", type=str, required=True)
-#     args = args.parse_args()    
-#     return args 
+def main() -> None:
+    args: argparse.Namespace = parse_augements()
+    if args.cache_dir:
+        # pool workers inherit the environment, loaders of the main run read the same variable
+        os.environ["ARTIFACT_CACHE_DIR"] = args.cache_dir
 
+    with open(os.path.join(args.data_path, f"{args.data_mode}.json"), "r") as f:
+        dataset: List[Dict[str, Any]] = json.load(f)
 
-def main():
-    db_json_path: str = "./data/BIRD/dev/"
-    db_path: str = "./data/BIRD/dev/dev_databases/"
+    index_sqls: Optional[Dict[str, List[str]]] = None
+    if args.indexes or args.index_predictions:
+        index_sqls = defaultdict(list)
+        for pred in load_predictions(args.index_predictions) if args.index_predictions else []:
+            if pred.get("db_id") and pred.get("answer_sql"):
+                index_sqls[pred["db_id"]].append(pred["answer_sql"])
 
+    reports: List[Dict[str, Any]] = preprocess(
+        dataset, args.data_path, args.data_mode, args.workers,
+        with_values=not args.no_values, downsample=args.downsample, force=args.force, timeout=args.timeout,
+        index_sqls=index_sqls,
+    )
+    counts: Counter = Counter(report["status"] for report in reports)
+    logger.info(f"{len(reports)} databases: " + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-22 17:40
+# @Author  : jwm
+# @File    : artifacts.py
+# @description: Versioned on-disk cache of per-database artifacts built by process.py.
+
+import os
+import json
+import hashlib
+import threading
+from sqlite3 import Connection
+from typing import Dict, List, Any, Optional
+
+from loguru import logger
+from pydantic import BaseModel
+
+from process_data.fingerprint import ResultFingerprint, from_dict
+
+ARTIFACTS_VERSION: int = 3        # 3: gold fingerprints encode floats exactly
+
+
+def artifact_cache_dir() -> Optional[str]:
+    """
+        ARTIFACT_CACHE_DIR from the environment, artifacts sit next to the databases when unset.
+    """
+    return os.getenv("ARTIFACT_CACHE_DIR") or None
+
+
+def artifact_path(db_path: str, name: str) -> str:
+    """
+        {ARTIFACT_CACHE_DIR}/v{ARTIFACTS_VERSION}/{db_id}/{name}, or {db_dir}/{db_id}.{name} without a cache directory.
+    """
+    cache_dir: Optional[str] = artifact_cache_dir()
+    if cache_dir is None:
+        return f"{os.path.splitext(db_path)[0]}.{name}"
+    db_id: str = os.path.splitext(os.path.basename(db_path))[0]
+    return os.path.join(cache_dir, f"v{ARTIFACTS_VERSION}", db_id, name)
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sql_digest(sql: str) -> str:
+    return hashlib.sha1(sql.strip().encode("utf-8")).hexdigest()
+
+
+class ArtifactManifest(BaseModel):
+    """
+        Written last by process.py, a database whose size / mtime (or content hash) and
+        gold SQL set match its manifest is skipped.
+
+        Attributes:
+            db_sha256: content hash of the database file
+            gold_sha256: hash of the (question_id, gold SQL) pairs the gold fingerprints were built from
+            files: artifact name -> content hash
+    """
+    version: int = ARTIFACTS_VERSION
+    db_id: str
+    db_sha256: str
+    db_size: int
+    db_mtime_ns: int
+    gold_sha256: Optional[str] = None
+    files: Dict[str, str] = {}
+
+
+def load_manifest(db_path: str) -> Optional[ArtifactManifest]:
+    path: str = artifact_path(db_path, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest: ArtifactManifest = ArtifactManifest(**json.load(f))
+    except Exception as e:
+        logger.warning(f"unreadable artifact manifest {path}: {e}")
+        return None
+    return manifest if manifest.version == ARTIFACTS_VERSION else None
+
+
+def write_json(path: str, data: Any) -> None:
+    """
+        Write through a temporary file so readers never see half an artifact.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path: str = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str))
+    os.replace(tmp_path, path)
+
+
+def restamp(path: str, db_size: int, db_mtime_ns: int) -> None:
+    """
+        Point a JSON artifact at a database file whose content is unchanged but whose size / mtime stamp moved (copy, touch).
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        data: Dict[str, Any] = json.load(f)
+    data["db_size"], data["db_mtime_ns"] = db_size, db_mtime_ns
+    write_json(path, data)
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def column_statistics(conn: Connection, column_names: Dict[str, List[str]]) -> Dict[str, Dict[str, Any]]:
+    """
+        Row count and per-column non-null / distinct counts, min and max; one scan per table.
+    """
+    stats: Dict[str, Dict[str, Any]] = {}
+    for table, columns in column_names.items():
+        if not columns:
+            continue
+        select: str = ", ".join(
+            f"count({_quote(c)}), count(DISTINCT {_quote(c)}), min({_quote(c)}), max({_quote(c)})" for c in columns
+        )
+        try:
+            row = conn.execute(f"SELECT count(*), {select} FROM {_quote(table)}").fetchone()
+        except Exception as e:
+            logger.warning(f"statistics of {table} skipped: {e}")
+            continue
+        stats[table] = {
+            "row_count": row[0],
+            "columns": {
+                column: {
+                    "non_null": row[1 + 4 * i],
+                    "distinct": row[2 + 4 * i],
+                    "min": None if isinstance(row[3 + 4 * i], bytes) else row[3 + 4 * i],
+                    "max": None if isinstance(row[4 + 4 * i], bytes) else row[4 + 4 * i],
+                }
+                for i, column in enumerate(columns)
+            },
+        }
+    return stats
+
+
+_GOLD: Dict[str, Dict[str, Dict[str, Any]]] = {}
+_GOLD_LOCK = threading.Lock()
+
+
+def load_gold_fingerprints(db_path: str) -> Dict[str, Dict[str, Any]]:
+    """
+        question_id (str) -> {"sql", "digest", "rows", "columns", "ordered", "error"} of a database, empty when
+        process.py didn't build them or the database changed since.
+    """
+    with _GOLD_LOCK:
+        cached: Optional[Dict[str, Dict[str, Any]]] = _GOLD.get(db_path)
+        if cached is not None:
+            return cached
+        fingerprints: Dict[str, Dict[str, Any]] = {}
+        path: str = artifact_path(db_path, "gold.json")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data: Dict[str, Any] = json.load(f)
+            stat = os.stat(db_path)
+            if (data.get("version"), data.get("db_size"), data.get("db_mtime_ns")) == (ARTIFACTS_VERSION, stat.st_size, stat.st_mtime_ns):
+                fingerprints = data.get("fingerprints", {})
+            else:
+                logger.warning(f"gold fingerprints of {db_path} are stale, ignored")
+        _GOLD[db_path] = fingerprints
+        return fingerprints
+
+
+def gold_fingerprint(db_path: str, question_id: int, gold_sql: str) -> Optional[ResultFingerprint]:
+    """
+        Precomputed (ordered) fingerprint of a gold result, None unless it was built from this exact SQL without error.
+    """
+    entry: Optional[Dict[str, Any]] = load_gold_fingerprints(db_path).get(str(question_id))
+    if entry is None or entry.get("error") is not None or entry.get("sql") != sql_digest(gold_sql):
+        return None
+    return from_dict(entry)
@@ -5,13 +5,91 @@
 # @description: For the High King
 
 import os 
+import queue
+import threading
 from contextlib import contextmanager
-from typing import Optional, Any, List, Tuple, Generator
+from typing import Optional, Any, List, Tuple, Generator, Dict
 
 from loguru import logger
 from sqlite3 import connect, Connection
+from urllib.request import pathname2url
 
 from runner.enum_aggretion import Task
+from process_data.replica import replica_connection
+
+def db_file_path(data_path: str, data_mode: str, db_id: str) -> str:
+    """
+        Location of a BIRD/Spider style database: {data_path}/{data_mode}_databases/{db_id}/{db_id}.sqlite
+    """
+    return os.path.join(data_path, f"{data_mode}_databases", db_id, f"{db_id}.sqlite")
+
+def connect_readonly(db_path: str, check_same_thread: bool = True) -> Connection:
+    """
+        Open a database read-only, model generated SQL can never modify the dataset files.
+    """
+    uri: str = f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro"
+    return connect(uri, uri=True, check_same_thread=check_same_thread)
+
+def open_readonly(db_path: str, check_same_thread: bool = True) -> Connection:
+    """
+        Read-only connection, served from an in-memory replica when DB_REPLICA_BUDGET_MB is set.
+    """
+    conn: Optional[Connection] = replica_connection(db_path, check_same_thread)
+    return conn if conn is not None else connect_readonly(db_path, check_same_thread)
+
+class ReadOnlyPool:
+    """
+        A small pool of read-only connections to one database, one connection per concurrent query.
+    """
+    def __init__(self, db_path: str, size: int = 4) -> None:
+        self.db_path: str = db_path
+        self.size: int = size
+        self._idle: "queue.LifoQueue[Connection]" = queue.LifoQueue()
+        self._created: int = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return open_readonly(self.db_path, check_same_thread=False)
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self) -> Generator[Connection, None, None]:
+        conn: Connection = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+
+_POOLS: Dict[str, ReadOnlyPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+def get_readonly_pool(db_path: str, size: int = 4) -> ReadOnlyPool:
+    """
+        Process wide read-only pool per database file.
+    """
+    with _POOLS_LOCK:
+        pool: Optional[ReadOnlyPool] = _POOLS.get(db_path)
+        if pool is None:
+            pool = ReadOnlyPool(db_path, size)
+            _POOLS[db_path] = pool
+        return pool
 
 class DB_System:
     def __init__(self, args: Any, task: Task) -> None:
@@ -19,6 +97,10 @@ class DB_System:
         self.task: Task = task
         self._conn: Optional[Connection] = None 
 
+    @property
+    def db_path(self) -> str:
+        return db_file_path(self.args.data_path, self.args.data_mode, self.task.db_id)
+
     @property
     def conn(self) -> Connection:
         if self._conn is None:
@@ -37,8 +119,7 @@ class DB_System:
             # logger.warning("Connection already open, closing existing connection first")
             self._close()
             
-        db_path: str = os.path.join(self.args.data_path, f"{self.args.data_mode}_databases", self.task.db_id, f"{self.task.db_id}.sqlite")
-        self._conn = connect(db_path)
+        self._conn = replica_connection(self.db_path) or connect(self.db_path)
     
     def _close(self) -> None:
         if self._conn is None:
@@ -47,6 +128,13 @@ class DB_System:
             self._conn.close()
             self._conn = None
 
+    def close(self) -> None:
+        """
+            Close the connection if one is open, a no-op otherwise.
+        """
+        if self._conn is not None:
+            self._close()
+
     @contextmanager
     def get_connection(self) -> Generator[Connection, None, None]:
         try:
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-23 10:15
+# @Author  : jwm
+# @File    : downsample.py
+# @description: Deterministic, foreign-key consistent downsampled copies of a database for quick evaluation.
+
+import os
+import json
+import sqlite3
+from sqlite3 import Connection
+from typing import Dict, List, Any, Optional
+from urllib.request import pathname2url
+
+from loguru import logger
+
+from process_data.artifacts import artifact_path, write_json
+from process_data.introspection import DatabaseSchema, TableInfo, load_schema
+
+SAMPLE_VERSION: int = 1
+MAX_ROWS: int = 10000
+SEED: int = 20251023
+_MODULUS: int = 1000003
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def sample_path(db_path: str) -> str:
+    return artifact_path(db_path, "sample.sqlite")
+
+
+def _has_rowid(conn: Connection, table: str) -> bool:
+    try:
+        conn.execute(f"SELECT rowid FROM src.{_quote(table)} LIMIT 0")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def _sample_table(conn: Connection, table: TableInfo, max_rows: int, seed: int) -> None:
+    """
+        Copy every row of a small table, a rowid-hash selected ~max_rows of a large one (same rows on every build).
+        rowids are kept so parent rows pulled in later by the FK closure can be de-duplicated.
+    """
+    name: str = _quote(table.name)
+    columns: str = ", ".join(_quote(c.name) for c in table.columns)
+    if not _has_rowid(conn, table.name):
+        conn.execute(f"INSERT INTO main.{name} ({columns}) SELECT {columns} FROM src.{name} LIMIT {max_rows}")
+        return
+    where: str = ""
+    if table.row_count > max_rows:
+        threshold: int = max(1, _MODULUS * max_rows // table.row_count)
+        where = f"WHERE ((rowid + {seed}) * 2654435761) % {_MODULUS} < {threshold}"
+    conn.execute(f"INSERT INTO main.{name} (rowid, {columns}) SELECT rowid, {columns} FROM src.{name} {where}")
+
+
+def _close_foreign_keys(conn: Connection, schema: DatabaseSchema) -> int:
+    """
+        Pull in every parent row referenced by a kept child row until nothing changes,
+        so joins along foreign keys behave like on the full database. Returns the rows added.
+    """
+    added: int = 0
+    for _ in range(len(schema.tables) + 1):
+        changed: int = 0
+        for fk in schema.foreign_keys:
+            parent: Optional[TableInfo] = schema.table(fk.ref_table)
+            child: Optional[TableInfo] = schema.table(fk.table)
+            if parent is None or child is None or fk.ref_column is None or not _has_rowid(conn, parent.name):
+                continue
+            columns: str = ", ".join(_quote(c.name) for c in parent.columns)
+            cursor = conn.execute(
+                f"INSERT INTO main.{_quote(parent.name)} (rowid, {columns}) "
+                f"SELECT rowid, {columns} FROM src.{_quote(parent.name)} "
+                f"WHERE {_quote(fk.ref_column)} IN (SELECT {_quote(fk.column)} FROM main.{_quote(child.name)}) "
+                f"AND rowid NOT IN (SELECT rowid FROM main.{_quote(parent.name)})"
+            )
+            changed += max(0, cursor.rowcount)
+        added += changed
+        if not changed:
+            break
+    return added
+
+
+def build_downsampled(db_path: str, out_path: Optional[str] = None, max_rows: int = MAX_ROWS, seed: int = SEED) -> str:
+    """
+        Write the downsampled copy (same DDL, indexes and views) and its stamp, returns the copy's path.
+    """
+    out_path = out_path or sample_path(db_path)
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    tmp_path: str = f"{out_path}.tmp{os.getpid()}"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    schema: DatabaseSchema = load_schema(db_path)
+
+    # URI filenames so the source can be attached read-only
+    conn: Connection = sqlite3.connect(f"file:{pathname2url(os.path.abspath(tmp_path))}", uri=True)
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("ATTACH DATABASE ? AS src", (f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro",))
+        ddl: List[Any] = conn.execute(
+            "SELECT type, sql FROM src.sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+            "ORDER BY CASE type WHEN 'table' THEN 0 WHEN 'index' THEN 2 ELSE 1 END"
+        ).fetchall()
+        for kind, sql in ddl:
+            if kind in ("table", "view"):
+                conn.execute(sql)
+
+        with conn:
+            for table in schema.tables:
+                _sample_table(conn, table, max_rows, seed)
+            added: int = _close_foreign_keys(conn, schema)
+        # indexes after the bulk insert
+        for kind, sql in ddl:
+            if kind == "index":
+                conn.execute(sql)
+        conn.execute("DETACH DATABASE src")
+    finally:
+        conn.close()
+    os.replace(tmp_path, out_path)
+
+    stat = os.stat(db_path)
+    write_json(artifact_path(db_path, "sample.json"), {
+        "version": SAMPLE_VERSION, "max_rows": max_rows, "seed": seed,
+        "db_size": stat.st_size, "db_mtime_ns": stat.st_mtime_ns,
+    })
+    logger.info(f"downsampled {os.path.basename(db_path)}: {len(schema.tables)} tables, {added} parent rows added for FK closure")
+    return out_path
+
+
+def load_downsampled(db_path: str, max_rows: Optional[int] = None) -> Optional[str]:
+    """
+        Path of a fresh downsampled copy (built with `max_rows` when given), None when missing or stale.
+    """
+    stamp_path: str = artifact_path(db_path, "sample.json")
+    if not os.path.exists(stamp_path) or not os.path.exists(sample_path(db_path)):
+        return None
+    with open(stamp_path, "r", encoding="utf-8") as f:
+        stamp: Dict[str, Any] = json.load(f)
+    stat = os.stat(db_path)
+    if (stamp.get("version"), stamp.get("db_size"), stamp.get("db_mtime_ns")) != (SAMPLE_VERSION, stat.st_size, stat.st_mtime_ns):
+        return None
+    if max_rows is not None and stamp.get("max_rows") != max_rows:
+        return None
+    return sample_path(db_path)
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-23 14:20
+# @Author  : jwm
+# @File    : fingerprint.py
+# @description: Canonical fixed-size fingerprints of SQL execution results.
+
+import math
+import struct
+import hashlib
+from sqlite3 import Cursor
+from typing import Any, Iterable, NamedTuple, Optional, Sequence, Dict
+
+DIGEST_SIZE: int = 32               # blake2b-256, 64 hex characters
+FLOAT_DIGITS: int = 12              # significant digits kept by looser matches (voting), absorbs summation-order noise
+FETCH_SIZE: int = 1000
+_MASK: int = (1 << (8 * DIGEST_SIZE)) - 1
+
+
+class ResultFingerprint(NamedTuple):
+    """
+        digest: hex blake2b-256 of the canonical result
+        rows / columns: result shape (rows and the width of non-empty results are covered by the digest)
+        ordered: row order is part of the digest (ORDER BY results), otherwise rows form a multiset
+    """
+    digest: str
+    rows: int
+    columns: int
+    ordered: bool
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self._asdict()
+
+
+def canonical_value(value: Any, float_digits: Optional[int] = None) -> bytes:
+    """
+        Tagged, length-prefixed encoding: NULL, integers (bools and integral floats included, so 1 == 1.0 == True),
+        floats (exact repr, or rounded to float_digits significant digits; -0.0 and NaN folded), text and blobs.
+    """
+    if value is None:
+        return b"N"
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, float):
+        if math.isnan(value):
+            return b"F" + b"nan"
+        if math.isinf(value):
+            return b"F" + (b"inf" if value > 0 else b"-inf")
+        if value.is_integer():
+            value = int(value)
+        else:
+            if float_digits is not None:
+                value = float(f"{value:.{float_digits}g}")
+            text: bytes = repr(value).encode("ascii")
+            return b"F" + struct.pack(">I", len(text)) + text
+    if isinstance(value, int):
+        text = str(value).encode("ascii")
+        return b"I" + struct.pack(">I", len(text)) + text
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        data: bytes = bytes(value)
+        return b"B" + struct.pack(">I", len(data)) + data
+    data = str(value).encode("utf-8")
+    return b"S" + struct.pack(">I", len(data)) + data
+
+
+def canonical_row(row: Sequence[Any], float_digits: Optional[int] = None) -> bytes:
+    return struct.pack(">I", len(row)) + b"".join(canonical_value(v, float_digits) for v in row)
+
+
+class FingerprintBuilder:
+    """
+        Incremental fingerprint, rows are fed as they are fetched so a result never has to be held in memory.
+        Ordered mode chains rows into one hash; unordered mode adds per-row hashes modulo 2^256,
+        a commutative multiset hash (duplicates count). float_digits=None keeps floats exact.
+    """
+    def __init__(self, ordered: bool = False, columns: int = 0, float_digits: Optional[int] = None) -> None:
+        self.ordered: bool = ordered
+        self.columns: int = columns
+        self.float_digits: Optional[int] = float_digits
+        self.rows: int = 0
+        self._chain = hashlib.blake2b(digest_size=DIGEST_SIZE, person=b"sql-ordered")
+        self._sum: int = 0
+
+    def update(self, row: Sequence[Any]) -> None:
+        encoded: bytes = canonical_row(row, self.float_digits)
+        self.rows += 1
+        if not self.columns:
+            self.columns = len(row)
+        if self.ordered:
+            self._chain.update(encoded)
+        else:
+            row_hash: bytes = hashlib.blake2b(encoded, digest_size=DIGEST_SIZE).digest()
+            self._sum = (self._sum + int.from_bytes(row_hash, "big")) & _MASK
+
+    def update_many(self, rows: Iterable[Sequence[Any]]) -> None:
+        for row in rows:
+            self.update(row)
+
+    def result(self) -> ResultFingerprint:
+        final = hashlib.blake2b(digest_size=DIGEST_SIZE, person=b"sql-result")
+        # the column count is carried by every row encoding, empty results match whatever their shape
+        final.update(struct.pack(">?Q", self.ordered, self.rows))
+        final.update(self._chain.digest() if self.ordered else self._sum.to_bytes(DIGEST_SIZE, "big"))
+        return ResultFingerprint(final.hexdigest(), self.rows, self.columns, self.ordered)
+
+
+def fingerprint_rows(rows: Iterable[Sequence[Any]], ordered: bool = False, columns: int = 0,
+                     float_digits: Optional[int] = None) -> ResultFingerprint:
+    builder: FingerprintBuilder = FingerprintBuilder(ordered, columns, float_digits)
+    builder.update_many(rows)
+    return builder.result()
+
+
+def fingerprint_cursor(cursor: Cursor, ordered: bool = False, fetch_size: int = FETCH_SIZE,
+                       float_digits: Optional[int] = None) -> ResultFingerprint:
+    """
+        Stream an executed cursor in fetchmany batches.
+    """
+    columns: int = len(cursor.description) if cursor.description else 0
+    builder: FingerprintBuilder = FingerprintBuilder(ordered, columns, float_digits)
+    while True:
+        batch = cursor.fetchmany(fetch_size)
+        if not batch:
+            break
+        builder.update_many(batch)
+    return builder.result()
+
+
+def from_dict(data: Optional[Dict[str, Any]]) -> Optional[ResultFingerprint]:
+    if not data or data.get("digest") is None:
+        return None
+    return ResultFingerprint(data["digest"], int(data.get("rows", 0)), int(data.get("columns", 0)), bool(data.get("ordered", True)))
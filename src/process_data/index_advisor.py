@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-24 16:50
+# @Author  : jwm
+# @File    : index_advisor.py
+# @description: Index advisor over the parsed gold / predicted SQL, indexes are built on a private working copy of the database.
+
+import os
+import re
+import json
+import time
+import sqlite3
+from collections import Counter, defaultdict
+from sqlite3 import Connection
+from typing import Dict, List, Any, Optional, Set, Tuple, Iterable
+from urllib.request import pathname2url
+
+from loguru import logger
+from pydantic import BaseModel
+
+from process_data.artifacts import artifact_path, write_json
+from process_data.connection import connect_readonly
+from process_data.fingerprint import ResultFingerprint, fingerprint_cursor
+from process_data.introspection import load_schema
+from process_data.parser_sql import get_sql, WHERE_OPS, UNIT_OPS, AGG_OPS
+from process_data.schema_generator import Schema
+
+INDEX_VERSION: int = 2            # 2: verified with exact float fingerprints
+MIN_QUERIES: int = 2                # an index has to serve at least this many queries
+MAX_INDEX_COLUMNS: int = 6          # covering columns are only appended while the index stays this narrow
+MAX_INDEXES_PER_TABLE: int = 4
+MAX_ROUNDS: int = 3                 # verification rounds, covering indexes behind a changed result are narrowed between them
+
+_EQUALITY_OPS: Set[int] = {WHERE_OPS.index(op) for op in ("=", "in", "is")}
+_RANGE_OPS: Set[int] = {WHERE_OPS.index(op) for op in (">", "<", ">=", "<=", "between")}
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def indexed_path(db_path: str) -> str:
+    return artifact_path(db_path, "indexed.sqlite")
+
+
+class IndexCandidate(BaseModel):
+    """
+        Attributes:
+            table: table name as declared
+            columns: key columns (equality, then one range column) followed by covering columns
+            equality: leading equality columns; an index on them alone keeps rowid order among equal keys
+            queries: number of parsed queries the index serves
+    """
+    table: str
+    columns: List[str]
+    equality: int = 0
+    queries: int = 0
+
+    def name(self, i: int) -> str:
+        return f"advisor_{self.table}_{i}".replace(" ", "_")
+
+
+class _QueryColumns:
+    """
+        Columns one query uses per table: equality (filters and join keys), ranges, and the rest (select, group, order).
+    """
+    def __init__(self, known: Set[str]) -> None:
+        self.known: Set[str] = known
+        self.equality: Dict[str, List[str]] = defaultdict(list)
+        self.range: Dict[str, List[str]] = defaultdict(list)
+        self.other: Dict[str, List[str]] = defaultdict(list)
+
+    def _add(self, bucket: Dict[str, List[str]], col_id: Any) -> None:
+        if not isinstance(col_id, str) or col_id not in self.known:
+            return
+        table, column = col_id.split(".", 1)
+        if column not in bucket[table]:
+            bucket[table].append(column)
+
+    def other_columns(self, obj: Any) -> None:
+        # any "table.column" id nested in a select / group / order item
+        if isinstance(obj, str):
+            self._add(self.other, obj)
+        elif isinstance(obj, (tuple, list)):
+            for item in obj:
+                self.other_columns(item)
+        elif isinstance(obj, dict):
+            self.walk(obj)
+
+    def _plain_column(self, val_unit: Any) -> Optional[str]:
+        # a bare column (no arithmetic, no aggregate) is the only thing an index can serve
+        if not isinstance(val_unit, tuple) or len(val_unit) != 3 or val_unit[0] != UNIT_OPS.index("none"):
+            return None
+        col_unit = val_unit[1]
+        if not isinstance(col_unit, tuple) or len(col_unit) != 3 or col_unit[0] != AGG_OPS.index("none"):
+            return None
+        return col_unit[1] if isinstance(col_unit[1], str) else None
+
+    def conditions(self, conds: Any) -> None:
+        for cond in conds or []:
+            if not isinstance(cond, tuple) or len(cond) != 5:
+                continue
+            not_op, op_id, val_unit, val1, val2 = cond
+            column: Optional[str] = self._plain_column(val_unit)
+            is_join: bool = isinstance(val1, tuple) and len(val1) == 3 and isinstance(val1[1], str)
+            if column is None or not_op:
+                self.other_columns(val_unit)
+            elif op_id in _EQUALITY_OPS:
+                self._add(self.equality, column)
+                if is_join and val1[0] == AGG_OPS.index("none"):
+                    self._add(self.equality, val1[1])
+            elif op_id in _RANGE_OPS:
+                self._add(self.range, column)
+            else:
+                self._add(self.other, column)
+            for value in (val1, val2):
+                if isinstance(value, dict):
+                    self.walk(value)
+
+    def walk(self, sql: Dict[str, Any]) -> None:
+        for _, unit in (sql.get("from") or {}).get("table_units", []):
+            if isinstance(unit, dict):
+                self.walk(unit)
+        self.conditions((sql.get("from") or {}).get("conds"))
+        self.conditions(sql.get("where"))
+        self.conditions(sql.get("having"))
+        select = sql.get("select")
+        if isinstance(select, tuple) and len(select) == 2:
+            self.other_columns(select[1])
+        self.other_columns(sql.get("groupBy"))
+        order_by = sql.get("orderBy")
+        if isinstance(order_by, tuple) and len(order_by) == 2:
+            self.other_columns(order_by[1])
+        for op in ("intersect", "union", "except"):
+            if isinstance(sql.get(op), dict):
+                self.walk(sql[op])
+
+    def candidates(self) -> List[IndexCandidate]:
+        result: List[IndexCandidate] = []
+        for table in set(self.equality) | set(self.range):
+            key: List[str] = sorted(self.equality.get(table, []))
+            equality: int = len(key)
+            ranges: List[str] = [c for c in self.range.get(table, []) if c not in key]
+            if ranges:
+                key.append(ranges[0])
+            covering: List[str] = key + [
+                c for c in self.other.get(table, []) + self.range.get(table, []) if c not in key
+            ]
+            covering = list(dict.fromkeys(covering))
+            result.append(IndexCandidate(
+                table=table, columns=covering if len(covering) <= MAX_INDEX_COLUMNS else key, equality=equality
+            ))
+        return result
+
+
+def _existing_prefixes(conn: Connection, table: str) -> List[List[str]]:
+    # column lists of the indexes a table already has (rowid alias primary keys included)
+    prefixes: List[List[str]] = []
+    for row in conn.execute(f"PRAGMA index_list({_quote(table)})").fetchall():
+        columns = [r[2] for r in conn.execute(f"PRAGMA index_info({_quote(row[1])})").fetchall()]
+        if all(c is not None for c in columns):
+            prefixes.append([c.lower() for c in columns])
+    pk = [r for r in conn.execute(f"PRAGMA table_info({_quote(table)})").fetchall() if r[5]]
+    if len(pk) == 1 and str(pk[0][2]).upper() == "INTEGER":
+        prefixes.append([pk[0][1].lower()])
+    return prefixes
+
+
+def advise_indexes(db_path: str, sqls: Iterable[str], min_queries: int = MIN_QUERIES) -> List[IndexCandidate]:
+    """
+        Parse every query with get_sql and count the index each one would want per table;
+        candidates already covered by an existing index, or by a longer candidate, are folded away.
+    """
+    db_schema = load_schema(db_path)
+    names: Dict[str, str] = {t.name.lower(): t.name for t in db_schema.tables}
+    schema: Schema = Schema({t.name.lower(): [c.name.lower() for c in t.columns] for t in db_schema.tables})
+    known: Set[str] = {key for key in schema.idMap if "." in key}
+
+    counts: Counter = Counter()
+    equality: Dict[Tuple[str, Tuple[str, ...]], int] = {}
+    for sql in sqls:
+        try:
+            parsed: Dict[str, Any] = get_sql(schema, sql)
+        except Exception as e:
+            logger.debug(f"index advisor: unparsable SQL skipped ({e})")
+            continue
+        usage: _QueryColumns = _QueryColumns(known)
+        usage.walk(parsed)
+        for candidate in usage.candidates():
+            counts[(candidate.table, tuple(candidate.columns))] += 1
+            equality[(candidate.table, tuple(candidate.columns))] = candidate.equality
+
+    conn: Connection = connect_readonly(db_path)
+    try:
+        existing: Dict[str, List[List[str]]] = {table: _existing_prefixes(conn, names[table]) for table in {t for t, _ in counts}}
+    finally:
+        conn.close()
+
+    # fold each candidate into the most used longer candidate it is a prefix of
+    folded: Counter = Counter()
+    for (table, columns), n in sorted(counts.items(), key=lambda item: -len(item[0][1])):
+        target = next(
+            (key for key in folded if key[0] == table and len(key[1]) > len(columns) and key[1][:len(columns)] == columns),
+            (table, columns),
+        )
+        folded[target] += n
+
+    chosen: List[IndexCandidate] = []
+    per_table: Counter = Counter()
+    for (table, columns), n in folded.most_common():
+        if n < min_queries or per_table[table] >= MAX_INDEXES_PER_TABLE:
+            continue
+        if any(prefix[:len(columns)] == list(columns) for prefix in existing[table]):
+            continue
+        per_table[table] += 1
+        chosen.append(IndexCandidate(table=names[table], columns=list(columns), equality=equality[(table, columns)], queries=n))
+    return chosen
+
+
+def _timed(conn: Connection, sql: str, timeout: Optional[float]) -> Tuple[Optional[ResultFingerprint], float, Optional[str]]:
+    begin: float = time.perf_counter()
+    if timeout is not None:
+        deadline: float = time.monotonic() + timeout
+        conn.set_progress_handler(lambda: int(time.monotonic() > deadline), 10000)
+    try:
+        return fingerprint_cursor(conn.execute(sql), ordered=True), time.perf_counter() - begin, None
+    except Exception as e:
+        return None, time.perf_counter() - begin, str(e)
+    finally:
+        conn.set_progress_handler(None, 0)
+
+
+def _create_index(name: str, candidate: IndexCandidate) -> str:
+    return f"CREATE INDEX {_quote(name)} ON {_quote(candidate.table)} ({', '.join(_quote(c) for c in candidate.columns)})"
+
+
+def _plan_indexes(conn: Connection, sql: str, names: Dict[str, Any]) -> Set[str]:
+    try:
+        plan: List[str] = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()]
+    except Exception:
+        return set()
+    # whole names: advisor_t_1 must not match a plan using advisor_t_12
+    return {name for name in names if any(re.search(rf"INDEX {re.escape(name)}\b", detail) for detail in plan)}
+
+
+def _copy_database(db_path: str, out_path: str) -> None:
+    # the original is only ever opened read-only
+    source: Connection = sqlite3.connect(f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro", uri=True)
+    target: Connection = sqlite3.connect(out_path)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+
+
+def build_indexed_copy(
+        db_path: str,
+        items: List[Tuple[int, str]],
+        extra_sqls: Optional[List[str]] = None,
+        timeout: Optional[float] = None,
+        min_queries: int = MIN_QUERIES
+    ) -> Dict[str, Any]:
+    """
+        Copy the database, create the advised indexes on the copy, then run every gold and predicted query on both files.
+        A result that differs on the copy (usually row order without ORDER BY) narrows the covering indexes its plan
+        used to their equality columns; a gold query whose result still differs is marked unequal and keeps running
+        on the original. The report (indexes.json) keeps per-query timings and speedups, the copy is removed when
+        no gold query is served by it.
+    """
+    out_path: str = indexed_path(db_path)
+    tmp_path: str = f"{out_path}.tmp{os.getpid()}"
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    stat = os.stat(db_path)
+    candidates: List[IndexCandidate] = advise_indexes(db_path, [sql for _, sql in items] + list(extra_sqls or []), min_queries)
+    report: Dict[str, Any] = {
+        "version": INDEX_VERSION, "db_size": stat.st_size, "db_mtime_ns": stat.st_mtime_ns,
+        "indexes": [], "narrowed": [], "queries": {}, "speedup": None,
+    }
+
+    if candidates:
+        for path in (tmp_path, f"{tmp_path}-journal"):
+            if os.path.exists(path):
+                os.remove(path)
+        _copy_database(db_path, tmp_path)
+        conn: Connection = sqlite3.connect(tmp_path)
+        try:
+            for i, candidate in enumerate(candidates):
+                conn.execute(_create_index(candidate.name(i), candidate))
+            conn.execute("ANALYZE")
+            conn.commit()
+        finally:
+            conn.close()
+
+        # gold queries are timed and reported, predicted ones take part in the narrowing only
+        checks: List[Tuple[str, str]] = [(str(qid), sql) for qid, sql in items]
+        checks += [(f"pred_{i}", sql) for i, sql in enumerate(extra_sqls or [])]
+        baseline: Dict[str, Tuple[Optional[ResultFingerprint], float, Optional[str]]] = {}
+        source: Connection = connect_readonly(db_path)
+        try:
+            for key, sql in checks:
+                baseline[key] = _timed(source, sql, timeout)
+        finally:
+            source.close()
+
+        sqls: Dict[str, str] = dict(checks)
+        active: Dict[str, IndexCandidate] = {c.name(i): c for i, c in enumerate(candidates)}
+        indexed: Dict[str, Tuple[Optional[ResultFingerprint], float, Optional[str]]] = {}
+        changed: List[str] = []
+        for _ in range(MAX_ROUNDS):
+            copy: Connection = connect_readonly(tmp_path)
+            try:
+                indexed = {key: _timed(copy, sql, timeout) for key, sql in checks if baseline[key][0] is not None}
+                changed = [key for key, run in indexed.items() if run[0] != baseline[key][0]]
+                # row order without ORDER BY follows the plan: narrow the covering indexes a changed query was planned with
+                narrow: Set[str] = {
+                    name for key in changed for name in _plan_indexes(copy, sqls[key], active)
+                    if 0 < active[name].equality < len(active[name].columns)
+                }
+            finally:
+                copy.close()
+            if not narrow:
+                break
+            writer: Connection = sqlite3.connect(tmp_path)
+            try:
+                for name in narrow:
+                    # equality columns only: lookups on them still come out in rowid order
+                    candidate: IndexCandidate = active[name]
+                    active[name] = candidate.model_copy(update={"columns": candidate.columns[:candidate.equality]})
+                    writer.execute(f"DROP INDEX {_quote(name)}")
+                    writer.execute(_create_index(name, active[name]))
+                    report["narrowed"].append(candidate.model_dump())
+                writer.execute("ANALYZE")
+                writer.commit()
+            finally:
+                writer.close()
+
+        for key, (_, seconds, error) in baseline.items():
+            if key.startswith("pred_"):
+                continue
+            run = indexed.get(key)
+            equal: bool = run is not None and key not in changed
+            report["queries"][key] = {
+                "equal": equal,
+                "baseline": seconds,
+                "indexed": run[1] if run is not None else None,
+                "speedup": seconds / run[1] if equal and run[1] > 0 else None,
+                "error": error,
+            }
+        timed = [q for q in report["queries"].values() if q["equal"]]
+        indexed_total: float = sum(q["indexed"] for q in timed)
+        report["speedup"] = sum(q["baseline"] for q in timed) / indexed_total if indexed_total > 0 else None
+        report["indexes"] = [c.model_dump() for c in active.values()] if timed else []
+        if changed:
+            logger.debug(f"{os.path.basename(db_path)}: {len(changed)} results differ on the indexed copy, those queries stay on the original")
+
+    if report["indexes"]:
+        os.replace(tmp_path, out_path)
+        copy_stat = os.stat(out_path)
+        report["copy_size"], report["copy_mtime_ns"] = copy_stat.st_size, copy_stat.st_mtime_ns
+        logger.debug(f"{os.path.basename(db_path)}: {len(report['indexes'])} indexes, gold queries {report['speedup'] or 0:.2f}x faster")
+    else:
+        for path in (tmp_path, out_path):
+            if os.path.exists(path):
+                os.remove(path)
+    write_json(artifact_path(db_path, "indexes.json"), report)
+    return report
+
+
+def load_indexed(db_path: str, question_id: int) -> Optional[str]:
+    """
+        Path of the indexed working copy of a database when the gold query of `question_id` was verified on it,
+        None when there is none, the query's result differs there, or either file changed since.
+    """
+    report_path: str = artifact_path(db_path, "indexes.json")
+    out_path: str = indexed_path(db_path)
+    if not os.path.exists(report_path) or not os.path.exists(out_path):
+        return None
+    with open(report_path, "r", encoding="utf-8") as f:
+        report: Dict[str, Any] = json.load(f)
+    stat, copy_stat = os.stat(db_path), os.stat(out_path)
+    if (report.get("version"), report.get("db_size"), report.get("db_mtime_ns")) != (INDEX_VERSION, stat.st_size, stat.st_mtime_ns):
+        return None
+    if (report.get("copy_size"), report.get("copy_mtime_ns")) != (copy_stat.st_size, copy_stat.st_mtime_ns):
+        return None
+    entry: Dict[str, Any] = report.get("queries", {}).get(str(question_id), {})
+    return out_path if report.get("indexes") and entry.get("equal") else None
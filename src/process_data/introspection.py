@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-22 15:30
+# @Author  : jwm
+# @File    : introspection.py
+# @description: Single-pass rich schema introspection persisted as a per-database artifact.
+
+import os
+import json
+import threading
+from sqlite3 import Connection
+from typing import Dict, List, Any, Optional
+
+from loguru import logger
+from pydantic import BaseModel
+
+from process_data.connection import connect_readonly
+from process_data.artifacts import artifact_path, write_json
+from process_data.replica import replica_source
+
+ARTIFACT_VERSION: int = 2             # 2: tables in sqlite_master (creation) order
+SAMPLE_ROWS: int = 50
+SAMPLE_VALUES: int = 3
+
+
+class ColumnInfo(BaseModel):
+    """
+        Attributes:
+            name: column name as declared
+            type: declared type, may be empty in sqlite
+            notnull: NOT NULL constraint
+            pk: position in the primary key, 0 if not part of it
+            samples: a few distinct non-null values
+    """
+    name: str
+    type: str = ""
+    notnull: bool = False
+    pk: int = 0
+    samples: List[Any] = []
+
+
+class ForeignKey(BaseModel):
+    table: str
+    column: str
+    ref_table: str
+    ref_column: Optional[str] = None
+
+
+class TableInfo(BaseModel):
+    name: str
+    columns: List[ColumnInfo] = []
+    row_count: int = 0
+
+    @property
+    def primary_keys(self) -> List[str]:
+        return [c.name for c in sorted(self.columns, key=lambda c: c.pk) if c.pk]
+
+
+class DatabaseSchema(BaseModel):
+    """
+        Tables, columns, types, PK/FK edges, row counts and sample values of one database.
+        db_size / db_mtime_ns identify the database file the artifact was built from.
+    """
+    version: int = ARTIFACT_VERSION
+    db_id: str
+    tables: List[TableInfo] = []
+    foreign_keys: List[ForeignKey] = []
+    db_size: int = 0
+    db_mtime_ns: int = 0
+
+    def table(self, name: str) -> Optional[TableInfo]:
+        lowered: str = name.lower()
+        return next((t for t in self.tables if t.name.lower() == lowered), None)
+
+    def column_names(self) -> Dict[str, List[str]]:
+        return {t.name: [c.name for c in t.columns] for t in self.tables}
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def introspect(conn: Connection, db_id: str = "", sample_values: int = SAMPLE_VALUES) -> DatabaseSchema:
+    """
+        Gather everything with the pragma_table_info / pragma_foreign_key_list table-valued
+        functions joined to sqlite_master (one statement each), one UNION ALL for row counts
+        and one LIMITed scan per table for samples.
+    """
+    tables: Dict[str, TableInfo] = {}
+    for table, name, col_type, notnull, pk in conn.execute(
+        "SELECT m.name, p.name, p.type, p.\"notnull\", p.pk "
+        "FROM sqlite_master AS m JOIN pragma_table_info(m.name) AS p "
+        "WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%' ORDER BY m.rowid, p.cid"
+    ):
+        tables.setdefault(table, TableInfo(name=table)).columns.append(
+            ColumnInfo(name=name, type=col_type or "", notnull=bool(notnull), pk=pk)
+        )
+
+    foreign_keys: List[ForeignKey] = [
+        ForeignKey(table=table, column=from_col, ref_table=ref_table, ref_column=to_col)
+        for table, ref_table, from_col, to_col in conn.execute(
+            "SELECT m.name, f.\"table\", f.\"from\", f.\"to\" "
+            "FROM sqlite_master AS m JOIN pragma_foreign_key_list(m.name) AS f "
+            "WHERE m.type = 'table' ORDER BY m.rowid, f.id, f.seq"
+        )
+    ]
+    for fk in foreign_keys:
+        # a reference without column list points at the parent primary key
+        if fk.ref_column is None and fk.ref_table in tables and tables[fk.ref_table].primary_keys:
+            fk.ref_column = tables[fk.ref_table].primary_keys[0]
+
+    if tables:
+        counts_sql: str = " UNION ALL ".join(
+            f"SELECT {i}, count(*) FROM {_quote(name)}" for i, name in enumerate(tables)
+        )
+        names: List[str] = list(tables)
+        for i, count in conn.execute(counts_sql):
+            tables[names[i]].row_count = count
+
+    if sample_values > 0:
+        for table in tables.values():
+            try:
+                rows = conn.execute(f"SELECT * FROM {_quote(table.name)} LIMIT {SAMPLE_ROWS}").fetchall()
+            except Exception as e:
+                logger.debug(f"samples of {table.name} skipped: {e}")
+                continue
+            for i, column in enumerate(table.columns):
+                seen: List[Any] = []
+                for row in rows:
+                    value = row[i] if i < len(row) else None
+                    if value is None or isinstance(value, bytes) or value in seen:
+                        continue
+                    seen.append(value[:64] if isinstance(value, str) else value)
+                    if len(seen) >= sample_values:
+                        break
+                column.samples = seen
+
+    return DatabaseSchema(db_id=db_id, tables=list(tables.values()), foreign_keys=foreign_keys)
+
+
+def schema_artifact_path(db_path: str) -> str:
+    return artifact_path(db_path, "schema.json")
+
+
+def build_schema_artifact(db_path: str, output_path: Optional[str] = None) -> DatabaseSchema:
+    conn: Connection = connect_readonly(db_path)
+    try:
+        schema: DatabaseSchema = introspect(conn, os.path.splitext(os.path.basename(db_path))[0])
+    finally:
+        conn.close()
+    stat = os.stat(db_path)
+    schema.db_size, schema.db_mtime_ns = stat.st_size, stat.st_mtime_ns
+    write_json(output_path or schema_artifact_path(db_path), schema.model_dump())
+    return schema
+
+
+_SCHEMAS: Dict[str, DatabaseSchema] = {}
+_SCHEMAS_LOCK = threading.Lock()
+
+
+def load_schema(db_path: str) -> DatabaseSchema:
+    """
+        Per-process cached schema of a database file, read from its artifact,
+        (re)built when missing or older than the database.
+    """
+    with _SCHEMAS_LOCK:
+        cached: Optional[DatabaseSchema] = _SCHEMAS.get(db_path)
+        if cached is not None:
+            return cached
+        path: str = schema_artifact_path(db_path)
+        stat = os.stat(db_path)
+        schema: Optional[DatabaseSchema] = None
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                schema = DatabaseSchema(**json.load(f))
+            if (schema.version, schema.db_size, schema.db_mtime_ns) != (ARTIFACT_VERSION, stat.st_size, stat.st_mtime_ns):
+                logger.info(f"schema artifact of {db_path} is stale, rebuilding")
+                schema = None
+        if schema is None:
+            schema = build_schema_artifact(db_path, path)
+        _SCHEMAS[db_path] = schema
+        return schema
+
+
+def connection_path(conn: Connection) -> str:
+    """
+        File of the main database of a connection (the source file for a replica), empty for in-memory databases.
+    """
+    return replica_source(conn) or conn.execute("PRAGMA database_list").fetchall()[0][2]
@@ -30,7 +30,6 @@ import sqlite3
 
 from loguru import logger
 from typing import Dict, List, Any, Tuple, Optional
-from nltk import word_tokenize
 
 from process_data.schema_generator import Schema
 
@@ -98,6 +97,8 @@ def tokenize(string: str) -> List[str]:
         string = string[:qidx1] + key + string[qidx2+1:]
         vals[key] = val
 
+    # NLTK is only needed by this legacy tokenizer, import it on first use.
+    from nltk import word_tokenize
     toks: List[str] = [word.lower() for word in word_tokenize(string)]
     # replace with string value token
     for i in range(len(toks)):
@@ -761,6 +762,51 @@ def skip_semicolon(toks, start_idx):
         idx += 1
     return idx
 
+class IncrementalSqlExtractor:
+    """
+        extract_sql over a growing buffer (streamed completions): feed deltas,
+        the SQL is returned as soon as the first ```sql block is closed.
+        Each delta is scanned once, only a fence-sized overlap is re-read.
+    """
+    OPEN: str = "```sql"
+    CLOSE: str = "```"
+
+    def __init__(self) -> None:
+        self.buffer: str = ""
+        self._open_end: Optional[int] = None
+        self._scan_from: int = 0
+        self.end: Optional[int] = None
+
+    def feed(self, delta: str) -> Optional[str]:
+        if self.end is not None:
+            return self.sql
+        self.buffer += delta
+        if self._open_end is None:
+            begin: int = self.buffer.find(self.OPEN, self._scan_from)
+            if begin < 0:
+                self._scan_from = max(0, len(self.buffer) - len(self.OPEN) + 1)
+                return None
+            self._open_end = self._scan_from = begin + len(self.OPEN)
+        close: int = self.buffer.find(self.CLOSE, self._scan_from)
+        if close < 0:
+            self._scan_from = max(self._open_end, len(self.buffer) - len(self.CLOSE) + 1)
+            return None
+        self.end = close + len(self.CLOSE)
+        return self.sql
+
+    @property
+    def sql(self) -> Optional[str]:
+        if self.end is None or self._open_end is None:
+            return None
+        return self.buffer[self._open_end:self.end - len(self.CLOSE)].replace("\n", " ").strip()
+
+    def finish(self) -> str:
+        """
+            Result once the stream ended, same as extract_sql on the whole buffer.
+        """
+        return self.sql if self.sql is not None else extract_sql(self.buffer)
+
+
 def extract_sql(response: str) -> str:
     pattern: str = r'```sql(.*?)```'
     matches = re.findall(pattern, response, re.DOTALL)
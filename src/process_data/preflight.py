@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-24 10:30
+# @Author  : jwm
+# @File    : preflight.py
+# @description: Pre-execution checks of generated SQL: prepare via EXPLAIN, cost guess via EXPLAIN QUERY PLAN.
+
+import os
+import re
+import threading
+from sqlite3 import Connection
+from typing import Dict, List, Optional, NamedTuple
+
+from loguru import logger
+
+from process_data.introspection import load_schema
+
+COST_THRESHOLD: float = 1e7         # estimated row visits above which a multi-table plan is "expensive"
+
+_SCAN = re.compile(r"^SCAN (?:TABLE )?(.+?)(?: AS (\S+))?(?: USING (?:COVERING )?INDEX .*)?$")
+_AUTO_INDEX = re.compile(r"^SEARCH (?:TABLE )?(.+?)(?: AS (\S+))? USING AUTOMATIC")
+_ALIAS = re.compile(
+    r"(?:\bfrom|\bjoin|,)\s*(\"[^\"]+\"|`[^`]+`|\[[^\]]+\]|\w+)(?:\s+(?:as\s+)?(?!(?:on|using|where|join|inner|left|right|"
+    r"cross|natural|full|outer|group|order|limit|union|having|except|intersect|from|and|or|when|then|else|end)\b)(\w+))?",
+    re.IGNORECASE,
+)
+
+
+class Preflight(NamedTuple):
+    """
+        ok: the statement prepares (syntax, tables, columns, functions resolve)
+        error: sqlite's message when it doesn't
+        scans: tables read in full by the plan
+        estimated_rows: rough row visits (nested full scans multiply, automatic indexes add)
+        expensive: more than one full scan and estimated_rows above the threshold
+    """
+    ok: bool
+    error: Optional[str] = None
+    scans: List[str] = []
+    estimated_rows: float = 0.0
+    expensive: bool = False
+
+
+def _unquote(name: str) -> str:
+    return name.strip().strip('"`[]').lower()
+
+
+def table_aliases(sql: str) -> Dict[str, str]:
+    """
+        alias -> table for FROM / JOIN items, good enough to name the tables of a query plan.
+    """
+    aliases: Dict[str, str] = {}
+    for table, alias in _ALIAS.findall(sql):
+        table = _unquote(table)
+        aliases[table] = table
+        if alias:
+            aliases[alias.lower()] = table
+    return aliases
+
+
+def preflight(conn: Connection, sql: str, row_counts: Optional[Dict[str, int]] = None, threshold: float = COST_THRESHOLD) -> Preflight:
+    """
+        Compile the statement without running it; on success look for unindexed multi-table scans.
+    """
+    try:
+        conn.execute(f"EXPLAIN {sql}").fetchone()
+        plan: List[str] = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()]
+    except Exception as e:
+        return Preflight(ok=False, error=str(e))
+
+    row_counts = row_counts or {}
+    aliases: Dict[str, str] = table_aliases(sql)
+    scans: List[str] = []
+    product: float = 1.0
+    additive: float = 0.0
+    for detail in plan:
+        scan = _SCAN.match(detail)
+        auto = _AUTO_INDEX.match(detail)
+        match = scan or auto
+        if match is None:
+            continue
+        name: str = _unquote(match.group(2) or match.group(1))
+        table: str = aliases.get(name, name)
+        if table not in row_counts:
+            # subqueries, CTEs, constant rows
+            continue
+        rows: int = max(1, row_counts[table])
+        if scan is not None:
+            scans.append(table)
+            product *= rows
+        else:
+            additive += rows
+    estimated: float = (product if scans else 0.0) + additive
+    return Preflight(
+        ok=True,
+        scans=scans,
+        estimated_rows=estimated,
+        expensive=len(scans) > 1 and estimated > threshold,
+    )
+
+
+def table_row_counts(db_path: str) -> Dict[str, int]:
+    """
+        Lower-cased table -> row count, from the introspection artifact.
+    """
+    return {t.name.lower(): t.row_count for t in load_schema(db_path).tables}
+
+
+_STATS: Dict[str, int] = {"checked": 0, "rejected": 0, "expensive": 0}
+_STATS_LOCK = threading.Lock()
+
+
+def check_sql(conn: Connection, db_path: str, sql: str) -> Preflight:
+    """
+        preflight() with the database's row counts and the PREFLIGHT_COST_THRESHOLD override, counted in preflight_stats().
+    """
+    threshold: float = float(os.getenv("PREFLIGHT_COST_THRESHOLD") or COST_THRESHOLD)
+    result: Preflight = preflight(conn, sql, table_row_counts(db_path), threshold)
+    with _STATS_LOCK:
+        _STATS["checked"] += 1
+        _STATS["rejected"] += int(not result.ok)
+        _STATS["expensive"] += int(result.expensive)
+    if not result.ok:
+        logger.debug(f"preflight rejected SQL: {result.error}")
+    elif result.expensive:
+        logger.debug(f"preflight: expensive plan, full scans of {result.scans}, ~{result.estimated_rows:.0e} rows")
+    return result
+
+
+def expensive_timeout() -> Optional[float]:
+    """
+        Seconds allowed to a query with an expensive plan, None (no budget) unless PREFLIGHT_EXPENSIVE_TIMEOUT is set:
+        a budget can turn a correct but slow prediction into a wrong one.
+    """
+    value: float = float(os.getenv("PREFLIGHT_EXPENSIVE_TIMEOUT") or 0)
+    return value if value > 0 else None
+
+
+def preflight_stats() -> Dict[str, int]:
+    with _STATS_LOCK:
+        return dict(_STATS)
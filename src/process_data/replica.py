@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-24 14:10
+# @Author  : jwm
+# @File    : replica.py
+# @description: In-memory replicas of hot databases under a global memory budget.
+
+import os
+import time
+import sqlite3
+import itertools
+import threading
+from collections import OrderedDict
+from sqlite3 import Connection
+from typing import Dict, Optional, Tuple, Any
+from urllib.request import pathname2url
+
+from loguru import logger
+
+_NAMES = itertools.count()
+
+
+class ReplicaConnection(Connection):
+    """
+        Connection to a replica, remembers the database file it was copied from.
+    """
+    source_path: str = ""
+
+
+class _Replica:
+    def __init__(self, db_path: str, anchor: Connection, uri: str, size: int, stamp: Tuple[int, int]) -> None:
+        self.db_path: str = db_path
+        self.anchor: Connection = anchor      # keeps the shared-cache memory database alive
+        self.uri: str = uri
+        self.size: int = size
+        self.stamp: Tuple[int, int] = stamp
+
+
+class ReplicaManager:
+    """
+        Copies databases into named shared-cache :memory: databases with the backup API; every
+        reader gets its own query_only connection to the copy. Least recently used replicas are
+        dropped to stay under `budget` bytes, a database larger than the budget is never copied.
+    """
+    def __init__(self, budget: int) -> None:
+        self.budget: int = budget
+        self._replicas: "OrderedDict[str, _Replica]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[str, threading.Lock] = {}
+        self._too_large: Dict[str, Tuple[int, int]] = {}
+        self._stats: Dict[str, Any] = {"hits": 0, "misses": 0, "loads": 0, "evictions": 0, "load_seconds": 0.0}
+
+    @staticmethod
+    def _stamp(db_path: str) -> Tuple[int, int]:
+        stat = os.stat(db_path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def _load(self, db_path: str, stamp: Tuple[int, int]) -> _Replica:
+        begin: float = time.perf_counter()
+        uri: str = f"file:replica{next(_NAMES)}?mode=memory&cache=shared"
+        source: Connection = sqlite3.connect(f"file:{pathname2url(db_path)}?mode=ro", uri=True)
+        anchor: Connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        try:
+            source.backup(anchor)
+        except Exception:
+            anchor.close()
+            raise
+        finally:
+            source.close()
+        page_count: int = anchor.execute("PRAGMA page_count").fetchone()[0]
+        page_size: int = anchor.execute("PRAGMA page_size").fetchone()[0]
+        with self._lock:
+            self._stats["loads"] += 1
+            self._stats["load_seconds"] += time.perf_counter() - begin
+        return _Replica(db_path, anchor, uri, page_count * page_size, stamp)
+
+    def _evict_for(self, size: int) -> None:
+        # caller holds self._lock
+        while self._replicas and self.resident() + size > self.budget:
+            _, replica = self._replicas.popitem(last=False)
+            replica.anchor.close()
+            self._stats["evictions"] += 1
+
+    def resident(self) -> int:
+        return sum(r.size for r in self._replicas.values())
+
+    def _replica(self, db_path: str) -> Optional[_Replica]:
+        stamp: Tuple[int, int] = self._stamp(db_path)
+        with self._lock:
+            replica: Optional[_Replica] = self._replicas.get(db_path)
+            if replica is not None and replica.stamp == stamp:
+                self._replicas.move_to_end(db_path)
+                self._stats["hits"] += 1
+                return replica
+            self._stats["misses"] += 1
+            if stamp[0] > self.budget or self._too_large.get(db_path) == stamp:
+                return None
+            loading: threading.Lock = self._loading.setdefault(db_path, threading.Lock())
+
+        with loading:
+            with self._lock:
+                replica = self._replicas.get(db_path)
+                if replica is not None and replica.stamp == stamp:
+                    return replica
+            replica = self._load(db_path, stamp)
+            with self._lock:
+                stale: Optional[_Replica] = self._replicas.pop(db_path, None)
+                if stale is not None:
+                    stale.anchor.close()
+                if replica.size > self.budget:
+                    self._too_large[db_path] = stamp
+                    replica.anchor.close()
+                    return None
+                self._evict_for(replica.size)
+                self._replicas[db_path] = replica
+            logger.debug(f"replica of {os.path.basename(db_path)} loaded, {replica.size >> 20} MB resident")
+            return replica
+
+    def connect(self, db_path: str, check_same_thread: bool = True) -> Optional[Connection]:
+        """
+            A new read-only connection to the replica of `db_path`, None when it can't be replicated.
+        """
+        db_path = os.path.abspath(db_path)
+        replica: Optional[_Replica] = self._replica(db_path)
+        if replica is None:
+            return None
+        conn = sqlite3.connect(replica.uri, uri=True, check_same_thread=check_same_thread, factory=ReplicaConnection)
+        conn.source_path = db_path
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total: int = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": self._stats["hits"] / total if total else 0.0,
+                "replicas": len(self._replicas),
+                "resident_mb": self.resident() / (1 << 20),
+                "budget_mb": self.budget / (1 << 20),
+            }
+
+
+_MANAGER: Optional[ReplicaManager] = None
+_MANAGER_LOCK = threading.Lock()
+
+
+def get_replicas() -> Optional[ReplicaManager]:
+    """
+        Process wide manager when DB_REPLICA_BUDGET_MB is set, None otherwise.
+    """
+    global _MANAGER
+    budget_mb: float = float(os.getenv("DB_REPLICA_BUDGET_MB") or 0)
+    if budget_mb <= 0:
+        return None
+    with _MANAGER_LOCK:
+        if _MANAGER is None:
+            _MANAGER = ReplicaManager(int(budget_mb * (1 << 20)))
+        return _MANAGER
+
+
+def replica_connection(db_path: str, check_same_thread: bool = True) -> Optional[Connection]:
+    manager: Optional[ReplicaManager] = get_replicas()
+    return manager.connect(db_path, check_same_thread) if manager is not None else None
+
+
+def replica_source(conn: Connection) -> Optional[str]:
+    """
+        Database file a replica connection was copied from.
+    """
+    return conn.source_path if isinstance(conn, ReplicaConnection) else None
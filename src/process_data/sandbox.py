@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-23 16:40
+# @Author  : jwm
+# @File    : sandbox.py
+# @description: Long-lived subprocesses executing untrusted SQL under memory / CPU limits.
+
+import os
+import time
+import queue
+import atexit
+import sqlite3
+import itertools
+import threading
+import multiprocessing
+from collections import OrderedDict
+from multiprocessing.connection import Connection as Pipe
+from typing import Dict, Optional, Any, Tuple
+
+from loguru import logger
+
+from process_data.connection import connect_readonly
+from process_data.fingerprint import ResultFingerprint, fingerprint_cursor
+
+MAX_CONNECTIONS: int = 8        # warm read-only connections kept per worker
+KILL_GRACE: float = 2.0         # seconds past the query deadline before the worker is killed
+
+
+class SandboxError(Exception):
+    pass
+
+
+class SandboxTimeout(SandboxError, TimeoutError):
+    pass
+
+
+class SandboxCrashed(SandboxError):
+    pass
+
+
+def _apply_limits(memory_mb: int) -> None:
+    import resource
+    if memory_mb > 0:
+        limit: int = memory_mb << 20
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _cpu_budget(cpu_seconds: int) -> None:
+    # RLIMIT_CPU counts the whole process lifetime: move the soft limit `cpu_seconds` past what is used so far,
+    # exceeding it raises SIGXCPU which terminates the worker
+    import resource
+    if cpu_seconds <= 0:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft: int = int(usage.ru_utime + usage.ru_stime) + cpu_seconds + 1
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _worker_main(pipe: Pipe, memory_mb: int, cpu_seconds: int) -> None:
+    """
+        Worker loop. Request: (job_id, db_path, sql, timeout, ordered).
+        Response: (job_id, True, (digest, rows, columns, ordered)) or (job_id, False, error message).
+    """
+    _apply_limits(memory_mb)
+    connections: "OrderedDict[str, sqlite3.Connection]" = OrderedDict()
+    while True:
+        try:
+            request: Optional[Tuple[int, str, str, Optional[float], bool]] = pipe.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if request is None:
+            break
+        job_id, db_path, sql, timeout, ordered = request
+        try:
+            _cpu_budget(cpu_seconds)
+            conn: Optional[sqlite3.Connection] = connections.pop(db_path, None)
+            if conn is None:
+                conn = connect_readonly(db_path)
+                if len(connections) >= MAX_CONNECTIONS:
+                    connections.popitem(last=False)[1].close()
+            connections[db_path] = conn
+            if timeout is not None:
+                deadline: float = time.monotonic() + timeout
+                conn.set_progress_handler(lambda: int(time.monotonic() > deadline), 10000)
+            try:
+                cursor = conn.execute(sql)
+                fingerprint: ResultFingerprint = fingerprint_cursor(cursor, ordered)
+            finally:
+                conn.set_progress_handler(None, 0)
+            pipe.send((job_id, True, tuple(fingerprint)))
+        except MemoryError:
+            pipe.send((job_id, False, "memory limit exceeded"))
+        except Exception as e:
+            pipe.send((job_id, False, f"{type(e).__name__}: {e}"))
+    for conn in connections.values():
+        conn.close()
+
+
+class _Worker:
+    def __init__(self, name: str, memory_mb: int, cpu_seconds: int) -> None:
+        self.name: str = name
+        self.memory_mb: int = memory_mb
+        self.cpu_seconds: int = cpu_seconds
+        self.process: Optional[Any] = None
+        self.pipe: Optional[Pipe] = None
+
+    def start(self) -> None:
+        # spawn, not fork: the parent runs threads (executors, loguru) whose locks must not be inherited
+        context = multiprocessing.get_context("spawn")
+        parent, child = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child, self.memory_mb, self.cpu_seconds), name=self.name, daemon=True
+        )
+        self.process.start()
+        child.close()
+        self.pipe = parent
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    def kill(self) -> None:
+        if self.process is not None and self.process.is_alive():
+            self.process.kill()
+        if self.process is not None:
+            self.process.join(1)
+        if self.pipe is not None:
+            self.pipe.close()
+        self.process, self.pipe = None, None
+
+    def stop(self) -> None:
+        if self.pipe is not None and self.alive():
+            try:
+                self.pipe.send(None)
+                self.process.join(1)  # type: ignore[union-attr]
+            except (OSError, BrokenPipeError):
+                pass
+        self.kill()
+
+
+class SandboxPool:
+    """
+        A fixed set of executor subprocesses, each with its own warm read-only connections.
+        A query past its deadline (plus KILL_GRACE) or a worker that dies (RLIMIT_AS, SIGXCPU, segfault)
+        is killed and respawned, the caller gets a SandboxError instead of losing the run.
+
+        Attributes:
+            size: number of worker processes
+            memory_mb: RLIMIT_AS of a worker, 0 for none
+            cpu_seconds: CPU seconds one query may use (RLIMIT_CPU), 0 for none
+            timeout: default per-query deadline
+    """
+    def __init__(self, size: int = 2, memory_mb: int = 2048, cpu_seconds: int = 60, timeout: float = 60.0) -> None:
+        self.size: int = size
+        self.timeout: float = timeout
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        for i in range(size):
+            self._idle.put(_Worker(f"sql-sandbox-{i}", memory_mb, cpu_seconds))
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, int] = {"executed": 0, "errors": 0, "killed": 0, "crashed": 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def fingerprint(self, db_path: str, sql: str, timeout: Optional[float] = None, ordered: bool = True) -> ResultFingerprint:
+        """
+            Execute one query in a worker and return its result fingerprint.
+            SQL errors are raised as sqlite3.Error, limits as SandboxTimeout / SandboxCrashed.
+        """
+        timeout = timeout if timeout is not None else self.timeout
+        worker: _Worker = self._idle.get()
+        try:
+            if not worker.alive():
+                worker.start()
+            job_id: int = next(self._ids)
+            assert worker.pipe is not None
+            worker.pipe.send((job_id, os.path.abspath(db_path), sql, timeout, ordered))
+            if not worker.pipe.poll(timeout + KILL_GRACE):
+                self._count("killed")
+                worker.kill()
+                raise SandboxTimeout(f"query killed after {timeout + KILL_GRACE:.0f}s")
+            try:
+                response_id, ok, payload = worker.pipe.recv()
+            except (EOFError, OSError):
+                self._count("crashed")
+                code: Optional[int] = None
+                if worker.process is not None:
+                    worker.process.join(0.5)
+                    code = worker.process.exitcode
+                worker.kill()
+                raise SandboxCrashed(f"executor died (exit code {code}), likely a memory or CPU limit")
+            if response_id != job_id:
+                # never expected: drop the worker rather than trust its stream
+                worker.kill()
+                raise SandboxCrashed("executor answered out of order")
+            self._count("executed")
+            if not ok:
+                self._count("errors")
+                raise sqlite3.OperationalError(payload)
+            return ResultFingerprint(*payload)
+        finally:
+            self._idle.put(worker)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                break
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+
+_SANDBOX: Optional[SandboxPool] = None
+_SANDBOX_LOCK = threading.Lock()
+
+
+def get_sandbox() -> Optional[SandboxPool]:
+    """
+        Process wide pool when SQL_SANDBOX_WORKERS is set (SQL_SANDBOX_MEMORY_MB, SQL_SANDBOX_CPU_SECONDS,
+        SQL_SANDBOX_TIMEOUT tune it), None to execute in process.
+    """
+    global _SANDBOX
+    workers: int = int(os.getenv("SQL_SANDBOX_WORKERS") or 0)
+    if workers <= 0:
+        return None
+    with _SANDBOX_LOCK:
+        if _SANDBOX is None:
+            _SANDBOX = SandboxPool(
+                size=workers,
+                memory_mb=int(os.getenv("SQL_SANDBOX_MEMORY_MB") or 2048),
+                cpu_seconds=int(os.getenv("SQL_SANDBOX_CPU_SECONDS") or 60),
+                timeout=float(os.getenv("SQL_SANDBOX_TIMEOUT") or 60),
+            )
+            atexit.register(_SANDBOX.close)
+            logger.info(f"SQL sandbox: {workers} executor processes")
+        return _SANDBOX
@@ -7,6 +7,9 @@ import os, json
 from abc import abstractmethod
 from typing import Optional, Dict, List, Any
 from sqlite3 import Connection
+from loguru import logger
+
+from process_data.introspection import DatabaseSchema, load_schema, introspect, connection_path
 
 class Schema:
     """
@@ -42,30 +45,28 @@ class Schema:
 def ddl_schema(conn: Connection) -> Dict[str, List[str]]:
     """
     Get database's schema, which is a dict with table name as key
-    and list of column names as value
+    and list of column names as value.
+    Read from the persisted introspection artifact of the database file (built once),
+    in-memory databases are introspected directly.
     :param conn: database connection
     :return: schema dict
     """
-    schema: Dict[str, List[str]] = {}
-    cursor = conn.cursor()
-
-    # fetch table names
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables: List[str] = [str(table[0].lower()) for table in cursor.fetchall()]
-
-    # fetch table info
-    for table in tables:
-        cursor.execute(f'PRAGMA table_info("{table}")')
-        schema[table] = [str(col[1].lower()) for col in cursor.fetchall()]
-
-    return schema
+    db_path: str = connection_path(conn)
+    db_schema: DatabaseSchema = load_schema(db_path) if db_path else introspect(conn, sample_values=0)
+    return {
+        str(table.lower()): [str(col.lower()) for col in cols]
+        for table, cols in db_schema.column_names().items()
+    }
 
 def m_schema(conn: Connection) -> Dict:
     data = None
-    db_info = conn.execute("PRAGMA database_list").fetchall()
-    db_path = db_info[0][2]
+    # the source file for replica connections, whose PRAGMA database_list path is ''
+    db_path: str = connection_path(conn)
     db_base = os.path.basename(db_path)[:-7]
     schema: Dict = {}
+    if not db_base:
+        logger.warning(f"M_Schema needs a database file, the connection has none.")
+        return schema
     m_schema_path = f"../data/m_schema"
     m_schema_list = os.listdir(m_schema_path)
     for i in m_schema_list:
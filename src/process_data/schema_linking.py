@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-21 15:00
+# @Author  : jwm
+# @File    : schema_linking.py
+# @description: Lexical (BM25) schema-linking index, prunes the schema before prompting.
+
+import os
+import re
+import threading
+from collections import Counter
+from sqlite3 import Connection
+from typing import Dict, List, Any, Optional, Tuple, Set
+
+import numpy as np
+from loguru import logger
+
+from process_data.introspection import DatabaseSchema, load_schema, introspect, connection_path
+
+SAMPLE_VALUES: int = 3
+_WORD = re.compile(r"[A-Za-z]+|\d+")
+_CAMEL = re.compile(r"(?<=[a-z])(?=[A-Z])")
+
+
+def lexical_tokens(text: str) -> List[str]:
+    """
+        Lower-cased word pieces, camelCase / snake_case split, plural 's' stripped.
+    """
+    tokens: List[str] = []
+    for word in _WORD.findall(_CAMEL.sub(" ", text)):
+        word = word.lower()
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def estimate_tokens(text: str) -> int:
+    """
+        Rough prompt token count (words and punctuation), enough to compare full vs pruned schema.
+    """
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+
+class SchemaIndex:
+    """
+        BM25 over one document per table and per column (table + column name, M_Schema
+        comment and sampled values). Weights are kept as a term-major CSR matrix
+        (indptr / indices / data NumPy arrays) so a query is a few slice gathers.
+    """
+    K1: float = 1.2
+    B: float = 0.75
+
+    def __init__(
+            self,
+            docs: List[Tuple[str, Optional[str], List[str]]],
+            primary_keys: Dict[str, List[str]],
+            foreign_keys: List[Tuple[str, str, str, str]]
+        ) -> None:
+        # docs: (table, column or None for the table document, tokens)
+        self.docs: List[Tuple[str, Optional[str]]] = [(table, column) for table, column, _ in docs]
+        self.primary_keys: Dict[str, List[str]] = primary_keys
+        self.foreign_keys: List[Tuple[str, str, str, str]] = foreign_keys
+        self.vocab: Dict[str, int] = {}
+        self._build([tokens for _, _, tokens in docs])
+
+    def _build(self, docs_tokens: List[List[str]]) -> None:
+        counts: List[Counter] = [Counter(tokens) for tokens in docs_tokens]
+        for counter in counts:
+            for term in counter:
+                self.vocab.setdefault(term, len(self.vocab))
+
+        n_docs: int = max(1, len(counts))
+        lengths = np.array([sum(c.values()) for c in counts], dtype=np.float64)
+        avg_len: float = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+
+        rows, cols, tfs = [], [], []
+        for doc_id, counter in enumerate(counts):
+            for term, tf in counter.items():
+                rows.append(self.vocab[term])
+                cols.append(doc_id)
+                tfs.append(tf)
+        term_ids = np.array(rows, dtype=np.int64)
+        doc_ids = np.array(cols, dtype=np.int64)
+        tf_arr = np.array(tfs, dtype=np.float64)
+
+        df = np.bincount(term_ids, minlength=len(self.vocab)).astype(np.float64)
+        idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+        norm = self.K1 * (1.0 - self.B + self.B * lengths[doc_ids] / avg_len) if len(doc_ids) else np.zeros(0)
+        weights = idf[term_ids] * tf_arr * (self.K1 + 1.0) / (tf_arr + norm)
+
+        order = np.lexsort((doc_ids, term_ids))
+        self.indices = doc_ids[order]
+        self.data = weights[order]
+        self.indptr = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(self.vocab)), out=self.indptr[1:])
+
+    @classmethod
+    def from_schema(cls, db_schema: DatabaseSchema, schema: Any = None) -> "SchemaIndex":
+        """
+            Build from the introspection artifact (names, PK/FK, sampled values),
+            M_Schema comments/examples are added when `schema` carries them.
+        """
+        descriptions: Dict[Tuple[str, str], str] = _m_schema_descriptions(schema)
+        docs: List[Tuple[str, Optional[str], List[str]]] = []
+        primary_keys: Dict[str, List[str]] = {}
+        for table in db_schema.tables:
+            key: str = table.name.lower()
+            docs.append((key, None, lexical_tokens(table.name)))
+            primary_keys[key] = [pk.lower() for pk in table.primary_keys]
+            for column in table.columns:
+                samples: str = " ".join(str(v)[:64] for v in column.samples[:SAMPLE_VALUES])
+                text: str = f"{table.name} {column.name} {descriptions.get((key, column.name.lower()), '')} {samples}"
+                docs.append((key, column.name.lower(), lexical_tokens(text)))
+        foreign_keys: List[Tuple[str, str, str, str]] = [
+            (fk.table.lower(), fk.column.lower(), fk.ref_table.lower(), (fk.ref_column or fk.column).lower())
+            for fk in db_schema.foreign_keys
+        ]
+        return cls(docs, primary_keys, foreign_keys)
+
+    @classmethod
+    def from_connection(cls, conn: Connection, schema: Any = None) -> "SchemaIndex":
+        db_path: str = connection_path(conn)
+        return cls.from_schema(load_schema(db_path) if db_path else introspect(conn), schema)
+
+    def scores(self, text: str) -> np.ndarray:
+        scores = np.zeros(len(self.docs), dtype=np.float64)
+        term_ids = [self.vocab[t] for t in set(lexical_tokens(text)) if t in self.vocab]
+        if not term_ids:
+            return scores
+        spans = [np.arange(self.indptr[t], self.indptr[t + 1]) for t in term_ids]
+        positions = np.concatenate(spans)
+        np.add.at(scores, self.indices[positions], self.data[positions])
+        return scores
+
+    def link(self, text: str, top_tables: int = 5, top_columns: int = 8, min_score: float = 0.0) -> Dict[str, List[str]]:
+        """
+            Top tables / columns for a question (+ evidence), join keys between kept tables included.
+            Returns {table: [columns]} with lower-cased names, {} when no table scores above min_score
+            (nothing matched, the ranking would be arbitrary).
+        """
+        scores = self.scores(text)
+        table_score: Dict[str, float] = {}
+        column_scores: Dict[str, List[Tuple[float, str]]] = {}
+        for (table, column), score in zip(self.docs, scores):
+            table_score[table] = table_score.get(table, 0.0) + (score if column is None else 0.0)
+            if column is not None:
+                column_scores.setdefault(table, []).append((float(score), column))
+        for table, cols in column_scores.items():
+            table_score[table] = table_score.get(table, 0.0) + max((s for s, _ in cols), default=0.0)
+
+        if not table_score or max(table_score.values()) <= min_score:
+            return {}
+        kept_tables: List[str] = [t for t, _ in sorted(table_score.items(), key=lambda kv: -kv[1])[:top_tables]]
+        linked: Dict[str, List[str]] = {}
+        for table in kept_tables:
+            ranked = sorted(column_scores.get(table, []), key=lambda sc: -sc[0])
+            linked[table] = [c for s, c in ranked[:top_columns] if s > 0]
+            for pk in self.primary_keys.get(table, []):
+                if pk not in linked[table]:
+                    linked[table].append(pk)
+
+        kept: Set[str] = set(kept_tables)
+        for table, column, ref_table, ref_column in self.foreign_keys:
+            if table in kept and ref_table in kept:
+                if column not in linked[table]:
+                    linked[table].append(column)
+                if ref_column not in linked[ref_table]:
+                    linked[ref_table].append(ref_column)
+        return linked
+
+
+def _m_schema_descriptions(schema: Any) -> Dict[Tuple[str, str], str]:
+    descriptions: Dict[Tuple[str, str], str] = {}
+    if not isinstance(schema, dict) or not isinstance(schema.get("tables"), dict):
+        return descriptions
+    for table, info in schema["tables"].items():
+        fields = info.get("fields", {}) if isinstance(info, dict) else {}
+        for column, field in fields.items():
+            if isinstance(field, dict):
+                text = " ".join(str(field.get(k, "")) for k in ("comment", "examples"))
+                descriptions[(table.lower(), column.lower())] = text
+    return descriptions
+
+
+def prune_schema(schema: Any, linked: Dict[str, List[str]]) -> Any:
+    """
+        Keep only linked tables/columns in a schema_generator output (DDL dict or M_Schema dict).
+    """
+    if isinstance(schema, dict) and isinstance(schema.get("tables"), dict):
+        tables: Dict[str, Any] = {}
+        for table, info in schema["tables"].items():
+            columns = linked.get(table.lower())
+            if columns is None:
+                continue
+            if isinstance(info, dict) and isinstance(info.get("fields"), dict):
+                info = {**info, "fields": {c: f for c, f in info["fields"].items() if c.lower() in columns}}
+            tables[table] = info
+        pruned: Dict[str, Any] = {**schema, "tables": tables}
+        if isinstance(schema.get("foreign_keys"), list):
+            pruned["foreign_keys"] = [
+                fk for fk in schema["foreign_keys"]
+                if isinstance(fk, (list, tuple)) and len(fk) >= 3
+                and str(fk[0]).lower() in linked and str(fk[2]).lower() in linked
+            ]
+        return pruned
+    if isinstance(schema, dict):
+        return {
+            table: [c for c in cols if c.lower() in linked[table.lower()]]
+            for table, cols in schema.items() if table.lower() in linked
+        }
+    return schema
+
+
+_INDEXES: Dict[str, SchemaIndex] = {}
+_INDEXES_LOCK = threading.Lock()
+_SAVED: Dict[str, int] = {"prompts": 0, "full_tokens": 0, "pruned_tokens": 0}
+
+
+def schema_index(db_path: str, conn: Connection, schema: Any = None) -> SchemaIndex:
+    """
+        Per-database index, built once per process.
+    """
+    with _INDEXES_LOCK:
+        index: Optional[SchemaIndex] = _INDEXES.get(db_path)
+        if index is None:
+            index = SchemaIndex.from_connection(conn, schema)
+            _INDEXES[db_path] = index
+        return index
+
+
+def link_schema(db_path: str, conn: Connection, schema: Any, text: str, top_tables: int, top_columns: int) -> Any:
+    """
+        Pruned schema for one prompt, the saved tokens are logged and accumulated.
+    """
+    min_score: float = float(os.getenv("SCHEMA_LINKING_MIN_SCORE") or 0)
+    linked: Dict[str, List[str]] = schema_index(db_path, conn, schema).link(text, top_tables, top_columns, min_score)
+    if not linked:
+        # no table matched the question: the full schema rather than arbitrary tables
+        logger.debug(f"schema linking matched nothing above {min_score}, the full schema is kept")
+        pruned: Any = schema
+    else:
+        pruned = prune_schema(schema, linked)
+    full_tokens, pruned_tokens = estimate_tokens(str(schema)), estimate_tokens(str(pruned))
+    with _INDEXES_LOCK:
+        _SAVED["prompts"] += 1
+        _SAVED["full_tokens"] += full_tokens
+        _SAVED["pruned_tokens"] += pruned_tokens
+    logger.debug(f"schema linking kept {list(linked)}, ~{full_tokens - pruned_tokens} of {full_tokens} schema tokens saved")
+    return pruned
+
+
+def linking_stats() -> Dict[str, int]:
+    with _INDEXES_LOCK:
+        stats: Dict[str, int] = dict(_SAVED)
+    stats["saved_tokens"] = stats["full_tokens"] - stats["pruned_tokens"]
+    return stats
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-22 10:10
+# @Author  : jwm
+# @File    : value_index.py
+# @description: Offline per-database value index (char n-gram MinHash-LSH, memory-mapped).
+
+import os
+import re
+import json
+import zlib
+import threading
+from sqlite3 import Connection
+from typing import Dict, List, Tuple, Optional, Any
+
+import numpy as np
+from loguru import logger
+
+from process_data.connection import connect_readonly
+from process_data.artifacts import artifact_path
+
+NGRAM: int = 3
+NUM_PERM: int = 32
+BANDS: int = 8                  # BANDS * ROWS == NUM_PERM
+ROWS: int = NUM_PERM // BANDS
+MAX_VALUES_PER_COLUMN: int = 200000
+MAX_VALUE_LEN: int = 128
+INDEX_VERSION: int = 1
+
+_PRIME: int = (1 << 32) + 15
+_RNG = np.random.RandomState(20251018)
+_PERM_A = _RNG.randint(1, 1 << 31, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _RNG.randint(0, 1 << 31, size=NUM_PERM).astype(np.uint64)
+
+
+def normalize_value(value: Any) -> str:
+    return re.sub(r"\s+", " ", str(value)).strip().lower()
+
+
+def _shingles(text: str) -> np.ndarray:
+    padded: str = f" {text} "
+    grams = {padded[i:i + NGRAM] for i in range(max(1, len(padded) - NGRAM + 1))}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def minhash(text: str) -> np.ndarray:
+    hashes: np.ndarray = _shingles(text)
+    permuted = (_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _PRIME
+    return (permuted.min(axis=1) & 0xFFFFFFFF).astype(np.uint32)
+
+
+def band_keys(signatures: np.ndarray) -> np.ndarray:
+    """
+        (n, NUM_PERM) signatures -> (BANDS, n) uint64 bucket keys.
+    """
+    sig = signatures.astype(np.uint64).reshape(len(signatures), BANDS, ROWS)
+    keys = np.zeros((len(signatures), BANDS), dtype=np.uint64)
+    for r in range(ROWS):
+        keys = (keys * np.uint64(1000003)) ^ sig[:, :, r]
+    return keys.T.copy()
+
+
+def value_index_dir(db_path: str) -> str:
+    """
+        {db_dir}/{db_id}.values/ next to the database, or values/ in the artifact cache directory.
+    """
+    return artifact_path(db_path, "values")
+
+
+def _text_columns(conn: Connection) -> List[Tuple[str, str]]:
+    columns: List[Tuple[str, str]] = []
+    for (table,) in conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'").fetchall():
+        for _, column, col_type, *_ in conn.execute(f'PRAGMA table_info("{table}")').fetchall():
+            col_type = (col_type or "").lower()
+            if not col_type or "char" in col_type or "text" in col_type or "clob" in col_type:
+                columns.append((table, column))
+    return columns
+
+
+def build_value_index(db_path: str, out_dir: Optional[str] = None) -> str:
+    """
+        Scan every text column once and write the index files, returns the index directory.
+    """
+    out_dir = out_dir or value_index_dir(db_path)
+    os.makedirs(out_dir, exist_ok=True)
+    conn: Connection = connect_readonly(db_path)
+    columns: List[Tuple[str, str]] = []
+    texts: List[str] = []
+    column_ids: List[int] = []
+    try:
+        for table, column in _text_columns(conn):
+            try:
+                rows = conn.execute(
+                    f'SELECT DISTINCT "{column}" FROM "{table}" WHERE "{column}" IS NOT NULL '
+                    f'AND length("{column}") <= {MAX_VALUE_LEN} LIMIT {MAX_VALUES_PER_COLUMN}'
+                ).fetchall()
+            except Exception as e:
+                logger.warning(f"value index: {table}.{column} skipped: {e}")
+                continue
+            column_id: int = len(columns)
+            columns.append((table, column))
+            seen = set()
+            for (value,) in rows:
+                text: str = normalize_value(value)
+                if text and text not in seen:
+                    seen.add(text)
+                    texts.append(text)
+                    column_ids.append(column_id)
+    finally:
+        conn.close()
+
+    signatures = np.zeros((len(texts), NUM_PERM), dtype=np.uint32)
+    for i, text in enumerate(texts):
+        signatures[i] = minhash(text)
+    keys = band_keys(signatures)
+    order = np.argsort(keys, axis=1, kind="stable").astype(np.int32)
+
+    encoded: List[bytes] = [t.encode("utf-8") for t in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    with open(os.path.join(out_dir, "values.bin"), "wb") as f:
+        f.write(b"".join(encoded))
+    np.save(os.path.join(out_dir, "offsets.npy"), offsets)
+    np.save(os.path.join(out_dir, "columns.npy"), np.array(column_ids, dtype=np.int32))
+    np.save(os.path.join(out_dir, "signatures.npy"), signatures)
+    np.save(os.path.join(out_dir, "band_keys.npy"), np.take_along_axis(keys, order, axis=1))
+    np.save(os.path.join(out_dir, "band_ids.npy"), order)
+    stat = os.stat(db_path)
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": INDEX_VERSION,
+            "columns": columns,
+            "values": len(texts),
+            "db_size": stat.st_size,
+            "db_mtime_ns": stat.st_mtime_ns,
+        }, f, ensure_ascii=False)
+    logger.info(f"value index of {os.path.basename(db_path)}: {len(texts)} values over {len(columns)} columns")
+    return out_dir
+
+
+class ValueIndex:
+    """
+        Read side of the index, every array is memory-mapped so opening is cheap
+        and only touched pages are read.
+    """
+    def __init__(self, index_dir: str) -> None:
+        with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta: Dict[str, Any] = json.load(f)
+        self.columns: List[Tuple[str, str]] = [tuple(c) for c in self.meta["columns"]]  # type: ignore[misc]
+        load = lambda name: np.load(os.path.join(index_dir, name), mmap_mode="r")
+        self.offsets = load("offsets.npy")
+        self.value_columns = load("columns.npy")
+        self.signatures = load("signatures.npy")
+        self.band_keys = load("band_keys.npy")
+        self.band_ids = load("band_ids.npy")
+        blob_path: str = os.path.join(index_dir, "values.bin")
+        self.blob = np.memmap(blob_path, dtype=np.uint8, mode="r") if os.path.getsize(blob_path) else np.zeros(0, np.uint8)
+
+    def value(self, i: int) -> str:
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def lookup(self, text: str, top_k: int = 10, threshold: float = 0.3) -> List[Dict[str, Any]]:
+        """
+            Values similar to `text` (estimated Jaccard of character 3-grams), best first:
+            [{"table", "column", "value", "score"}]
+        """
+        query: str = normalize_value(text)
+        if not query or len(self.offsets) <= 1:
+            return []
+        signature = minhash(query)
+        keys = band_keys(signature[None, :])[:, 0]
+        candidates: List[np.ndarray] = []
+        for band in range(BANDS):
+            lo = np.searchsorted(self.band_keys[band], keys[band], side="left")
+            hi = np.searchsorted(self.band_keys[band], keys[band], side="right")
+            if hi > lo:
+                candidates.append(np.asarray(self.band_ids[band, lo:hi]))
+        if not candidates:
+            return []
+        ids = np.unique(np.concatenate(candidates))
+        scores = (np.asarray(self.signatures[ids]) == signature[None, :]).mean(axis=1)
+        keep = scores >= threshold
+        ids, scores = ids[keep], scores[keep]
+        best = np.argsort(-scores, kind="stable")[:top_k]
+        return [{
+            "table": self.columns[int(self.value_columns[ids[i]])][0],
+            "column": self.columns[int(self.value_columns[ids[i]])][1],
+            "value": self.value(int(ids[i])),
+            "score": float(scores[i]),
+        } for i in best]
+
+    def columns_like(self, text: str, threshold: float = 0.3) -> List[Tuple[str, str, float]]:
+        """
+            Which columns contain a value like `text`: [(table, column, best score)].
+        """
+        best: Dict[Tuple[str, str], float] = {}
+        for match in self.lookup(text, top_k=50, threshold=threshold):
+            key = (match["table"], match["column"])
+            best[key] = max(best.get(key, 0.0), match["score"])
+        return [(t, c, s) for (t, c), s in sorted(best.items(), key=lambda kv: -kv[1])]
+
+
+def candidate_phrases(question: str) -> List[str]:
+    """
+        Literal-looking spans of a question: quoted strings, capitalised word runs, tokens with digits.
+    """
+    phrases: List[str] = re.findall(r"['\"]([^'\"]{2,})['\"]", question)
+    phrases += re.findall(r"\b[A-Z][\w-]*(?:\s+[A-Z][\w-]*)*", question)
+    phrases += re.findall(r"\b[\w-]*\d[\w-]*\b", question)
+    seen = set()
+    return [p for p in phrases if not (p.lower() in seen or seen.add(p.lower()))]
+
+
+def format_matched_values(matches: List[Dict[str, Any]], limit: int) -> str:
+    """
+        Prompt lines grounding question literals, best match per (phrase, column) first:
+        "Alameda" -> schools.County = 'Alameda'
+    """
+    lines: List[str] = []
+    seen: set = set()
+    for match in sorted(matches, key=lambda m: -m["score"]):
+        key = (match["phrase"].lower(), match["table"], match["column"])
+        if key in seen:
+            continue
+        seen.add(key)
+        value: str = match["value"].replace("'", "''")
+        lines.append(f'"{match["phrase"]}" -> {match["table"]}.{match["column"]} = \'{value}\'')
+        if len(lines) >= limit:
+            break
+    return "\n".join(lines)
+
+
+_INDEXES: Dict[str, ValueIndex] = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def load_value_index(db_path: str, build: bool = False) -> Optional[ValueIndex]:
+    """
+        Per-process cached index of a database, None when it wasn't built offline (unless build=True).
+    """
+    with _INDEXES_LOCK:
+        index: Optional[ValueIndex] = _INDEXES.get(db_path)
+        if index is not None:
+            return index
+        index_dir: str = value_index_dir(db_path)
+        if not os.path.exists(os.path.join(index_dir, "meta.json")):
+            if not build:
+                return None
+            build_value_index(db_path, index_dir)
+        index = ValueIndex(index_dir)
+        stat = os.stat(db_path)
+        if (index.meta.get("version"), index.meta.get("db_size"), index.meta.get("db_mtime_ns")) != (INDEX_VERSION, stat.st_size, stat.st_mtime_ns):
+            logger.warning(f"value index of {db_path} is stale")
+            if not build:
+                return None
+            build_value_index(db_path, index_dir)
+            index = ValueIndex(index_dir)
+        _INDEXES[db_path] = index
+        return index
@@ -1,6 +1,17 @@
+from typing import List
 from runner.enum_aggretion import Task
 
-def generate_sql(task: Task, schema: str):
+# Local generation options tied to the answer format below.
+MAX_NEW_TOKENS: int = 2048
+STOP_ON_SQL_FENCE: bool = True
+STOP_STRINGS: List[str] = []
+
+def generate_sql(task: Task, schema: str, values: str = ""):
+    # database values matching literals of the question (value index), only when some were found
+    lines: str = values.replace("\n", "\n        ")
+    grounding: str = f"""
+        [Matched_Values]:
+        {lines},""" if values else ""
     template = f"""
         You are a SQLite expert. You need to read and understand the following database schema description, as well as the evidence
         that may be used, and use your SQLite knowledge to generate SQL statements to answer user questions.
@@ -23,7 +34,7 @@ def generate_sql(task: Task, schema: str):
         [Schema]:
         {schema},
         [Evidence]:
-        {task.evidence},
+        {task.evidence},{grounding}
         [Question]:
         {task.question}
 
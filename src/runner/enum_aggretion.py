@@ -4,7 +4,7 @@
 # @File    : task.py
 # @description: Define Task Enum
 
-from typing import Optional
+from typing import Optional, List
 from pydantic import BaseModel
 
 class Task(BaseModel):
@@ -28,6 +28,14 @@ class Task(BaseModel):
     difficulty: Optional[str] = None
 
 
+class Endpoint(BaseModel):
+    """
+        One replica / key of a logical model.
+    """
+    BASE_URL: Optional[str] = None
+    API_KEY: Optional[str] = None
+
+
 class Model(BaseModel):
     """
         In the model <--> agent binding stage, a media variable to create.
@@ -40,8 +48,19 @@ class Model(BaseModel):
             API_KEY: if API, the key of API, else empty
             BASE_URL: if API, the base url of API, else empty
             corresponding_agent: The corresponding agent used in the FrameWork
+            node: name of the agent in AGENTS / AGENT_DAG, defaults to corresponding_agent (distinct names let several models share an agent type)
             description: This is a test model, not to be read
             template: The prompt templates of llm used in agent.
+            num_candidates: SQL samples drawn per question, > 1 enables execution-based voting
+            temperature: sampling temperature, None keeps the backend default
+            max_new_tokens: local generation budget, None uses the template's MAX_NEW_TOKENS
+            stop_strings: extra strings that end local generation
+            stream: stream API completions and stop at the first complete sql block
+            request_timeout: seconds of one API attempt
+            deadline: seconds of one API call including retries, None for no deadline
+            max_retries: cap of retries per error class, None keeps the default policies
+            hedge: send a duplicate API request when the first is slower than the p95 latency
+            endpoints: replicas/keys of the same model, load balanced; empty means BASE_URL/API_KEY only
 
     """
     model_name: str 
@@ -50,18 +69,32 @@ class Model(BaseModel):
     API_KEY: Optional[str] = None
     BASE_URL: Optional[str] = None
     corresponding_agent: str 
+    node: Optional[str] = None
     description: str
     template_name: str
     output_name: str
+    num_candidates: int = 1
+    temperature: Optional[float] = None
+    max_new_tokens: Optional[int] = None
+    stop_strings: List[str] = []
+    stream: bool = False
+    request_timeout: Optional[float] = 120.0
+    deadline: Optional[float] = None
+    max_retries: Optional[int] = None
+    hedge: bool = False
+    endpoints: List[Endpoint] = []
 
 
 class Request(BaseModel):
     """
         The unified request body for agent communication in the framework
+        candidates: successful results of the upstream DAG nodes, in dependency order
         
     """
     template: str
     _schema: Optional[str] = None
+    db_path: Optional[str] = None
+    candidates: List[str] = []
 
 
 class Response(BaseModel):
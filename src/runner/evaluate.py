@@ -7,16 +7,107 @@ import os
 import json
 import re
 import uuid
+import time
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 import process_data.parser_sql as psql
 
-from typing import Dict, Any, List, Tuple, Optional
+from sqlite3 import Connection
+from typing import Dict, Any, List, Tuple, Optional, Generator
 from loguru import logger
 
 from runner.enum_aggretion import Task
-from process_data.connection import DB_System
+from runner.metrics import SQL_SECONDS
+from runner.work_queue import shard_name
+from process_data.connection import DB_System, open_readonly
+from process_data.downsample import load_downsampled
+from process_data.index_advisor import load_indexed
+from process_data.sandbox import SandboxPool, get_sandbox
+from process_data.preflight import Preflight, check_sql, expensive_timeout
+from process_data.artifacts import gold_fingerprint
+from process_data.fingerprint import ResultFingerprint, fingerprint_cursor, fingerprint_rows
 from process_data.parser_sql import tokenize, get_tables_with_alias, parse_sql, get_sql
 
+_RESULT_LOCK = threading.Lock()
+
+
+@contextmanager
+def _deadline(conn: Connection, timeout: Optional[float]) -> Generator[None, None, None]:
+    # abort the statement once `timeout` seconds are spent in the VM
+    begin: float = time.monotonic()
+    if timeout is not None:
+        deadline: float = begin + timeout
+        conn.set_progress_handler(lambda: int(time.monotonic() > deadline), 10000)
+    try:
+        yield
+    finally:
+        if timeout is not None:
+            conn.set_progress_handler(None, 0)
+        SQL_SECONDS.observe(time.monotonic() - begin)
+
+
+def execute_sql(conn: Connection, sql: str, timeout: Optional[float] = None) -> List[Tuple[Any, ...]]:
+    """
+        Execute one query and fetch all rows, abort it once `timeout` seconds are spent in the VM.
+    """
+    with _deadline(conn, timeout):
+        cursor = conn.cursor()
+        cursor.execute(sql)
+        return cursor.fetchall()
+
+
+def execute_fingerprint(conn: Connection, sql: str, timeout: Optional[float] = None, ordered: bool = True,
+                        float_digits: Optional[int] = None) -> ResultFingerprint:
+    """
+        Execute one query and stream its rows into a fingerprint, the result is never materialised.
+        The defaults (row order counts, exact floats) match the evaluation rule.
+    """
+    with _deadline(conn, timeout):
+        cursor = conn.cursor()
+        cursor.execute(sql)
+        return fingerprint_cursor(cursor, ordered, float_digits=float_digits)
+
+
+def compare_results(gold_result: List[Tuple[Any, ...]], generate_result: List[Tuple[Any, ...]]) -> bool:
+    """
+        Comparison rule between gold and predicted execution results: same rows in the same order,
+        values compared canonically (1 == 1.0 == True, floats exactly).
+    """
+    return fingerprint_rows(gold_result, ordered=True).digest == fingerprint_rows(generate_result, ordered=True).digest
+
+
+def quick_agree(sample_conn: Optional[Connection], gold_sql: str, generate_sql: str, timeout: Optional[float] = None) -> bool:
+    """
+        First pass on a downsampled copy: True only when both queries return the same non-empty result there.
+        A disagreement, an empty result or an error is left to the full database.
+    """
+    if sample_conn is None:
+        return False
+    try:
+        gold: ResultFingerprint = execute_fingerprint(sample_conn, gold_sql, timeout)
+        return gold.rows > 0 and execute_fingerprint(sample_conn, generate_sql, timeout).digest == gold.digest
+    except Exception:
+        return False
+
+
+def load_predictions(file_path: str) -> List[Dict[str, Any]]:
+    """
+        Read a predictions file: a JSON list, JSON lines, or the comma separated
+        records appended by Evaluator.save_sql (original_result.json).
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        content: str = f.read().strip()
+    if not content:
+        return []
+    if content.startswith("["):
+        return json.loads(content)
+    try:
+        return json.loads("[" + content.rstrip(",") + "]")
+    except json.JSONDecodeError:
+        return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
 class Evaluator:
     def __init__(self, schema, task: Task, pr_sql: Optional[str], sql_client: DB_System, output_name: str) -> None:
         self.schema = schema
@@ -41,47 +132,85 @@ class Evaluator:
 
 
     def validate_sql(self, gold_sql: str, generate_sql: str) -> bool:
-        self.sql_client.open()
-        conn = self.sql_client.conn
-        if conn is not None:
-            cursor = conn.cursor()
-        else:
-            raise RuntimeError("Database connection not open")
-        
+        db_path: str = self.sql_client.db_path
+        sandbox: Optional[SandboxPool] = get_sandbox()
+        connections: Dict[str, Connection] = {}
+
+        def connection(path: str) -> Connection:
+            if path not in connections:
+                connections[path] = open_readonly(path)
+            return connections[path]
+
+        def run(path: str, sql: str, timeout: Optional[float] = None, ordered: bool = True) -> ResultFingerprint:
+            # generated SQL is untrusted: executor subprocesses when SQL_SANDBOX_WORKERS is set
+            if sandbox is not None:
+                return sandbox.fingerprint(path, sql, timeout, ordered)
+            return execute_fingerprint(connection(path), sql, timeout, ordered)
+
         try:
-            cursor.execute(gold_sql)
-            gold_result: List[Tuple[Any, ...]] = cursor.fetchall()
-            cursor.execute(generate_sql)
-            generate_result: List[Tuple[Any, ...]] = cursor.fetchall()
-            self.sql_client._close()
-            if gold_result == generate_result:
+            # statements that don't prepare are wrong without running anything, expensive plans get the opt-in budget
+            check: Preflight = check_sql(connection(db_path), db_path, generate_sql)
+            if not check.ok:
+                return False
+            budget: Optional[float] = expensive_timeout() if check.expensive else None
+
+            # QUICK_EVAL: agreement on the downsampled copy is accepted, the rest is checked on the full database
+            sample_path: Optional[str] = load_downsampled(db_path) if os.getenv("QUICK_EVAL") else None
+            if sample_path is not None:
+                try:
+                    gold_sample: ResultFingerprint = run(sample_path, gold_sql)
+                    if gold_sample.rows > 0 and run(sample_path, generate_sql, budget).digest == gold_sample.digest:
+                        return True
+                except Exception:
+                    pass
+
+            # INDEXED_EVAL: the indexed working copy (process.py --indexes) when this gold result was verified on it
+            exec_path: str = (load_indexed(db_path, self.task.question_id) if os.getenv("INDEXED_EVAL") else None) or db_path
+
+            # gold result precomputed by process.py, only the generated SQL runs
+            gold: Optional[ResultFingerprint] = gold_fingerprint(db_path, self.task.question_id, gold_sql)
+            if gold is None:
+                gold = run(exec_path, gold_sql)
+            predicted: ResultFingerprint = run(exec_path, generate_sql, budget)
+            if predicted.digest == gold.digest:
                 return True
-            else:
+            if exec_path == db_path or predicted.rows != gold.rows or predicted.rows < 2:
+                return False
+            # the new indexes may reorder rows of a prediction without ORDER BY: when the rows are the gold
+            # rows in another order (both re-run unordered on the fast copy), the original file decides
+            if run(exec_path, generate_sql, budget, ordered=False).digest != run(exec_path, gold_sql, ordered=False).digest:
                 return False
-            
+            return run(db_path, generate_sql, budget).digest == gold.digest
+
         except Exception as e:
             logger.error(f"SQL validation error: {e}")
             return False
+        finally:
+            for conn in connections.values():
+                conn.close()
 
     def save_sql(self, pr_sql: str, task: Task, output_name: str) -> bool:
-        file_path: str = f"./result/{output_name}/original_result.json"
+        # distributed workers (RESULT_SHARD set) write their own shard, merged by runner.work_queue.merge_shards
+        shard: str = shard_name(os.getenv("RESULT_SHARD") or "")
+        file_path: str = f"./result/{output_name}/original_result.{shard}.json" if shard else f"./result/{output_name}/original_result.json"
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, "a", encoding="utf-8") as f:
-
-            accuracy: bool = False
-            if task.SQL is not None:
-                accuracy = self.validate_sql(task.SQL, pr_sql)
-            
-            result_data: Dict[str, Any] = {
-                "db_id": task.db_id,
-                "question": task.question,
-                "ground_truth_sql": task.SQL,
-                "answer_sql": pr_sql,
-                "difficulty": task.difficulty,
-                "accuracy": accuracy
-            }
-            f.write(json.dumps(result_data, indent=4, ensure_ascii=False))
-            f.write(",\n")
+
+        accuracy: bool = False
+        if task.SQL is not None:
+            accuracy = self.validate_sql(task.SQL, pr_sql)
+
+        result_data: Dict[str, Any] = {
+            "question_id": task.question_id,
+            "db_id": task.db_id,
+            "question": task.question,
+            "ground_truth_sql": task.SQL,
+            "answer_sql": pr_sql,
+            "difficulty": task.difficulty,
+            "accuracy": accuracy
+        }
+        # concurrent workers append to the same file, one record per write
+        with _RESULT_LOCK, open(file_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result_data, indent=4, ensure_ascii=False) + ",\n")
         return accuracy
 
     def save_parse(self, output_name, gt_parse_op_list, pr_parse_op_list):
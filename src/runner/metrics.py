@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-26 18:30
+# @Author  : jwm
+# @File    : metrics.py
+# @description: Live run metrics (progress, latency histograms, cache ratios, RSS) in Prometheus text format.
+
+import os
+import time
+import threading
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Any, Optional, Callable, Iterable, NamedTuple, Tuple
+
+from loguru import logger
+
+LLM_BUCKETS: Tuple[float, ...] = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0)
+SQL_BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+
+class Sample(NamedTuple):
+    """
+        One exposed value; kind is "gauge" or "counter", samples sharing a name share HELP / TYPE.
+    """
+    name: str
+    kind: str
+    help: str
+    value: float
+    labels: Dict[str, str] = {}
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+class Histogram:
+    """
+        Cumulative-bucket histogram per label value (e.g. model name), observe() is a bisect under a lock.
+    """
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...], label: Optional[str] = None) -> None:
+        self.name: str = name
+        self.help: str = help
+        self.buckets: Tuple[float, ...] = buckets
+        self.label: Optional[str] = label
+        self._series: Dict[str, List[float]] = {}     # label value -> bucket counts + [+Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, label: str = "") -> None:
+        i: int = bisect_left(self.buckets, value)
+        with self._lock:
+            series: List[float] = self._series.setdefault(label, [0.0] * (len(self.buckets) + 2))
+            series[i] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines: List[str] = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series: Dict[str, List[float]] = {label: list(counts) for label, counts in self._series.items()}
+        for label, counts in sorted(series.items()):
+            base: Dict[str, str] = {self.label: label} if self.label else {}
+            cumulative: float = 0.0
+            for bound, count in zip([*map(str, self.buckets), "+Inf"], counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels({**base, 'le': bound})} {_number(cumulative)}")
+            lines.append(f"{self.name}_sum{_labels(base)} {_number(counts[-1])}")
+            lines.append(f"{self.name}_count{_labels(base)} {_number(cumulative)}")
+        return lines
+
+
+LLM_SECONDS: Histogram = Histogram("nl2sql_llm_request_seconds", "LLM completion latency (retries and hedges included)", LLM_BUCKETS, "model")
+SQL_SECONDS: Histogram = Histogram("nl2sql_sql_execution_seconds", "SQL statement execution time", SQL_BUCKETS)
+_HISTOGRAMS: List[Histogram] = [LLM_SECONDS, SQL_SECONDS]
+
+
+class _Progress:
+    def __init__(self) -> None:
+        self.total: Optional[int] = None
+        self.begin: float = time.monotonic()
+        self.started: int = 0
+        self.completed: int = 0
+        self.failed: int = 0
+        self._lock = threading.Lock()
+
+    def reset(self, total: Optional[int]) -> None:
+        with self._lock:
+            self.total = total
+            self.begin = time.monotonic()
+            self.started = self.completed = self.failed = 0
+
+    def task_started(self) -> None:
+        with self._lock:
+            self.started += 1
+
+    def task_finished(self, ok: bool) -> None:
+        with self._lock:
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            elapsed: float = time.monotonic() - self.begin
+            finished: int = self.completed + self.failed
+            rate: float = finished / elapsed if elapsed > 0 else 0.0
+            samples: List[Sample] = [
+                Sample("nl2sql_tasks_completed_total", "counter", "Tasks finished by this process", self.completed),
+                Sample("nl2sql_tasks_failed_total", "counter", "Tasks that raised in this process", self.failed),
+                Sample("nl2sql_tasks_in_flight", "gauge", "Tasks being processed", self.started - finished),
+                Sample("nl2sql_tasks_per_second", "gauge", "Finished tasks per second since the run started", rate),
+                Sample("nl2sql_run_elapsed_seconds", "gauge", "Seconds since the run started", elapsed),
+            ]
+            if self.total is not None:
+                samples.append(Sample("nl2sql_tasks", "gauge", "Tasks of the run", self.total))
+                if rate > 0:
+                    samples.append(Sample("nl2sql_eta_seconds", "gauge", "Remaining tasks / current rate", (self.total - finished) / rate))
+            return samples
+
+
+PROGRESS: _Progress = _Progress()
+_COLLECTORS: Dict[str, Callable[[], Iterable[Sample]]] = {}
+_COLLECTORS_LOCK = threading.Lock()
+
+
+def register_collector(name: str, collect: Callable[[], Iterable[Sample]]) -> None:
+    """
+        collect() runs on every scrape, a collector that raises is skipped for that scrape.
+    """
+    with _COLLECTORS_LOCK:
+        _COLLECTORS[name] = collect
+
+
+def resident_bytes() -> int:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        # peak, not current, where /proc is missing (kB on Linux, bytes on macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def executor_backlog(executor: ThreadPoolExecutor) -> int:
+    """
+        Submitted work items not picked up by a thread yet.
+    """
+    return executor._work_queue.qsize()
+
+
+def render() -> str:
+    samples: List[Sample] = PROGRESS.samples()
+    samples.append(Sample("process_resident_memory_bytes", "gauge", "Resident set size", resident_bytes()))
+    with _COLLECTORS_LOCK:
+        collectors: List[Tuple[str, Callable[[], Iterable[Sample]]]] = list(_COLLECTORS.items())
+    for name, collect in collectors:
+        try:
+            samples.extend(collect())
+        except Exception as e:
+            logger.debug(f"metrics collector {name} failed: {e}")
+
+    lines: List[str] = []
+    declared: set = set()
+    for sample in sorted(samples, key=lambda s: s.name):
+        if sample.name not in declared:
+            declared.add(sample.name)
+            lines += [f"# HELP {sample.name} {sample.help}", f"# TYPE {sample.name} {sample.kind}"]
+        lines.append(f"{sample.name}{_labels(sample.labels)} {_number(sample.value)}")
+    for histogram in _HISTOGRAMS:
+        lines += histogram.render()
+    return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body: bytes = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def start_metrics_server() -> Optional[ThreadingHTTPServer]:
+    """
+        Serve /metrics on METRICS_HOST (default 127.0.0.1):METRICS_PORT from a daemon thread, None when unset.
+    """
+    port: int = int(os.getenv("METRICS_PORT") or 0)
+    if port <= 0:
+        return None
+    host: str = os.getenv("METRICS_HOST") or "127.0.0.1"
+    try:
+        server: ThreadingHTTPServer = ThreadingHTTPServer((host, port), _Handler)
+    except OSError as e:
+        logger.warning(f"metrics endpoint not started on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"metrics served on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-22 18:05
+# @Author  : jwm
+# @File    : preprocess.py
+# @description: Build every per-database artifact once, before the main run.
+
+import os
+import time
+import hashlib
+from collections import defaultdict
+from multiprocessing import Pool
+from typing import Dict, Any, List, Tuple, Optional
+
+from loguru import logger
+from tqdm import tqdm
+
+from process_data.connection import db_file_path, connect_readonly
+from process_data.artifacts import (
+    ArtifactManifest, artifact_path, load_manifest, file_sha256, sql_digest,
+    column_statistics, write_json, restamp, ARTIFACTS_VERSION,
+)
+from process_data.introspection import build_schema_artifact, schema_artifact_path
+from process_data.value_index import build_value_index, value_index_dir
+from process_data.downsample import build_downsampled, load_downsampled, sample_path
+from process_data.index_advisor import build_indexed_copy, load_indexed
+from runner.evaluate import execute_fingerprint
+from runner.rescore import index_dataset
+
+# JSON artifacts carrying a db_size / db_mtime_ns stamp
+STAMPED_FILES: List[str] = ["schema.json", "stats.json", "gold.json", "values/meta.json", "sample.json", "indexes.json"]
+
+
+def gold_items(dataset: List[Dict[str, Any]]) -> Dict[str, List[Tuple[int, str]]]:
+    """
+        db_id -> [(question_id, gold SQL)]
+    """
+    groups: Dict[str, List[Tuple[int, str]]] = defaultdict(list)
+    for qid, row in index_dataset(dataset).items():
+        if row.get("SQL"):
+            groups[row["db_id"]].append((qid, row["SQL"]))
+    return groups
+
+
+def gold_set_digest(items: List[Tuple[int, str]]) -> str:
+    digest = hashlib.sha256()
+    for qid, sql in sorted(items):
+        digest.update(f"{qid}\t{sql_digest(sql)}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def build_gold_fingerprints(db_path: str, items: List[Tuple[int, str]], timeout: Optional[float]) -> Dict[str, Dict[str, Any]]:
+    fingerprints: Dict[str, Dict[str, Any]] = {}
+    conn = connect_readonly(db_path)
+    try:
+        for qid, sql in items:
+            entry: Dict[str, Any] = {"sql": sql_digest(sql), "digest": None, "error": None}
+            try:
+                entry.update(execute_fingerprint(conn, sql, timeout).to_dict())
+            except Exception as e:
+                entry["error"] = str(e)
+            fingerprints[str(qid)] = entry
+    finally:
+        conn.close()
+    return fingerprints
+
+
+def _artifact_hashes(db_path: str) -> Dict[str, str]:
+    return {
+        name: file_sha256(artifact_path(db_path, name))
+        for name in STAMPED_FILES if os.path.exists(artifact_path(db_path, name))
+    }
+
+
+def prepare_database(job: Tuple[str, List[Tuple[int, str]], bool, int, bool, Optional[float], Optional[List[str]]]) -> Dict[str, Any]:
+    """
+        Pool worker, a failing database is reported instead of stopping the pool.
+    """
+    try:
+        return _prepare_database(*job)
+    except Exception as e:
+        logger.error(f"Preprocessing {job[0]} failed: {e}")
+        return {"db_id": os.path.splitext(os.path.basename(job[0]))[0], "status": "failed", "seconds": 0.0}
+
+
+def _prepare_database(
+        db_path: str,
+        items: List[Tuple[int, str]],
+        with_values: bool,
+        downsample: int,
+        force: bool,
+        timeout: Optional[float],
+        index_sqls: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+    """
+        Build the artifacts of one database, returns what was done ("skipped", "restamped", "gold_rebuilt" or "built").
+        `index_sqls` (predicted SQL, possibly empty) turns on the indexed working copy.
+
+        A database is skipped when its manifest matches the file size / mtime and gold SQL set.
+        When only the stamp moved, the content hash decides: same content -> the artifacts are
+        restamped, different content -> everything is rebuilt.
+    """
+    db_id: str = os.path.splitext(os.path.basename(db_path))[0]
+    begin: float = time.perf_counter()
+    stat = os.stat(db_path)
+    gold_sha256: str = gold_set_digest(items)
+    manifest: Optional[ArtifactManifest] = None if force else load_manifest(db_path)
+    values_ready: bool = not with_values or os.path.exists(os.path.join(value_index_dir(db_path), "meta.json"))
+    sample_ready: bool = not downsample or os.path.exists(sample_path(db_path))
+    indexes_ready: bool = index_sqls is None or os.path.exists(artifact_path(db_path, "indexes.json"))
+
+    status: str = "built"
+    if manifest is not None and values_ready and sample_ready and indexes_ready:
+        if (manifest.db_size, manifest.db_mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+            status = "skipped"
+        elif manifest.db_sha256 == file_sha256(db_path):
+            for name in STAMPED_FILES:
+                restamp(artifact_path(db_path, name), stat.st_size, stat.st_mtime_ns)
+            status = "restamped"
+        if status != "built" and downsample and load_downsampled(db_path, downsample) is None:
+            # same database, other sample size
+            build_downsampled(db_path, sample_path(db_path), downsample)
+        if status != "built" and manifest.gold_sha256 == gold_sha256:
+            if status == "restamped":
+                manifest.db_size, manifest.db_mtime_ns = stat.st_size, stat.st_mtime_ns
+                manifest.files = _artifact_hashes(db_path)
+                write_json(artifact_path(db_path, "manifest.json"), manifest.model_dump())
+            return {"db_id": db_id, "status": status, "seconds": time.perf_counter() - begin}
+
+    if status == "built":
+        schema = build_schema_artifact(db_path, schema_artifact_path(db_path))
+        conn = connect_readonly(db_path)
+        try:
+            stats: Dict[str, Any] = column_statistics(conn, schema.column_names())
+        finally:
+            conn.close()
+        write_json(artifact_path(db_path, "stats.json"), {
+            "version": ARTIFACTS_VERSION, "db_size": stat.st_size, "db_mtime_ns": stat.st_mtime_ns, "tables": stats,
+        })
+        if with_values:
+            build_value_index(db_path, value_index_dir(db_path))
+        if downsample:
+            build_downsampled(db_path, sample_path(db_path), downsample)
+
+    # gold fingerprints follow the dataset, rebuilt whenever its SQL changed
+    write_json(artifact_path(db_path, "gold.json"), {
+        "version": ARTIFACTS_VERSION, "db_size": stat.st_size, "db_mtime_ns": stat.st_mtime_ns,
+        "fingerprints": build_gold_fingerprints(db_path, items, timeout),
+    })
+    if index_sqls is not None:
+        build_indexed_copy(db_path, items, index_sqls, timeout)
+
+    write_json(artifact_path(db_path, "manifest.json"), ArtifactManifest(
+        db_id=db_id,
+        db_sha256=file_sha256(db_path),
+        db_size=stat.st_size,
+        db_mtime_ns=stat.st_mtime_ns,
+        gold_sha256=gold_sha256,
+        files=_artifact_hashes(db_path),
+    ).model_dump())
+    return {"db_id": db_id, "status": status if status == "built" else "gold_rebuilt", "seconds": time.perf_counter() - begin}
+
+
+def preprocess(
+        dataset: List[Dict[str, Any]],
+        data_path: str,
+        data_mode: str,
+        workers: Optional[int] = None,
+        with_values: bool = True,
+        downsample: int = 0,
+        force: bool = False,
+        timeout: Optional[float] = None,
+        index_sqls: Optional[Dict[str, List[str]]] = None
+    ) -> List[Dict[str, Any]]:
+    """
+        Fan databases out over a process pool, largest first, with a progress bar.
+        `index_sqls`: db_id -> extra (predicted) SQL for the index advisor, None to skip indexed copies.
+    """
+    groups: Dict[str, List[Tuple[int, str]]] = gold_items(dataset)
+    databases_dir: str = os.path.join(data_path, f"{data_mode}_databases")
+    db_ids: List[str] = sorted(set(groups) | set(os.listdir(databases_dir) if os.path.isdir(databases_dir) else []))
+    jobs = []
+    for db_id in db_ids:
+        db_path: str = db_file_path(data_path, data_mode, db_id)
+        if not os.path.exists(db_path):
+            logger.warning(f"{db_path} not found, {len(groups.get(db_id, []))} gold queries without artifacts")
+            continue
+        extra: Optional[List[str]] = index_sqls.get(db_id, []) if index_sqls is not None else None
+        jobs.append((db_path, groups.get(db_id, []), with_values, downsample, force, timeout, extra))
+    jobs.sort(key=lambda job: -os.path.getsize(job[0]))
+
+    reports: List[Dict[str, Any]] = []
+    with Pool(processes=workers) as pool:
+        for report in tqdm(pool.imap_unordered(prepare_database, jobs), total=len(jobs), desc="preprocess"):
+            reports.append(report)
+            logger.debug(f"{report['db_id']}: {report['status']} in {report['seconds']:.1f}s")
+    return reports
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-19 11:05
+# @Author  : jwm
+# @File    : rescore.py
+# @description: Re-score existing predictions without running any agent or model.
+
+import os
+import json
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Any, List, Tuple, Optional
+
+from loguru import logger
+
+from process_data.connection import db_file_path, connect_readonly
+from process_data.downsample import load_downsampled
+from process_data.artifacts import gold_fingerprint
+from runner.evaluate import execute_fingerprint, quick_agree
+
+
+def index_dataset(dataset: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    """
+        question_id -> dataset row, question_id defaults to the row position like RunManager.initialize_tasks.
+    """
+    return {int(data.get("question_id", i)): {"question_id": i, **data} for i, data in enumerate(dataset)}
+
+
+def join_predictions(
+        dataset: List[Dict[str, Any]],
+        predictions: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], int]:
+    """
+        Join predictions with the dataset by question_id.
+        Records written before question_id was saved are matched by (db_id, question).
+
+        Returns:
+            joined items (question_id, db_id, difficulty, gold_sql, pred_sql) and the number of unmatched predictions.
+    """
+    by_id: Dict[int, Dict[str, Any]] = index_dataset(dataset)
+    by_question: Dict[Tuple[str, str], int] = {(row["db_id"], row["question"]): qid for qid, row in by_id.items()}
+
+    joined: Dict[int, Dict[str, Any]] = {}
+    unmatched: int = 0
+    for pred in predictions:
+        qid: Optional[int] = pred.get("question_id")
+        if qid is None:
+            qid = by_question.get((pred.get("db_id", ""), pred.get("question", "")))
+        if qid is None or qid not in by_id:
+            unmatched += 1
+            continue
+        row: Dict[str, Any] = by_id[qid]
+        # the last prediction of a question wins, reruns append to the same file
+        joined[qid] = {
+            "question_id": qid,
+            "db_id": row["db_id"],
+            "difficulty": row.get("difficulty"),
+            "gold_sql": row.get("SQL"),
+            "pred_sql": pred.get("answer_sql"),
+        }
+    return list(joined.values()), unmatched
+
+
+def score_database(
+        db_path: str,
+        items: List[Dict[str, Any]],
+        timeout: Optional[float],
+        quick: bool = False
+    ) -> List[Dict[str, Any]]:
+    """
+        Process pool worker: execute gold and predicted SQL of one database over a single read-only connection.
+        quick: items agreeing on the downsampled copy are not re-run on the full database.
+    """
+    results: List[Dict[str, Any]] = []
+    sample_path: Optional[str] = load_downsampled(db_path) if quick else None
+    if quick and sample_path is None:
+        logger.warning(f"no downsampled copy of {db_path}, scoring on the full database")
+    sample = connect_readonly(sample_path) if sample_path is not None else None
+    conn = connect_readonly(db_path)
+    try:
+        for item in items:
+            accuracy: bool = False
+            error: Optional[str] = None
+            scored_on: str = "full"
+            if item["gold_sql"] is None or item["pred_sql"] is None:
+                error = "missing gold or predicted SQL"
+            elif quick_agree(sample, item["gold_sql"], item["pred_sql"], timeout):
+                accuracy, scored_on = True, "sample"
+            else:
+                try:
+                    gold = gold_fingerprint(db_path, item["question_id"], item["gold_sql"])
+                    if gold is None:
+                        gold = execute_fingerprint(conn, item["gold_sql"], timeout)
+                    accuracy = execute_fingerprint(conn, item["pred_sql"], timeout).digest == gold.digest
+                except Exception as e:
+                    error = str(e)
+            results.append({
+                "question_id": item["question_id"],
+                "db_id": item["db_id"],
+                "difficulty": item["difficulty"],
+                "accuracy": accuracy,
+                "error": error,
+                "scored_on": scored_on,
+            })
+    finally:
+        conn.close()
+        if sample is not None:
+            sample.close()
+    return results
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+        Accuracy by difficulty plus an "all" row.
+    """
+    counts: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+    for result in results:
+        for key in (result.get("difficulty") or "unknown", "all"):
+            counts[key][0] += int(result["accuracy"])
+            counts[key][1] += 1
+    return {
+        key: {"correct": correct, "total": total, "accuracy": correct / total if total else 0.0}
+        for key, (correct, total) in sorted(counts.items(), key=lambda kv: (kv[0] == "all", kv[0]))
+    }
+
+
+def rescore(
+        items: List[Dict[str, Any]],
+        data_path: str,
+        data_mode: str,
+        workers: Optional[int] = None,
+        timeout: Optional[float] = None,
+        quick: bool = False
+    ) -> List[Dict[str, Any]]:
+    """
+        Fan joined items out over a process pool, one job per database.
+    """
+    groups: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for item in items:
+        groups[item["db_id"]].append(item)
+
+    results: List[Dict[str, Any]] = []
+    begin: float = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # largest databases first so the tail of the pool stays short
+        futures = {
+            pool.submit(score_database, db_file_path(data_path, data_mode, db_id), group, timeout, quick): db_id
+            for db_id, group in sorted(groups.items(), key=lambda kv: -len(kv[1]))
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            db_id: str = futures[future]
+            try:
+                results.extend(future.result())
+            except Exception as e:
+                logger.error(f"Re-scoring {db_id} failed: {e}")
+                results.extend({
+                    "question_id": item["question_id"], "db_id": db_id, "difficulty": item["difficulty"],
+                    "accuracy": False, "error": str(e),
+                } for item in groups[db_id])
+            logger.info(f"[{done}/{len(futures)}] {db_id} scored, {time.perf_counter() - begin:.1f}s elapsed")
+
+    results.sort(key=lambda r: r["question_id"])
+    if quick:
+        on_sample: int = sum(r.get("scored_on") == "sample" for r in results)
+        logger.info(f"quick mode: {on_sample}/{len(results)} decided on downsampled copies, the rest on the full databases")
+    return results
+
+
+def save_rescore(output_dir: str, results: List[Dict[str, Any]], summary: Dict[str, Dict[str, Any]]) -> None:
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "rescore_result.json"), "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4, ensure_ascii=False)
+    with open(os.path.join(output_dir, "rescore_summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=4, ensure_ascii=False)
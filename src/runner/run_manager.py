@@ -7,20 +7,32 @@
 import os 
 import json
 import sys
+import time
 
 from os import getenv
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from http.server import ThreadingHTTPServer
 from ast import literal_eval
-from typing import List, Dict, Any, Optional, Callable
+from typing import List, Dict, Any, Optional, Callable, Set
 from loguru import logger
 from dotenv import find_dotenv, load_dotenv
 
 from runner.enum_aggretion import Task, Model, Response
+from runner.task_store import TaskStore, parse_filter
+from runner.work_queue import WorkQueue, LeaseKeeper, POLL_SECONDS
+from runner.metrics import PROGRESS, Sample, executor_backlog, register_collector, start_metrics_server
 from process_data.schema_generator import schema_list
 from process_data.connection import DB_System
 from process_data.schema_generator import Schema
 from workflow.agents.agent_factory import registry_agents
 from workflow.framework import FrameWork
 from workflow.agents.meta_agent import MetaAgent
+from llm.llm_cache import LlmCache, peek_llm_cache
+from llm.llm_meta import token_usage, stream_stats
+from process_data.preflight import preflight_stats
+from process_data.replica import ReplicaManager, get_replicas
+from workflow.dag import dag_stats, get_dag_executor
+from workflow.blackboard import blackboard_stats
 
 
 _DOTENV_PATH = find_dotenv(usecwd=True)
@@ -33,12 +45,14 @@ else:
 class RunManager:
     def __init__(self, args: Any) -> None:
         self.args = args
-        self.tasks: List[Task] = []
+        self.tasks: TaskStore = TaskStore.from_rows([])
         self.schema_generator: Callable = schema_list[args.schema_generator]
         self.total_task_num: int = 0
         with open(self.args.model_path, 'r') as f:
             self.model_list: List[Dict[str, Any]] = json.load(f)
         self.agents: Optional[List[MetaAgent]] = None
+        self._executor: Optional[ThreadPoolExecutor] = None       # task pool, exposed as a metrics queue depth
+        self._queue: Optional[WorkQueue] = None
         if self.schema_generator is not None:
             logger.info(f"RunManager init correctly, chosen schema_generator: {args.schema_generator}")
         else:
@@ -62,10 +76,11 @@ class RunManager:
         for agent in agents_list:
             try:
                 # 使用大小写不敏感的匹配
+                # AGENTS lists DAG node names, a model without `node` is named after its agent
                 matched_models: List[Model] = [
                     Model(**singal_model) 
                     for singal_model in model_list 
-                    if agent.lower() == singal_model["corresponding_agent"].lower()
+                    if agent.lower() == (singal_model.get("node") or singal_model["corresponding_agent"]).lower()
                 ]
                 if matched_models:
                     agents.extend(matched_models)
@@ -87,13 +102,14 @@ class RunManager:
         Args:
             dataset (List[Dict[str, Any]]): The dataset containing task information.
         """
-        for i, data in enumerate(dataset):
-            if "question_id" not in data:
-                data = {"question_id": i, **data}
-            task: Task = Task(**data)
-            self.tasks.append(task)
+        self.tasks = TaskStore.from_rows(dataset)
+        # TASK_DB_IDS / TASK_DIFFICULTY: comma separated subsets to run, empty for all
+        db_ids: Optional[List[str]] = parse_filter(getenv("TASK_DB_IDS"))
+        difficulties: Optional[List[str]] = parse_filter(getenv("TASK_DIFFICULTY"))
+        if db_ids is not None or difficulties is not None:
+            self.tasks = self.tasks.filter(db_ids, difficulties)
         self.total_task_num = len(self.tasks)
-        logger.info(f"initialize task completed, total task number is {self.total_task_num}")
+        logger.info(f"initialize task completed, total task number is {self.total_task_num}, columns take {self.tasks.nbytes() >> 10} KB")
         # Avoid having only one model information in the models.josn.
         if isinstance(self.model_list, Dict):
             self.model_list = [self.model_list]
@@ -103,12 +119,170 @@ class RunManager:
 
     def run_task(self) -> None:
         """
-            NL2SQL work flow.
-            Not completed, multithreaded asynchronous needs to be supplemented
+            NL2SQL work flow. WORKERS tasks run at once on a thread pool, agents are shared
+            (per-task state lives in each FrameWork's AgentContexts).
         """
-        for task in self.tasks:
-            self.worker(task)
-        
+        if self.agents is None:
+            logger.warning(f"agents bind nothing")
+            sys.exit(1)
+        workers: int = int(getenv("WORKERS") or 1)
+        server: Optional[ThreadingHTTPServer] = self.start_metrics(len(self.tasks))
+        try:
+            if workers <= 1:
+                for task in self.tasks:
+                    self.worker(task)
+            else:
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="task") as executor:
+                    self._executor = executor
+                    # bounded submission: at most 2 * workers tasks materialised ahead of the pool
+                    pending: Set[Future] = set()
+                    for task in self.tasks:
+                        if len(pending) >= 2 * workers:
+                            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            self._collect(done)
+                        pending.add(executor.submit(self.worker, task))
+                    self._collect(wait(pending).done)
+        finally:
+            self._executor = None
+            if server is not None:
+                server.shutdown()
+        self.log_stats()
+
+    def start_metrics(self, total: Optional[int]) -> Optional[ThreadingHTTPServer]:
+        """
+            Reset the progress counters and serve /metrics when METRICS_PORT is set, see runner.metrics.
+        """
+        PROGRESS.reset(total)
+        register_collector("run_manager", self.metric_samples)
+        return start_metrics_server()
+
+    def metric_samples(self) -> List[Sample]:
+        """
+            Cache hit ratios and queue depths, read on every scrape.
+        """
+        board: Dict[str, Any] = blackboard_stats()
+        board_hits: int = board["task_hits"] + board["db_hits"]
+        preflight: Dict[str, Any] = preflight_stats()
+        samples: List[Sample] = [
+            Sample("nl2sql_cache_hit_ratio", "gauge", "Hit ratio per cache",
+                   board_hits / (board_hits + board["derived"]) if board_hits + board["derived"] else 0.0, {"cache": "blackboard"}),
+            Sample("nl2sql_sql_preflight_total", "counter", "Candidate SQL checked / rejected by EXPLAIN", preflight["checked"], {"result": "checked"}),
+            Sample("nl2sql_sql_preflight_total", "counter", "Candidate SQL checked / rejected by EXPLAIN", preflight["rejected"], {"result": "rejected"}),
+        ]
+        # the LLM cache file is only opened by the first LLM call, not for a scrape
+        llm_cache: Optional[LlmCache] = peek_llm_cache()
+        if llm_cache is not None:
+            samples.append(Sample("nl2sql_cache_hit_ratio", "gauge", "Hit ratio per cache", llm_cache.stats()["hit_ratio"], {"cache": "llm"}))
+        replicas: Optional[ReplicaManager] = get_replicas()
+        if replicas is not None:
+            replica: Dict[str, Any] = replicas.stats()
+            samples += [
+                Sample("nl2sql_cache_hit_ratio", "gauge", "Hit ratio per cache", replica["hit_rate"], {"cache": "replica"}),
+                Sample("nl2sql_replica_resident_bytes", "gauge", "Memory held by in-memory replicas", replica["resident_mb"] * (1 << 20)),
+            ]
+        from workflow import voting
+        from workflow.agents import generator
+        executors: Dict[str, Optional[ThreadPoolExecutor]] = {
+            "task": self._executor,
+            "agent_dag": get_dag_executor(),
+            "sql_vote": voting._EXECUTOR,
+            "llm_sample": generator._SAMPLE_EXECUTOR,
+        }
+        samples += [
+            Sample("nl2sql_executor_backlog", "gauge", "Work items waiting for a thread", executor_backlog(executor), {"executor": name})
+            for name, executor in executors.items() if executor is not None
+        ]
+        if self._queue is not None:
+            counts: Dict[str, int] = self._queue.counts()
+            samples += [
+                Sample("nl2sql_work_queue_tasks", "gauge", "Tasks of the shared work queue per state", counts.get(state, 0), {"state": state})
+                for state in ("pending", "leased", "done", "failed")
+            ]
+        return samples
+
+    def log_stats(self) -> None:
+        llm_cache: Optional[LlmCache] = peek_llm_cache()
+        if llm_cache is not None:
+            logger.info(f"LLM cache stats: {llm_cache.stats()}")
+        logger.info(f"Local generation token usage: {token_usage()}")
+        logger.info(f"Streamed completion stats: {stream_stats()}")
+        logger.info(f"SQL preflight stats: {preflight_stats()}")
+        logger.info(f"Agent DAG stats: {dag_stats()}")
+        logger.info(f"Blackboard stats: {blackboard_stats()}")
+        replicas: Optional[ReplicaManager] = get_replicas()
+        if replicas is not None:
+            logger.info(f"In-memory replica stats: {replicas.stats()}")
+        if os.getenv("SCHEMA_LINKING_TOP_K"):
+            from process_data.schema_linking import linking_stats
+            logger.info(f"Schema linking token savings: {linking_stats()}")
+
+    def run_distributed(self, queue: WorkQueue, worker_id: str) -> None:
+        """
+            Distributed run: tasks come from the shared work queue instead of self.tasks order, WORKERS at a time.
+            Every worker enqueues the (same) dataset, leases tasks, keeps their leases alive while running and
+            writes results to its own shard (RESULT_SHARD), see runner.work_queue.merge_shards.
+        """
+        if self.agents is None:
+            logger.warning(f"agents bind nothing")
+            sys.exit(1)
+        os.environ["RESULT_SHARD"] = worker_id
+        self._queue = queue
+        workers: int = max(1, int(getenv("WORKERS") or 1))
+        poll: float = float(getenv("QUEUE_POLL_SECONDS") or POLL_SECONDS)
+        added: int = queue.enqueue(task.question_id for task in self.tasks)
+        logger.info(f"worker {worker_id} joined queue {queue.path} ({added} tasks added), queue: {queue.counts()}")
+
+        keeper: LeaseKeeper = LeaseKeeper(queue, worker_id)
+        keeper.start()
+        # the worker's share of the run is unknown up front, the queue depths stand in for an ETA
+        server: Optional[ThreadingHTTPServer] = self.start_metrics(None)
+        running: Dict[Future, int] = {}
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="task") as executor:
+                self._executor = executor
+                while True:
+                    if len(running) < workers:
+                        for question_id in queue.lease(worker_id, workers - len(running)):
+                            task: Optional[Task] = self.tasks.get(question_id)
+                            if task is None:
+                                queue.fail(worker_id, question_id, f"not in the dataset of worker {worker_id}")
+                                continue
+                            keeper.hold(question_id)
+                            running[executor.submit(self.worker, task)] = question_id
+                    if not running:
+                        if queue.finished():
+                            break
+                        # the rest is leased by other workers, wait for them to finish or their leases to expire
+                        time.sleep(poll)
+                        continue
+                    done, _ = wait(list(running), timeout=poll, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        question_id = running.pop(future)
+                        keeper.release(question_id)
+                        try:
+                            future.result()
+                        except Exception as e:
+                            logger.error(f"task {question_id} failed: {e}")
+                            queue.fail(worker_id, question_id, str(e))
+                            continue
+                        if not queue.complete(worker_id, question_id):
+                            logger.warning(f"task {question_id} was already completed by another worker")
+        finally:
+            keeper.stop()
+            self._executor = None
+            if server is not None:
+                server.shutdown()
+        logger.info(f"worker {worker_id} finished, queue: {queue.counts()}")
+        self.log_stats()
+
+
+    @staticmethod
+    def _collect(done: Set[Future]) -> None:
+        for future in done:
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"task failed: {e}")
 
     def worker(self, task: Task) -> None:
         """
@@ -118,16 +292,23 @@ class RunManager:
             task (Task): The task to be processed.
         """
         logger.info(f"begin task: {task.db_id} {task.question_id}")
-        
+        PROGRESS.task_started()
+        ok: bool = False
         db_system: DB_System = DB_System(self.args, task)
-        schema: Schema = self.schema_generator(db_system.conn)
+        try:
+            schema: Schema = self.schema_generator(db_system.conn)
 
-        if self.agents is None:
-            logger.warning(f"agents bind nothing")
-            sys.exit(1)
+            if self.agents is None:
+                logger.warning(f"agents bind nothing")
+                sys.exit(1)
 
-        # nl2sql_framework = FrameWork(db_system, schema, self.agents)
-        nl2sql_framework: FrameWork = FrameWork(self.args, db_system, schema, task, self.agents)
-        nl2sql_framework._run()
+            # nl2sql_framework = FrameWork(db_system, schema, self.agents)
+            nl2sql_framework: FrameWork = FrameWork(self.args, db_system, schema, task, self.agents)
+            nl2sql_framework._run()
+            ok = True
+        finally:
+            # a replica connection left open keeps its shared-cache reader alive past the task
+            db_system.close()
+            PROGRESS.task_finished(ok)
 
 
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-25 10:20
+# @Author  : jwm
+# @File    : task_store.py
+# @description: Columnar store of the dataset rows, Task objects are only built when a task is picked up.
+
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Dict, List, Any, Optional, Iterable, Iterator
+
+from runner.enum_aggretion import Task
+
+_REQUIRED: List[str] = ["db_id", "question", "evidence"]
+
+
+class _StringColumn:
+    """
+        Arrow style string column: one UTF-8 buffer, int64 offsets and a null mask.
+    """
+    def __init__(self) -> None:
+        self._data: bytearray = bytearray()
+        self._offsets: array = array("q", [0])
+        self._nulls: array = array("b")
+
+    def append(self, value: Optional[str]) -> None:
+        if value is not None:
+            self._data += str(value).encode("utf-8")
+        self._offsets.append(len(self._data))
+        self._nulls.append(value is None)
+
+    def __getitem__(self, i: int) -> Optional[str]:
+        if self._nulls[i]:
+            return None
+        return self._data[self._offsets[i]:self._offsets[i + 1]].decode("utf-8")
+
+    def nbytes(self) -> int:
+        return len(self._data) + self._offsets.itemsize * len(self._offsets) + len(self._nulls)
+
+
+class _CategoryColumn:
+    """
+        Interned strings (db_id, difficulty): uint32 codes into a table of distinct values, code 0 is None.
+    """
+    def __init__(self) -> None:
+        self.values: List[Optional[str]] = [None]
+        self._codes: Dict[Optional[str], int] = {None: 0}
+        self.codes: array = array("I")
+
+    def append(self, value: Optional[str]) -> None:
+        value = sys.intern(str(value)) if value is not None else None
+        code: Optional[int] = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def code(self, value: Optional[str]) -> Optional[int]:
+        return self._codes.get(value)
+
+    def __getitem__(self, i: int) -> Optional[str]:
+        return self.values[self.codes[i]]
+
+    def nbytes(self) -> int:
+        return self.codes.itemsize * len(self.codes)
+
+
+class _Columns:
+    def __init__(self) -> None:
+        self.question_id: array = array("q")
+        self.db_id: _CategoryColumn = _CategoryColumn()
+        self.difficulty: _CategoryColumn = _CategoryColumn()
+        self.question: _StringColumn = _StringColumn()
+        self.evidence: _StringColumn = _StringColumn()
+        self.SQL: _StringColumn = _StringColumn()
+        self.sorted_ids: bool = True
+        self.positions: Optional[Dict[int, int]] = None     # question_id -> row, only when ids are not ascending
+
+
+class TaskStore:
+    """
+        Dataset rows kept column by column; indexing by position or question_id hands out a Task built with
+        model_construct (no validation, rows are checked once on load). filter() returns a store sharing the
+        same columns over a subset of rows.
+    """
+    def __init__(self, columns: _Columns, rows: Optional[array] = None) -> None:
+        self._columns: _Columns = columns
+        self._rows: Optional[array] = rows        # selected row numbers, None for all rows
+
+    @classmethod
+    def from_rows(cls, dataset: Iterable[Dict[str, Any]]) -> "TaskStore":
+        """
+            question_id defaults to the row position; a row missing db_id / question / evidence or repeating
+            a question_id raises ValueError.
+        """
+        columns: _Columns = _Columns()
+        for i, data in enumerate(dataset):
+            missing: List[str] = [key for key in _REQUIRED if data.get(key) is None]
+            if missing:
+                raise ValueError(f"dataset row {i} has no {', '.join(missing)}")
+            question_id: int = int(data.get("question_id", i))
+            if columns.question_id and question_id <= columns.question_id[-1]:
+                columns.sorted_ids = False
+            columns.question_id.append(question_id)
+            columns.db_id.append(str(data["db_id"]))
+            columns.difficulty.append(data.get("difficulty"))
+            columns.question.append(data["question"])
+            columns.evidence.append(data["evidence"])
+            columns.SQL.append(data.get("SQL"))
+        if not columns.sorted_ids:
+            # strictly increasing ids are unique, only an out-of-order dataset can repeat one
+            positions: Dict[int, int] = {}
+            for row, question_id in enumerate(columns.question_id):
+                if question_id in positions:
+                    raise ValueError(f"dataset rows {positions[question_id]} and {row} share question_id {question_id}")
+                positions[question_id] = row
+            columns.positions = positions
+        return cls(columns)
+
+    def __len__(self) -> int:
+        return len(self._rows) if self._rows is not None else len(self._columns.question_id)
+
+    def _row(self, position: int) -> int:
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(f"task position {position} out of range")
+        return self._rows[position] if self._rows is not None else position
+
+    def _task(self, row: int) -> Task:
+        columns: _Columns = self._columns
+        return Task.model_construct(
+            question_id=columns.question_id[row],
+            db_id=columns.db_id[row],
+            question=columns.question[row],
+            evidence=columns.evidence[row],
+            SQL=columns.SQL[row],
+            difficulty=columns.difficulty[row],
+        )
+
+    def __getitem__(self, position: int) -> Task:
+        return self._task(self._row(position))
+
+    def __iter__(self) -> Iterator[Task]:
+        rows: Iterable[int] = self._rows if self._rows is not None else range(len(self._columns.question_id))
+        for row in rows:
+            yield self._task(row)
+
+    def _find(self, question_id: int) -> Optional[int]:
+        columns: _Columns = self._columns
+        if columns.positions is not None:
+            row: Optional[int] = columns.positions.get(question_id)
+        else:
+            row = bisect_left(columns.question_id, question_id)
+            row = row if row < len(columns.question_id) and columns.question_id[row] == question_id else None
+        if row is None or self._rows is None:
+            return row
+        i: int = bisect_left(self._rows, row)
+        return row if i < len(self._rows) and self._rows[i] == row else None
+
+    def get(self, question_id: int) -> Optional[Task]:
+        row: Optional[int] = self._find(question_id)
+        return self._task(row) if row is not None else None
+
+    def __contains__(self, question_id: int) -> bool:
+        return self._find(question_id) is not None
+
+    def filter(
+            self,
+            db_ids: Optional[Iterable[str]] = None,
+            difficulties: Optional[Iterable[Optional[str]]] = None
+        ) -> "TaskStore":
+        """
+            Rows whose db_id / difficulty is in the given sets (None: no constraint), compared on interned codes.
+        """
+        columns: _Columns = self._columns
+
+        def codes(column: _CategoryColumn, values: Optional[Iterable[Optional[str]]]) -> Optional[set]:
+            if values is None:
+                return None
+            return {code for code in (column.code(v) for v in values) if code is not None}
+
+        db_codes: Optional[set] = codes(columns.db_id, db_ids)
+        difficulty_codes: Optional[set] = codes(columns.difficulty, difficulties)
+        source: Iterable[int] = self._rows if self._rows is not None else range(len(columns.question_id))
+        rows: array = array("q", (
+            row for row in source
+            if (db_codes is None or columns.db_id.codes[row] in db_codes)
+            and (difficulty_codes is None or columns.difficulty.codes[row] in difficulty_codes)
+        ))
+        return TaskStore(columns, rows)
+
+    def db_ids(self) -> List[str]:
+        """
+            Distinct db_ids of the selected rows, in first-seen order.
+        """
+        column: _CategoryColumn = self._columns.db_id
+        seen: Dict[int, None] = {}
+        for row in self._rows if self._rows is not None else range(len(column.codes)):
+            seen.setdefault(column.codes[row], None)
+        return [column.values[code] for code in seen]  # type: ignore[misc]
+
+    def nbytes(self) -> int:
+        columns: _Columns = self._columns
+        return sum([
+            columns.question_id.itemsize * len(columns.question_id), columns.db_id.nbytes(), columns.difficulty.nbytes(),
+            columns.question.nbytes(), columns.evidence.nbytes(), columns.SQL.nbytes(),
+        ])
+
+
+def parse_filter(value: Optional[str]) -> Optional[List[str]]:
+    """
+        Comma separated env value -> list, empty -> None (no filtering).
+    """
+    if not value:
+        return None
+    return [item.strip() for item in value.split(",") if item.strip()]
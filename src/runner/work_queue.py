@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-26 15:20
+# @Author  : jwm
+# @File    : work_queue.py
+# @description: SQLite-file work queue with leases, so several main.py workers (machines) share one run.
+
+import os
+import re
+import json
+import glob
+import time
+import sqlite3
+import threading
+from sqlite3 import Connection
+from typing import Dict, List, Any, Optional, Iterable, Set
+
+from loguru import logger
+
+LEASE_SECONDS: float = 120.0     # a lease not renewed for this long is handed to another worker
+MAX_ATTEMPTS: int = 3            # deliveries of one task before it is marked failed
+POLL_SECONDS: float = 5.0
+
+_SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS tasks (
+    question_id INTEGER PRIMARY KEY,
+    position INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS tasks_state ON tasks(state, position);
+"""
+
+
+def shard_name(worker: str) -> str:
+    """
+        File-name-safe form of a worker id, the <worker> of original_result.<worker>.json.
+    """
+    return re.sub(r"[^0-9A-Za-z_.-]", "_", worker)
+
+
+class WorkQueue:
+    """
+        Tasks (question ids) in a SQLite file every worker opens, e.g. on a shared filesystem.
+        States: pending -> leased -> done / failed. A leased task whose lease expired (worker died, heartbeats
+        stopped) is delivered again, up to max_attempts deliveries. Every change is a short BEGIN IMMEDIATE
+        transaction on a fresh connection; rollback journal (not WAL), which needs shared memory on one host.
+        Lease times are wall clock, worker clocks are assumed roughly in sync (well under lease_seconds).
+    """
+    def __init__(self, path: str, lease_seconds: Optional[float] = None, max_attempts: Optional[int] = None) -> None:
+        self.path: str = path
+        self.lease_seconds: float = lease_seconds or float(os.getenv("QUEUE_LEASE_SECONDS") or LEASE_SECONDS)
+        self.max_attempts: int = max_attempts or int(os.getenv("QUEUE_MAX_ATTEMPTS") or MAX_ATTEMPTS)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn: Connection = self._connect()
+        try:
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self) -> Connection:
+        conn: Connection = sqlite3.connect(self.path, timeout=60.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = DELETE")
+        return conn
+
+    def _transaction(self, body) -> Any:
+        conn: Connection = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result: Any = body(conn)
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return result
+        finally:
+            conn.close()
+
+    def enqueue(self, question_ids: Iterable[int]) -> int:
+        """
+            Add tasks in dataset order, ids already queued are kept as they are, so every worker may call it.
+        """
+        rows: List[tuple] = [(int(qid), position) for position, qid in enumerate(question_ids)]
+        added: int = self._transaction(lambda conn: conn.executemany(
+            "INSERT OR IGNORE INTO tasks(question_id, position) VALUES (?, ?)", rows
+        ).rowcount)
+        return added
+
+    def lease(self, worker: str, n: int = 1) -> List[int]:
+        """
+            Up to n pending (or lease-expired) tasks for `worker`, in dataset order.
+        """
+        def body(conn: Connection) -> List[int]:
+            now: float = time.time()
+            # expired leases that used up their deliveries fail instead of going round again
+            conn.execute(
+                "UPDATE tasks SET state = 'failed', error = 'lease expired', updated = ? "
+                "WHERE state = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            ids: List[int] = [row[0] for row in conn.execute(
+                "SELECT question_id FROM tasks WHERE state = 'pending' OR (state = 'leased' AND lease_until < ?) "
+                "ORDER BY position LIMIT ?",
+                (now, n),
+            )]
+            conn.executemany(
+                "UPDATE tasks SET state = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1, updated = ? "
+                "WHERE question_id = ?",
+                [(worker, now + self.lease_seconds, now, qid) for qid in ids],
+            )
+            return ids
+        return self._transaction(body)
+
+    def heartbeat(self, worker: str, question_ids: Iterable[int]) -> Set[int]:
+        """
+            Extend the leases `worker` still holds, returns the ids whose lease it lost.
+        """
+        ids: List[int] = list(question_ids)
+
+        def body(conn: Connection) -> Set[int]:
+            now: float = time.time()
+            lost: Set[int] = set()
+            for qid in ids:
+                renewed: int = conn.execute(
+                    "UPDATE tasks SET lease_until = ?, updated = ? WHERE question_id = ? AND worker = ? AND state = 'leased'",
+                    (now + self.lease_seconds, now, qid, worker),
+                ).rowcount
+                if not renewed:
+                    lost.add(qid)
+            return lost
+        return self._transaction(body) if ids else set()
+
+    def complete(self, worker: str, question_id: int) -> bool:
+        """
+            Mark done; False when the task was already done (its lease had expired and another worker finished it).
+        """
+        return bool(self._transaction(lambda conn: conn.execute(
+            "UPDATE tasks SET state = 'done', worker = ?, lease_until = NULL, error = NULL, updated = ? "
+            "WHERE question_id = ? AND state != 'done'",
+            (worker, time.time(), question_id),
+        ).rowcount))
+
+    def fail(self, worker: str, question_id: int, error: str) -> None:
+        """
+            Back to pending for another delivery, failed once max_attempts deliveries were made.
+        """
+        self._transaction(lambda conn: conn.execute(
+            "UPDATE tasks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "lease_until = NULL, error = ?, updated = ? WHERE question_id = ? AND worker = ? AND state = 'leased'",
+            (self.max_attempts, error[:1000], time.time(), question_id, worker),
+        ))
+
+    def counts(self) -> Dict[str, int]:
+        conn: Connection = self._connect()
+        try:
+            return {state: count for state, count in conn.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state")}
+        finally:
+            conn.close()
+
+    def finished(self) -> bool:
+        """
+            Nothing pending or leased is left.
+        """
+        counts: Dict[str, int] = self.counts()
+        return not counts.get("pending") and not counts.get("leased")
+
+    def done_by(self) -> Dict[int, str]:
+        """
+            question_id -> worker credited with the result.
+        """
+        conn: Connection = self._connect()
+        try:
+            return {qid: worker for qid, worker in conn.execute("SELECT question_id, worker FROM tasks WHERE state = 'done'")}
+        finally:
+            conn.close()
+
+
+class LeaseKeeper(threading.Thread):
+    """
+        Renews the leases of the tasks a worker is running every lease_seconds / 3.
+    """
+    def __init__(self, queue: WorkQueue, worker: str) -> None:
+        super().__init__(name="lease-keeper", daemon=True)
+        self.queue: WorkQueue = queue
+        self.worker: str = worker
+        self._held: Set[int] = set()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def hold(self, question_id: int) -> None:
+        with self._lock:
+            self._held.add(question_id)
+
+    def release(self, question_id: int) -> None:
+        with self._lock:
+            self._held.discard(question_id)
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.queue.lease_seconds / 3):
+            with self._lock:
+                held: List[int] = list(self._held)
+            try:
+                lost: Set[int] = self.queue.heartbeat(self.worker, held)
+            except sqlite3.Error as e:
+                logger.warning(f"lease heartbeat failed: {e}")
+                continue
+            if lost:
+                logger.warning(f"worker {self.worker} lost the leases of {sorted(lost)}, they may be run twice")
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+def _read_shard(path: str) -> List[Dict[str, Any]]:
+    """
+        Records appended by Evaluator.save_sql; a truncated last record (worker killed mid-write) is dropped.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        content: str = f.read()
+    decoder: json.JSONDecoder = json.JSONDecoder()
+    records: List[Dict[str, Any]] = []
+    i: int = 0
+    while True:
+        while i < len(content) and content[i] in " \t\r\n,":
+            i += 1
+        if i >= len(content):
+            return records
+        try:
+            record, i = decoder.raw_decode(content, i)
+        except json.JSONDecodeError:
+            logger.warning(f"{path}: dropped a truncated record after {len(records)} records")
+            return records
+        records.append(record)
+
+
+def merge_shards(result_root: str = "./result", queue: Optional[WorkQueue] = None) -> Dict[str, int]:
+    """
+        Merge every result/<output_name>/original_result.<worker>.json into original_result.json, one record per
+        question (the one of the worker the queue credits, else the first read), in question_id order.
+        Shard names are sanitised worker ids, credited workers are compared in the same form.
+        Returns records written per output name.
+    """
+    credited: Dict[int, str] = {qid: shard_name(worker) for qid, worker in queue.done_by().items()} if queue is not None else {}
+    written: Dict[str, int] = {}
+    for output_dir in sorted(glob.glob(os.path.join(result_root, "*", ""))):
+        shards: List[str] = sorted(glob.glob(os.path.join(output_dir, "original_result.*.json")))
+        if not shards:
+            continue
+        merged: Dict[int, Dict[str, Any]] = {}
+        for shard in shards:
+            worker: str = os.path.basename(shard)[len("original_result."):-len(".json")]
+            for record in _read_shard(shard):
+                qid: int = record["question_id"]
+                if qid not in merged or credited.get(qid) == worker:
+                    merged[qid] = record
+        with open(os.path.join(output_dir, "original_result.json"), "w", encoding="utf-8") as f:
+            for qid in sorted(merged):
+                f.write(json.dumps(merged[qid], indent=4, ensure_ascii=False) + ",\n")
+        name: str = os.path.basename(os.path.dirname(output_dir))
+        written[name] = len(merged)
+        logger.info(f"merged {len(shards)} result shards of {name}: {len(merged)} questions")
+    return written
@@ -1,28 +1,110 @@
-import importlib, pkgutil, inspect, sys
+import importlib, pkgutil, inspect, sys, os, json, threading
 
 from workflow import agents
 from runner.enum_aggretion import Model
-from typing import Iterable, Dict, Any, List
-from workflow.agents.meta_agent import MetaAgent, get_registry
+from typing import Iterable, Dict, Any, List, Optional, Type
+from loguru import logger
+from workflow.agents.meta_agent import MetaAgent, get_registry, lookup, normalize_name
+
+# Precomputed {normalized agent name: "module:Class"}, regenerate with
+#   python -m workflow.agents.agent_factory
+DEFAULT_MANIFEST_PATH: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "agents_manifest.json")
+
+_DISCOVERED: bool = False
+_MANIFEST: Optional[Dict[str, str]] = None
+_DISCOVER_LOCK = threading.RLock()
+
 
 def autodiscover_agents() -> None:
     """
-    Import all first-level submodules under the workflow.agents package and trigger the @register method.    
+    Import all first-level submodules under the workflow.agents package and trigger the @register method.
+    Runs at most once per process.
+    """
+    global _DISCOVERED
+    with _DISCOVER_LOCK:
+        if _DISCOVERED:
+            return
+
+        pkg_name = __package__  # "workflow.agents"
+
+        # If __package__ is empty (very rare), fallback
+        if not pkg_name:
+            pkg_name = MetaAgent.__module__.rsplit(".", 1)[0]
+
+        pkg = sys.modules[pkg_name]
+
+        for m in pkgutil.iter_modules(pkg.__path__):  # type: ignore[attr-defined]
+            if m.name.startswith("_"):
+                continue
+            if m.name in {"meta_agent", "agent_factory"}:
+                continue
+            importlib.import_module(f"{pkg_name}.{m.name}")
+        _DISCOVERED = True
+
+
+def load_manifest(path: Optional[str] = None) -> Dict[str, str]:
+    """
+    Load the agent manifest once per process, missing manifest means an empty one (full discovery fallback).
+    The path can be overridden with the AGENT_MANIFEST environment variable.
     """
-    pkg_name = __package__  # "workflow.agents"
+    global _MANIFEST
+    with _DISCOVER_LOCK:
+        if _MANIFEST is not None and path is None:
+            return _MANIFEST
+        manifest_path: str = path or os.getenv("AGENT_MANIFEST") or DEFAULT_MANIFEST_PATH
+        manifest: Dict[str, str] = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = {normalize_name(k): v for k, v in json.load(f).items()}
+        else:
+            logger.debug(f"Agent manifest not found: {manifest_path}, fallback to autodiscover")
+        if path is None:
+            _MANIFEST = manifest
+        return manifest
 
-    # If __package__ is empty (very rare), fallback 
-    if not pkg_name:
-        pkg_name = MetaAgent.__module__.rsplit(".", 1)[0]
 
-    pkg = sys.modules[pkg_name]
+def resolve_agent(name: str) -> Type[MetaAgent]:
+    """
+    O(1) lookup of a registered agent class.
+    Only the module named by the manifest is imported; a full discovery is the fallback for unknown names.
+    """
+    cls = lookup(name)
+    if cls is not None:
+        return cls
+
+    target: Optional[str] = load_manifest().get(normalize_name(name))
+    if target is not None:
+        module_name, _, cls_name = target.partition(":")
+        try:
+            module = importlib.import_module(module_name)
+            cls = lookup(name) or getattr(module, cls_name, None)
+        except ImportError as e:
+            logger.warning(f"Manifest entry {name} -> {target} can't be imported: {e}, fallback to autodiscover")
 
-    for m in pkgutil.iter_modules(pkg.__path__):  # type: ignore[attr-defined]
-        if m.name.startswith("_"):
-            continue
-        if m.name in {"meta_agent", "agent_factory"}:
-            continue
-        importlib.import_module(f"{pkg_name}.{m.name}")
+    if cls is None:
+        autodiscover_agents()
+        cls = lookup(name)
+
+    if cls is None:
+        raise KeyError(f"Can't find registried agent: {name}; Could use: {list(get_registry().keys())}")
+    return cls
+
+
+def build_manifest() -> Dict[str, str]:
+    """
+    Discover every agent and map each registered name/alias to "module:Class".
+    """
+    autodiscover_agents()
+    return {name: f"{cls.__module__}:{cls.__name__}" for name, cls in sorted(get_registry().items())}
+
+
+def write_manifest(path: str = DEFAULT_MANIFEST_PATH) -> Dict[str, str]:
+    manifest: Dict[str, str] = build_manifest()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4, ensure_ascii=False)
+        f.write("\n")
+    logger.info(f"Agent manifest written to {path}: {list(manifest.keys())}")
+    return manifest
 
 
 def registry_agents(
@@ -30,31 +112,20 @@ def registry_agents(
     *,
     common_kwargs: Dict[str, Any] | None = None,
     per_agent_kwargs: Dict[str, Dict[str, Any]] | None = None,
-    
+
 ) -> List[MetaAgent]:
     """
     names: The name or alias of the Agent to be instantiated
     common_kwargs: Input parameters shared by all agents
     per_agent_kwargs: Dedicated input parameter for a specific name, such as {"Generator": {"topk": 5}}
     """
-    autodiscover_agents()
-    reg = get_registry()
-
     common_kwargs = common_kwargs or {}
     per_agent_kwargs = per_agent_kwargs or {}
 
     out: List[MetaAgent] = []
     for i in range(len(agents)):
         n = agents[i].corresponding_agent
-        # 大小写不敏感的查找
-        cls = None
-        for reg_name, reg_cls in reg.items():
-            if reg_name.lower() == n.lower():
-                cls = reg_cls
-                break
-        
-        if cls is None:
-            raise KeyError(f"Can't find registried agent: {n}; Could use: {list(reg.keys())}")
+        cls = resolve_agent(n)
 
         if not inspect.isclass(cls) or not issubclass(cls, MetaAgent):
             raise TypeError(f"{n} Not MetaAgent sub class")
@@ -62,3 +133,7 @@ def registry_agents(
         kwargs = {**common_kwargs, **per_agent_kwargs.get(n, {})}
         out.append(cls(model_info=agents[i], **kwargs))
     return out
+
+
+if __name__ == "__main__":
+    write_manifest(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_MANIFEST_PATH)
@@ -1,8 +1,15 @@
-from typing import Optional
+from typing import Optional, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
 from workflow.agents.meta_agent import MetaAgent, register
+from workflow.voting import SqlVoter
 from llm.llm_meta import Llm
 from process_data.parser_sql import extract_sql
 from runner.enum_aggretion import Model
+from workflow.context import AgentContext
+
+# concurrent API samples of candidate mode
+_SAMPLE_EXECUTOR = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-sample")
 
 @register()
 class Generator(MetaAgent):
@@ -15,7 +22,37 @@ class Generator(MetaAgent):
         sql: str = extract_sql(result)
         return sql
 
-    def _run(self) -> str | None:
-        llm_instance: Llm = Llm(self.model_info, self._input)
-        result: Optional[str] = llm_instance._run()
-        return self.parse_result(result)
\ No newline at end of file
+    def _run(self, context: AgentContext) -> str | None:
+        llm_instance: Llm = Llm(self.model_info, context.request)
+        if self.model_info.num_candidates > 1 and context.request.db_path is not None:
+            return self.run_candidates(llm_instance, context)
+        with context.timer("llm"):
+            result: Optional[str] = llm_instance._run()
+        context.artifacts["completion"] = result
+        return self.parse_result(result)
+
+    def run_candidates(self, llm_instance: Llm, context: AgentContext) -> Optional[str]:
+        """
+            Self-consistency: draw num_candidates samples, execute distinct SQL concurrently
+            and return the majority result, stop sampling/executing once a majority exists.
+        """
+        n: int = self.model_info.num_candidates
+        voter: SqlVoter = SqlVoter(context.request.db_path, n)  # type: ignore[arg-type]
+        samples: Iterator[Optional[str]] = llm_instance._run_many(n, _SAMPLE_EXECUTOR)
+        try:
+            with context.timer("candidates"):
+                for result in samples:
+                    sql: Optional[str] = self.parse_result(result)
+                    if sql:
+                        voter.submit(sql)
+                    if voter.decided():
+                        break
+                voter.wait()
+            context.artifacts["voting"] = voter.stats()
+            if context.blackboard is not None:
+                context.blackboard.put_results(voter.results())
+            logger.debug(f"{self.model_info.model_name} candidates: {context.artifacts['voting']}")
+            return voter.winner()
+        finally:
+            samples.close()  # type: ignore[attr-defined]
+            voter.close()
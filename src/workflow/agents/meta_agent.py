@@ -4,45 +4,39 @@ import inspect, threading, importlib
 
 from abc import ABCMeta, abstractmethod
 from typing import Type, Dict, Iterable, Callable, Optional
-from runner.enum_aggretion import Model, Request, Response
+from runner.enum_aggretion import Model
+from workflow.context import AgentContext
 
 _REGISTRY: Dict[str, Type[MetaAgent]] = {}
 _LOCK = threading.RLock()
 
 class MetaAgent(metaclass=ABCMeta):
+    """
+        Stateless executor built once and shared by every task: per-task input, output and
+        intermediate state live in the AgentContext passed to _run.
+    """
     __agent_name__: str
     __agent_aliases__: tuple[str, ...] 
     def __init__(self, model_info: Model) -> None:
         self.model_info: Model = model_info
-        self._input: Optional[Request] = None
-        self._output: Optional[Response] = None        
-
-    @property
-    def input(self) -> Optional[Request]:
-        return self._input
-
-    @input.setter
-    def input(self, request: Optional[Request]) -> None:
-        self._input = request
-
-    @property
-    def output(self) -> Optional[Response]:
-        return self._output
-
-    @output.setter
-    def output(self, response: Optional[Response]) -> None:
-        self._output = response
 
     @abstractmethod
-    def _run(self) -> str | None:
+    def _run(self, context: AgentContext) -> str | None:
         pass
 
+def normalize_name(name: str) -> str:
+    """
+        Registry key of an agent name: case and surrounding blanks are ignored.
+    """
+    return name.strip().lower()
+
 def _add(name: str, cls: Type[MetaAgent], *, override: bool):
+    key = normalize_name(name)
     with _LOCK:
-        if not override and name.lower() in _REGISTRY and _REGISTRY[name.lower()] is not cls:
-            exist = _REGISTRY[name.lower()]
+        if not override and key in _REGISTRY and _REGISTRY[key] is not cls:
+            exist = _REGISTRY[key]
             raise ValueError(f"Agent name wrong: '{name}' has binded to {exist.__module__}.{exist.__name__}")
-        _REGISTRY[name.lower()] = cls
+        _REGISTRY[key] = cls
 
 def register(
     name: str | None = None,
@@ -74,4 +68,7 @@ def register(
     return deco
 
 def get_registry() -> Dict[str, Type[MetaAgent]]:
-    return dict(_REGISTRY)
\ No newline at end of file
+    return dict(_REGISTRY)
+
+def lookup(name: str) -> Optional[Type[MetaAgent]]:
+    return _REGISTRY.get(normalize_name(name))
\ No newline at end of file
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-19 14:20
+# @Author  : jwm
+# @File    : selector.py
+# @description: Selector agent, the join node of an agent DAG: picks one upstream candidate SQL by execution voting.
+
+from typing import List, Dict, Optional
+from loguru import logger
+from workflow.agents.meta_agent import MetaAgent, register
+from workflow.voting import SqlVoter
+from runner.enum_aggretion import Model
+from workflow.context import AgentContext
+from workflow.blackboard import Blackboard, sql_key
+
+
+@register()
+class Selector(MetaAgent):
+    """
+        Join node of an agent DAG: picks one SQL among the upstream candidates by execution voting,
+        no LLM call. Ties go to the first upstream node in AGENT_DAG order. Candidates whose results are
+        already on the blackboard (voting generators publish theirs) are not executed again.
+    """
+    def __init__(self, model_info: Model) -> None:
+        super().__init__(model_info)
+
+    def _run(self, context: AgentContext) -> str | None:
+        candidates: List[str] = [sql for sql in context.request.candidates if sql]
+        if len(candidates) <= 1 or context.request.db_path is None:
+            return candidates[0] if candidates else None
+        board: Optional[Blackboard] = context.blackboard
+        if board is not None and all(sql_key(sql) in board for sql in candidates):
+            return self._select_known(context, board, candidates)
+        voter: SqlVoter = SqlVoter(context.request.db_path, len(candidates))
+        try:
+            for sql in candidates:
+                voter.submit(sql)
+            voter.wait()
+            context.artifacts["voting"] = voter.stats()
+            if board is not None:
+                board.put_results(voter.results())
+            logger.debug(f"{self.model_info.model_name} selection: {context.artifacts['voting']}")
+            return voter.winner()
+        finally:
+            voter.close()
+
+    def _select_known(self, context: AgentContext, board: Blackboard, candidates: List[str]) -> str:
+        digests: List[Optional[str]] = [board.peek(sql_key(sql)) for sql in candidates]
+        tally: Dict[str, int] = {}
+        for digest in digests:
+            if digest is not None:
+                tally[digest] = tally.get(digest, 0) + 1
+        context.artifacts["voting"] = {"distinct": len(set(digests)), "executed": 0, "tally": sorted(tally.values(), reverse=True)}
+        if not tally:
+            return candidates[0]
+        best: int = min(range(len(candidates)), key=lambda i: (-tally.get(digests[i], 0), i))  # type: ignore[arg-type]
+        return candidates[best]
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-26 10:40
+# @Author  : jwm
+# @File    : blackboard.py
+# @description: Per-task blackboard of lazily derived, memoised artifacts shared by the agents of a pipeline.
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from sqlite3 import Connection
+from typing import Dict, List, Any, Optional, Callable, Generic, TypeVar, Tuple, Union, Generator
+
+from loguru import logger
+
+from process_data.connection import DB_System, get_readonly_pool
+from runner.enum_aggretion import Task
+from workflow.voting import normalize_sql
+
+T = TypeVar("T")
+
+DB_CACHE_SIZE: int = 256        # db-scoped artifact values kept across tasks
+
+
+class Artifact(Generic[T]):
+    """
+        A named derivation. scope "task": computed at most once per task; scope "db": depends on the
+        database only and is also shared by every task of the same database file.
+    """
+    def __init__(self, name: str, derive: Callable[["Blackboard"], T], scope: str = "task") -> None:
+        if scope not in ("task", "db"):
+            raise ValueError(f"artifact scope must be 'task' or 'db', got {scope}")
+        self.name: str = name
+        self.derive: Callable[["Blackboard"], T] = derive
+        self.scope: str = scope
+
+    def __repr__(self) -> str:
+        return f"Artifact({self.name}, scope={self.scope})"
+
+
+_ARTIFACTS: Dict[str, Artifact] = {}
+
+
+def artifact(name: Optional[str] = None, scope: str = "task") -> Callable[[Callable[["Blackboard"], T]], Artifact[T]]:
+    """
+        @artifact(scope="db")
+        def value_index(board) -> Optional[ValueIndex]: ...
+    """
+    def deco(derive: Callable[["Blackboard"], T]) -> Artifact[T]:
+        handle: Artifact[T] = Artifact(name or derive.__name__, derive, scope)
+        if handle.name in _ARTIFACTS:
+            raise ValueError(f"artifact {handle.name} is already defined")
+        _ARTIFACTS[handle.name] = handle
+        return handle
+    return deco
+
+
+class _DbCache:
+    """
+        LRU of db-scoped values keyed by (database file, artifact), dropped when the file changes.
+        A per-key lock makes concurrent tasks of one database wait for a single derivation.
+    """
+    def __init__(self, size: int) -> None:
+        self.size: int = size
+        self._values: "OrderedDict[Tuple[str, str], Tuple[Tuple[int, int], Any]]" = OrderedDict()
+        self._loading: Dict[Tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, db_path: str, name: str, derive: Callable[[], Any]) -> Tuple[Any, bool]:
+        stat = os.stat(db_path)
+        stamp: Tuple[int, int] = (stat.st_size, stat.st_mtime_ns)
+        key: Tuple[str, str] = (db_path, name)
+        with self._lock:
+            cached = self._values.get(key)
+            if cached is not None and cached[0] == stamp:
+                self._values.move_to_end(key)
+                return cached[1], True
+            loading: threading.Lock = self._loading.setdefault(key, threading.Lock())
+        with loading:
+            with self._lock:
+                cached = self._values.get(key)
+                if cached is not None and cached[0] == stamp:
+                    return cached[1], True
+            value: Any = derive()
+            with self._lock:
+                self._values[key] = (stamp, value)
+                self._values.move_to_end(key)
+                while len(self._values) > self.size:
+                    self._values.popitem(last=False)
+            return value, False
+
+
+_DB_CACHE: _DbCache = _DbCache(int(os.getenv("BLACKBOARD_DB_CACHE_SIZE") or DB_CACHE_SIZE))
+_STATS: Dict[str, Any] = {"derived": 0, "task_hits": 0, "db_hits": 0, "seconds": {}}
+_STATS_LOCK = threading.Lock()
+
+
+class Blackboard:
+    """
+        Shared by the agents (DAG nodes) of one task, see AgentContext.blackboard. get() derives an artifact on
+        first use, later calls (from any node or thread) return the memoised value; put() publishes a value
+        an agent computed itself. Derivations needing sqlite use connection(), as they may run on any DAG thread.
+    """
+    def __init__(self, task: Task, sql_client: DB_System, schema: Any) -> None:
+        self.task: Task = task
+        self.sql_client: DB_System = sql_client
+        self.db_path: str = sql_client.db_path
+        self.schema: Any = schema
+        self._owner: int = threading.get_ident()
+        self._values: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self) -> Generator[Connection, None, None]:
+        """
+            The task's own connection in the task thread, a pooled read-only connection on other threads.
+        """
+        if threading.get_ident() == self._owner:
+            yield self.sql_client.conn
+        else:
+            with get_readonly_pool(self.db_path).connection() as conn:
+                yield conn
+
+    def get(self, handle: Union[Artifact[T], str]) -> T:
+        artifact_: Artifact[T] = _ARTIFACTS[handle] if isinstance(handle, str) else handle
+        with self._lock:
+            if artifact_.name in self._values:
+                _count("task_hits")
+                return self._values[artifact_.name]
+            loading: threading.Lock = self._locks.setdefault(artifact_.name, threading.Lock())
+        with loading:
+            with self._lock:
+                if artifact_.name in self._values:
+                    _count("task_hits")
+                    return self._values[artifact_.name]
+            value: T = self._derive(artifact_)
+            with self._lock:
+                self._values[artifact_.name] = value
+            return value
+
+    def _derive(self, artifact_: Artifact[T]) -> T:
+        begin: float = time.perf_counter()
+        if artifact_.scope == "db":
+            value, hit = _DB_CACHE.get(self.db_path, artifact_.name, lambda: artifact_.derive(self))
+            if hit:
+                _count("db_hits")
+                return value
+        else:
+            value = artifact_.derive(self)
+        with _STATS_LOCK:
+            _STATS["derived"] += 1
+            _STATS["seconds"][artifact_.name] = _STATS["seconds"].get(artifact_.name, 0.0) + time.perf_counter() - begin
+        return value
+
+    def put(self, name: str, value: Any) -> None:
+        with self._lock:
+            self._values[name] = value
+
+    def peek(self, name: str, default: Any = None) -> Any:
+        """
+            Value if already derived or published, never derives.
+        """
+        with self._lock:
+            return self._values.get(name, default)
+
+    def __contains__(self, name: str) -> bool:
+        with self._lock:
+            return name in self._values
+
+    def put_results(self, results: Dict[str, str]) -> None:
+        """
+            Publish result digests an agent computed (SqlVoter.results()), read back with peek(sql_key(sql)),
+            so no other node re-executes them.
+        """
+        with self._lock:
+            for key, digest in results.items():
+                self._values[f"sql_result:{key}"] = digest
+
+
+def sql_key(sql: str) -> str:
+    return f"sql_result:{normalize_sql(sql)}"
+
+
+def _count(key: str) -> None:
+    with _STATS_LOCK:
+        _STATS[key] += 1
+
+
+def blackboard_stats() -> Dict[str, Any]:
+    with _STATS_LOCK:
+        return {
+            "derived": _STATS["derived"],
+            "task_hits": _STATS["task_hits"],
+            "db_hits": _STATS["db_hits"],
+            "seconds": dict(_STATS["seconds"]),
+        }
+
+
+@artifact(scope="db")
+def value_index(board: Blackboard) -> Any:
+    from process_data.value_index import load_value_index
+    return load_value_index(board.db_path)
+
+
+@artifact()
+def prompt_schema(board: Blackboard) -> Any:
+    """
+        Schema embedded in prompts: pruned by the schema-linking index when SCHEMA_LINKING_TOP_K
+        (tables, optional SCHEMA_LINKING_TOP_COLUMNS per table) is set, the full schema otherwise.
+    """
+    top_tables: int = int(os.getenv("SCHEMA_LINKING_TOP_K") or 0)
+    if top_tables <= 0:
+        return board.schema
+    from process_data.schema_linking import link_schema
+    with board.connection() as conn:
+        return link_schema(
+            board.db_path,
+            conn,
+            board.schema,
+            f"{board.task.question} {board.task.evidence}",
+            top_tables,
+            int(os.getenv("SCHEMA_LINKING_TOP_COLUMNS") or 8),
+        )
+
+
+@artifact()
+def matched_values(board: Blackboard) -> List[Dict[str, Any]]:
+    """
+        Database values similar to the literal-looking phrases of the question / evidence, [] without a value index.
+    """
+    from process_data.value_index import candidate_phrases
+    index = board.get(value_index)
+    if index is None:
+        return []
+    matches: List[Dict[str, Any]] = []
+    for phrase in candidate_phrases(f"{board.task.question} {board.task.evidence}"):
+        matches += [{"phrase": phrase, **match} for match in index.lookup(phrase, top_k=3)]
+    return matches
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-25 17:05
+# @Author  : jwm
+# @File    : context.py
+# @description: Per-task state handed to agents, so agent instances can be shared by concurrent tasks.
+
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Generator
+
+from runner.enum_aggretion import Request, Response, Task
+from workflow.blackboard import Blackboard
+
+
+class AgentContext:
+    """
+        Everything one agent run reads and writes; a new context per (task, DAG node), agents keep no per-task state.
+
+        Attributes:
+            request: prompt, database and upstream candidates of the run
+            response: set by the framework once the agent returned
+            artifacts: intermediate results an agent wants to expose (raw completion, voting stats, ...)
+            timings: seconds per named phase, "total" for the whole agent run
+            blackboard: memoised artifacts shared with the other nodes of the task (schema, matched values, ...)
+    """
+    def __init__(self, task: Task, node: str, request: Request, blackboard: Optional[Blackboard] = None) -> None:
+        self.task: Task = task
+        self.node: str = node
+        self.request: Request = request
+        self.response: Optional[Response] = None
+        self.artifacts: Dict[str, Any] = {}
+        self.timings: Dict[str, float] = {}
+        self.blackboard: Optional[Blackboard] = blackboard
+
+    @contextmanager
+    def timer(self, name: str) -> Generator[None, None, None]:
+        begin: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - begin
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-25 14:30
+# @Author  : jwm
+# @File    : dag.py
+# @description: Agent pipelines as a DAG, ready nodes run concurrently on a shared executor.
+
+import os
+import time
+import threading
+from ast import literal_eval
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from functools import lru_cache
+from typing import Dict, List, Optional, Callable, Any, Tuple
+
+from loguru import logger
+from pydantic import BaseModel
+
+from runner.enum_aggretion import Model, Response
+
+DAG_WORKERS: int = 8
+
+
+def node_name(model: Model) -> str:
+    """
+        Name of an agent in the pipeline: Model.node, the agent type when unset.
+    """
+    return model.node or model.corresponding_agent
+
+
+class NodeRun(BaseModel):
+    """
+        Attributes:
+            start: seconds after the pipeline started
+            seconds: run time of the node
+    """
+    node: str
+    response: Response
+    start: float
+    seconds: float
+
+
+class AgentDag:
+    """
+        Nodes are agents (by node name), `edges` maps a node to the nodes whose outputs it consumes.
+        Without edges the nodes form a chain in declaration order, the original sequential pipeline.
+
+        Attributes:
+            order: nodes in a topological order (ties keep declaration order)
+            output: the sink whose response is evaluated, the last declared one when there are several
+    """
+    def __init__(self, nodes: List[str], edges: Optional[Dict[str, List[str]]] = None) -> None:
+        if len(set(nodes)) != len(nodes):
+            raise ValueError(f"duplicated agent nodes {nodes}, give the models distinct `node` names")
+        self.nodes: List[str] = list(nodes)
+        if edges is None:
+            edges = {node: [previous] for previous, node in zip(nodes, nodes[1:])}
+        unknown: List[str] = [name for node, deps in edges.items() for name in [node, *deps] if name not in nodes]
+        if unknown:
+            raise ValueError(f"AGENT_DAG names unknown nodes {sorted(set(unknown))}, bound nodes are {nodes}")
+        self.dependencies: Dict[str, List[str]] = {node: list(edges.get(node, [])) for node in nodes}
+        self.dependents: Dict[str, List[str]] = {node: [] for node in nodes}
+        for node, deps in self.dependencies.items():
+            for dep in deps:
+                self.dependents[dep].append(node)
+        self.order: List[str] = self._toposort()
+        sinks: List[str] = [node for node in nodes if not self.dependents[node]]
+        self.output: str = sinks[-1]
+        if len(sinks) > 1:
+            logger.warning(f"agent DAG has several sinks {sinks}, only {self.output} is evaluated")
+
+    def _toposort(self) -> List[str]:
+        indegree: Dict[str, int] = {node: len(deps) for node, deps in self.dependencies.items()}
+        ready: List[str] = [node for node in self.nodes if indegree[node] == 0]
+        order: List[str] = []
+        while ready:
+            node: str = ready.pop(0)
+            order.append(node)
+            for dependent in self.dependents[node]:
+                indegree[dependent] -= 1
+                if indegree[dependent] == 0:
+                    ready.append(dependent)
+        if len(order) != len(self.nodes):
+            raise ValueError(f"AGENT_DAG has a cycle through {[n for n in self.nodes if n not in order]}")
+        return order
+
+    def run(
+            self,
+            execute: Callable[[str, Dict[str, Response]], Response],
+            executor: ThreadPoolExecutor
+        ) -> Dict[str, NodeRun]:
+        """
+            execute(node, upstream responses) for every node once its dependencies finished. Ready nodes go to
+            `executor`; a node that is the only runnable one runs in the calling thread.
+        """
+        begin: float = time.perf_counter()
+        runs: Dict[str, NodeRun] = {}
+        waiting: Dict[str, int] = {node: len(deps) for node, deps in self.dependencies.items()}
+        ready: List[str] = [node for node in self.order if waiting[node] == 0]
+        running: Dict[Future, str] = {}
+
+        def timed(node: str) -> NodeRun:
+            start: float = time.perf_counter()
+            upstream: Dict[str, Response] = {dep: runs[dep].response for dep in self.dependencies[node]}
+            response: Response = execute(node, upstream)
+            return NodeRun(node=node, response=response, start=start - begin, seconds=time.perf_counter() - start)
+
+        def finish(run: NodeRun) -> None:
+            runs[run.node] = run
+            for dependent in self.dependents[run.node]:
+                waiting[dependent] -= 1
+                if waiting[dependent] == 0:
+                    ready.append(dependent)
+
+        while ready or running:
+            if len(ready) == 1 and not running:
+                finish(timed(ready.pop()))
+                continue
+            while ready:
+                node: str = ready.pop(0)
+                running[executor.submit(timed, node)] = node
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                running.pop(future)
+                finish(future.result())
+        _record(runs, time.perf_counter() - begin)
+        return runs
+
+    def critical_path(self, runs: Dict[str, NodeRun]) -> Tuple[List[str], float]:
+        """
+            Chain of nodes with the longest summed run time, what the pipeline latency is bound by.
+        """
+        best: Dict[str, Tuple[float, List[str]]] = {}
+        for node in self.order:
+            seconds: float = runs[node].seconds if node in runs else 0.0
+            prefix: Tuple[float, List[str]] = max((best[dep] for dep in self.dependencies[node]), default=(0.0, []), key=lambda b: b[0])
+            best[node] = (prefix[0] + seconds, prefix[1] + [node])
+        total, path = max(best.values(), key=lambda b: b[0])
+        return path, total
+
+
+@lru_cache(maxsize=16)
+def _dag(nodes: Tuple[str, ...], config: str) -> AgentDag:
+    edges: Optional[Dict[str, List[str]]] = None
+    if config.strip():
+        parsed: Dict[str, Any] = literal_eval(config)
+        edges = {str(node): [str(dep) for dep in (deps or [])] for node, deps in parsed.items()}
+    return AgentDag(list(nodes), edges)
+
+
+def get_dag(nodes: List[str]) -> AgentDag:
+    """
+        DAG of the bound nodes from AGENT_DAG, e.g. {"selector": ["gen_a", "gen_b"]}; empty for a sequential chain.
+    """
+    return _dag(tuple(nodes), os.getenv("AGENT_DAG") or "")
+
+
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_dag_executor() -> ThreadPoolExecutor:
+    """
+        Shared by every task, sized by DAG_WORKERS.
+    """
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(
+                max_workers=int(os.getenv("DAG_WORKERS") or DAG_WORKERS), thread_name_prefix="agent-dag"
+            )
+        return _EXECUTOR
+
+
+_STATS: Dict[str, Any] = {"pipelines": 0, "wall_seconds": 0.0, "node_seconds": 0.0, "nodes": {}}
+_STATS_LOCK = threading.Lock()
+
+
+def _record(runs: Dict[str, NodeRun], wall: float) -> None:
+    with _STATS_LOCK:
+        _STATS["pipelines"] += 1
+        _STATS["wall_seconds"] += wall
+        for run in runs.values():
+            _STATS["node_seconds"] += run.seconds
+            node: Dict[str, Any] = _STATS["nodes"].setdefault(run.node, {"runs": 0, "failures": 0, "seconds": 0.0})
+            node["runs"] += 1
+            node["failures"] += int(not run.response.status)
+            node["seconds"] += run.seconds
+
+
+def dag_stats() -> Dict[str, Any]:
+    """
+        Per-node run counts / mean seconds, and how much the overlap saved (summed node time / wall time).
+    """
+    with _STATS_LOCK:
+        return {
+            "pipelines": _STATS["pipelines"],
+            "overlap": _STATS["node_seconds"] / _STATS["wall_seconds"] if _STATS["wall_seconds"] else 0.0,
+            "nodes": {
+                name: {"runs": node["runs"], "failures": node["failures"], "mean_seconds": node["seconds"] / node["runs"]}
+                for name, node in _STATS["nodes"].items()
+            },
+        }
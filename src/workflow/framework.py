@@ -7,6 +7,7 @@
 import json
 import sys
 import importlib
+import inspect
 import os
 from typing import List, Optional, Any, Dict, Tuple
 
@@ -15,6 +16,12 @@ from process_data.connection import DB_System
 from process_data.schema_generator import Schema
 from runner.enum_aggretion import Model, Request, Response, Task
 from workflow.agents.meta_agent import MetaAgent
+from workflow.dag import AgentDag, NodeRun, get_dag, get_dag_executor, node_name
+from workflow.context import AgentContext
+from workflow.blackboard import Blackboard, matched_values, prompt_schema as prompt_schema_artifact
+
+VALUE_GROUNDING_MAX: int = 10
+
 
 class FrameWork:
     def __init__(self, args: Any, sql_client: DB_System, schema, task: Task, agents: Optional[List[MetaAgent]]) -> None:
@@ -23,6 +30,14 @@ class FrameWork:
         self.schema = schema
         self.task: Task = task
         self.agents: Optional[List[MetaAgent]] = agents
+        self.blackboard: Blackboard = Blackboard(task, sql_client, schema)
+        self.contexts: Dict[str, AgentContext] = {}       # node -> context of this task's run
+
+    def prompt_schema(self) -> Any:
+        """
+            Schema embedded in prompts, see workflow.blackboard.prompt_schema.
+        """
+        return self.blackboard.get(prompt_schema_artifact)
 
     def get_template(self, template_name: str) -> str:
         """
@@ -30,41 +45,78 @@ class FrameWork:
         """
         template_module = importlib.import_module("prompt_template." + template_name)
         template_func = getattr(template_module, template_name)
-        template: str = template_func(self.task, self.schema)
+        if "values" in inspect.signature(template_func).parameters:
+            return template_func(self.task, self.prompt_schema(), self.grounding_values())
+        template: str = template_func(self.task, self.prompt_schema())
         return template
 
-    # need modify
+    def grounding_values(self) -> str:
+        """
+            Matched database values for templates taking `values`, at most VALUE_GROUNDING_MAX lines (0 disables),
+            empty without a value index (process.py builds it).
+        """
+        limit: int = int(os.getenv("VALUE_GROUNDING_MAX") or VALUE_GROUNDING_MAX)
+        if limit <= 0:
+            return ""
+        from process_data.value_index import format_matched_values
+        return format_matched_values(self.blackboard.get(matched_values), limit)
+
+    def run_agent(self, agent: MetaAgent, context: AgentContext, upstream: Dict[str, Response]) -> Response:
+        """
+            One DAG node: the upstream results become the request's candidates.
+        """
+        context.request.candidates = [r.result for r in upstream.values() if r.status and r.result]
+        status: bool = True
+        result: Optional[str] = None
+        try:
+            with context.timer("total"):
+                result = agent._run(context)
+        except Exception as e:
+            # a failed LLM call (retries exhausted, deadline) fails this node only
+            logger.error(f"Agent {context.node} failed on task {self.task.question_id}: {e}")
+            status = False
+        context.response = Response(**{
+            "status": status,
+            "result": result
+        })
+        return context.response
+
     def _run(self) -> Optional[Response]:
-        if self.agents is None:
+        if not self.agents:
             logger.warning(f"Agent list is empty!")
             return None
+
+        nodes: Dict[str, MetaAgent] = {node_name(agent.model_info): agent for agent in self.agents}
+        dag: AgentDag = get_dag([node_name(agent.model_info) for agent in self.agents])
+        # prompts are rendered here, the task's sqlite connection belongs to this thread
+        self.contexts = {
+            node: AgentContext(self.task, node, Request(**{
+                "template": self.get_template(agent.model_info.template_name) if agent.model_info.template_name else "",
+                "db_path": self.sql_client.db_path,
+            }), self.blackboard)
+            for node, agent in nodes.items()
+        }
+        runs: Dict[str, NodeRun] = dag.run(
+            lambda node, upstream: self.run_agent(nodes[node], self.contexts[node], upstream),
+            get_dag_executor(),
+        )
+        if len(runs) > 1:
+            path, seconds = dag.critical_path(runs)
+            logger.debug(f"task {self.task.question_id} agents: {' -> '.join(path)} critical path {seconds:.2f}s, "
+                         f"{sum(run.seconds for run in runs.values()):.2f}s summed")
+
+        output: AgentContext = self.contexts[dag.output]
+        if output.response is not None:
+            from runner.evaluate import Evaluator
+            evaluator: Evaluator = Evaluator(
+                self.schema,
+                self.task, 
+                output.response.result, 
+                self.sql_client, 
+                nodes[dag.output].model_info.output_name
+            )
+            evaluator._run()
+            return output.response
         else:
-            for agent in self.agents:
-                request: Request = Request(**{
-                    "template": self.get_template(agent.model_info.template_name),
-                })
-                agent.input = request
-                result: Optional[str] = agent._run()
-                response: Response = Response(**{
-                    "status": True,
-                    "result": result
-                })
-                agent.output = response
-            
-            last_agent = self.agents[-1]
-            
-            if last_agent.output is not None:
-                from runner.evaluate import Evaluator
-                evaluator: Evaluator = Evaluator(
-                    self.schema,
-                    self.task, 
-                    last_agent.output.result, 
-                    self.sql_client, 
-                    last_agent.model_info.output_name
-                )
-                evaluator._run()
-                return last_agent.output
-            else:
-                logger.warning("Last agent output is None!")
-                return None
-        
\ No newline at end of file
+            logger.warning("Output agent output is None!")
+            return None
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-19 15:10
+# @Author  : jwm
+# @File    : voting.py
+# @description: Execution-based self-consistency voting over SQL candidates.
+
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from sqlite3 import Connection
+from typing import Dict, List, Optional, Any
+
+from loguru import logger
+
+from process_data.connection import ReadOnlyPool, get_readonly_pool
+from process_data.fingerprint import FLOAT_DIGITS
+from process_data.preflight import Preflight, check_sql, expensive_timeout
+from runner.evaluate import execute_fingerprint
+
+EXECUTION_TIMEOUT: float = 30.0
+
+# shared by every task, candidate SQL is I/O and sqlite bound (the GIL is released while stepping)
+_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="sql-vote")
+
+_QUOTED = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`)")
+
+
+def normalize_sql(sql: str) -> str:
+    """
+        Dedup key of a candidate: whitespace collapsed, trailing ';' dropped, lower case outside quotes.
+    """
+    parts: List[str] = _QUOTED.split(sql.strip().rstrip(";").strip())
+    return "".join(
+        part if i % 2 else re.sub(r"\s+", " ", part).lower()
+        for i, part in enumerate(parts)
+    ).strip()
+
+
+class _Candidate:
+    def __init__(self, sql: str, order: int) -> None:
+        self.sql: str = sql
+        self.order: int = order
+        self.votes: int = 1
+        self.fingerprint: Optional[str] = None
+        self.done: bool = False
+        self.future: Optional[Future] = None
+        self.conn: Optional[Connection] = None
+
+
+class SqlVoter:
+    """
+        Deduplicates candidates by normalized SQL, executes the distinct ones concurrently
+        on a pooled read-only connection, and stops once one result fingerprint holds a
+        majority of the `total` samples.
+    """
+    def __init__(self, db_path: str, total: int, timeout: float = EXECUTION_TIMEOUT, pool: Optional[ReadOnlyPool] = None) -> None:
+        self.db_path: str = db_path
+        self.total: int = total
+        self.timeout: float = timeout
+        self.pool: ReadOnlyPool = pool or get_readonly_pool(db_path)
+        self._candidates: Dict[str, _Candidate] = {}
+        self._cond = threading.Condition()
+        self._closed: bool = False
+
+    def submit(self, sql: str) -> None:
+        key: str = normalize_sql(sql)
+        with self._cond:
+            candidate: Optional[_Candidate] = self._candidates.get(key)
+            if candidate is not None:
+                candidate.votes += 1
+                self._cond.notify_all()
+                return
+            candidate = _Candidate(sql, len(self._candidates))
+            self._candidates[key] = candidate
+            if self._closed:
+                return
+            candidate.future = _EXECUTOR.submit(self._execute, candidate)
+
+    def _execute(self, candidate: _Candidate) -> None:
+        fingerprint: Optional[str] = None
+        try:
+            with self.pool.connection() as conn:
+                with self._cond:
+                    if self._closed:
+                        return
+                    candidate.conn = conn
+                try:
+                    # invalid candidates are dropped without running, expensive plans get a shorter budget
+                    check: Preflight = check_sql(conn, self.db_path, candidate.sql)
+                    if check.ok:
+                        budget: Optional[float] = expensive_timeout() if check.expensive else None
+                        timeout: float = min(self.timeout, budget) if budget is not None else self.timeout
+                        # order-insensitive and rounded: candidates differing only in row order or float noise vote together
+                        fingerprint = execute_fingerprint(conn, candidate.sql, timeout, ordered=False, float_digits=FLOAT_DIGITS).digest
+                finally:
+                    with self._cond:
+                        candidate.conn = None
+        except Exception as e:
+            logger.debug(f"Candidate failed to execute: {e}")
+        finally:
+            with self._cond:
+                candidate.fingerprint = fingerprint
+                candidate.done = True
+                self._cond.notify_all()
+
+    def _tally(self) -> Dict[str, int]:
+        tally: Dict[str, int] = {}
+        for candidate in self._candidates.values():
+            if candidate.fingerprint is not None:
+                tally[candidate.fingerprint] = tally.get(candidate.fingerprint, 0) + candidate.votes
+        return tally
+
+    def decided(self) -> bool:
+        with self._cond:
+            return any(votes > self.total // 2 for votes in self._tally().values())
+
+    def wait(self) -> None:
+        """
+            Block until a majority is reached or every submitted candidate finished.
+        """
+        with self._cond:
+            self._cond.wait_for(
+                lambda: any(votes > self.total // 2 for votes in self._tally().values())
+                or all(c.done or c.future is None for c in self._candidates.values())
+            )
+
+    def winner(self) -> Optional[str]:
+        """
+            SQL of the most voted fingerprint, ties go to the earliest candidate.
+            Falls back to the first candidate when nothing executed successfully.
+        """
+        with self._cond:
+            if not self._candidates:
+                return None
+            tally: Dict[str, int] = self._tally()
+            executed: List[_Candidate] = [c for c in self._candidates.values() if c.fingerprint is not None]
+            if not executed:
+                return min(self._candidates.values(), key=lambda c: c.order).sql
+            best: _Candidate = min(executed, key=lambda c: (-tally[c.fingerprint], -c.votes, c.order))  # type: ignore[index]
+            return best.sql
+
+    def close(self) -> None:
+        """
+            Cancel candidates not started yet and interrupt the ones still running.
+        """
+        with self._cond:
+            self._closed = True
+            for candidate in self._candidates.values():
+                if candidate.future is not None:
+                    candidate.future.cancel()
+                if candidate.conn is not None:
+                    candidate.conn.interrupt()
+
+    def results(self) -> Dict[str, str]:
+        """
+            normalized SQL -> result digest of the candidates that executed successfully.
+        """
+        with self._cond:
+            return {key: c.fingerprint for key, c in self._candidates.items() if c.fingerprint is not None}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "distinct": len(self._candidates),
+                "executed": sum(c.done for c in self._candidates.values()),
+                "tally": sorted(self._tally().values(), reverse=True),
+            }
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-27 10:00
+# @Author  : jwm
+# @File    : conftest.py
+# @description: Modules import relative to src/, as when run from run/*.sh.
+
+import os
+import sys
+
+SRC: str = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-27 10:10
+# @Author  : jwm
+# @File    : test_fingerprint.py
+# @description: Float handling of result fingerprints: exact for scoring, rounded only on request.
+
+from process_data.fingerprint import FLOAT_DIGITS, fingerprint_rows
+from runner.evaluate import compare_results
+
+
+def test_scoring_keeps_floats_exact():
+    assert not compare_results([(0.1 + 0.2,)], [(0.3,)])
+    assert compare_results([(1, 2.0, True)], [(1.0, 2, 1)])
+
+
+def test_rounding_is_opt_in():
+    noisy = fingerprint_rows([(0.1 + 0.2,)], float_digits=FLOAT_DIGITS)
+    assert noisy.digest == fingerprint_rows([(0.3,)], float_digits=FLOAT_DIGITS).digest
+    assert fingerprint_rows([(0.1 + 0.2,)]).digest != fingerprint_rows([(0.3,)]).digest
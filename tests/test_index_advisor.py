@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-27 14:30
+# @Author  : jwm
+# @File    : test_index_advisor.py
+# @description: Query plans are matched against whole advisor index names.
+
+import sqlite3
+
+from process_data.index_advisor import _plan_indexes
+
+
+def test_plan_matches_whole_index_names():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (a INTEGER, b INTEGER)")
+    conn.execute("CREATE INDEX advisor_t_1 ON t (b)")
+    conn.execute("CREATE INDEX advisor_t_12 ON t (a)")
+    names = {"advisor_t_1": None, "advisor_t_12": None}
+    assert _plan_indexes(conn, "SELECT a FROM t WHERE a = 3", names) == {"advisor_t_12"}
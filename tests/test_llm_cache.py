@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-27 15:10
+# @Author  : jwm
+# @File    : test_llm_cache.py
+# @description: read_only LLM caches never change the cache file and treat a missing table as a miss.
+
+import sqlite3
+
+from llm.llm_cache import LlmCache
+
+
+def test_read_only_without_table_is_a_miss(tmp_path):
+    path = str(tmp_path / "empty.sqlite")
+    sqlite3.connect(path).close()
+    cache = LlmCache(path, mode="read_only")
+    assert cache.get("key") is None
+    assert cache.stats()["misses"] == 1
+    cache.close()
+
+
+def test_read_only_serves_hits_without_wal(tmp_path):
+    path = str(tmp_path / "llm_cache.sqlite")
+    writer = LlmCache(path)
+    writer.put("key", "model", "SELECT 1")
+    writer.close()
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=DELETE")
+    conn.close()
+
+    cache = LlmCache(path, mode="read_only")
+    assert cache.get("key") == "SELECT 1"
+    cache.close()
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    conn.close()
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-27 14:00
+# @Author  : jwm
+# @File    : test_llm_meta.py
+# @description: A local model requested by concurrent tasks is loaded once.
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import llm.llm_meta as llm_meta
+
+
+def test_concurrent_local_model_loads_once(monkeypatch):
+    loads = []
+    lock = threading.Lock()
+
+    def load(model_path):
+        with lock:
+            loads.append(model_path)
+        time.sleep(0.2)
+        return object(), object()
+
+    monkeypatch.setattr(llm_meta, "_load_local_model", load)
+    monkeypatch.setattr(llm_meta, "_LOCAL_MODELS", {})
+    monkeypatch.setattr(llm_meta, "_LOCAL_LOADING", {})
+    paths = ["/models/a", "/models/b", "/models/c"] * 4
+    with ThreadPoolExecutor(max_workers=len(paths)) as pool:
+        models = list(pool.map(llm_meta._local_model, paths))
+    assert sorted(loads) == ["/models/a", "/models/b", "/models/c"]
+    assert all(model is models[i % 3] for i, model in enumerate(models))
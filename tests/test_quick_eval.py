@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-27 13:30
+# @Author  : jwm
+# @File    : test_quick_eval.py
+# @description: Quick scoring accepts agreements on the downsampled copy, the full database decides the rest.
+
+import sqlite3
+
+from process_data.downsample import build_downsampled
+from runner.rescore import score_database
+
+GOLD: str = "SELECT name FROM t WHERE score = (SELECT MAX(score) FROM t)"
+
+
+def _database(path: str) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT, score INTEGER)")
+    # a single top row, every other row ties
+    conn.executemany("INSERT INTO t VALUES (?, ?, ?)", [(i, f"n{i}", 100 if i == 1234 else 1) for i in range(2000)])
+    conn.commit()
+    conn.close()
+
+
+def _item(pred_sql: str) -> dict:
+    return {"question_id": 0, "db_id": "t", "difficulty": None, "gold_sql": GOLD, "pred_sql": pred_sql}
+
+
+def test_sample_disagreement_is_decided_on_full_database(tmp_path, monkeypatch):
+    monkeypatch.setenv("ARTIFACT_CACHE_DIR", str(tmp_path / "cache"))
+    db_path = str(tmp_path / "t.sqlite")
+    _database(db_path)
+    sample = sqlite3.connect(build_downsampled(db_path, max_rows=20))
+    assert sample.execute("SELECT COUNT(*) FROM t WHERE score = 100").fetchone()[0] == 0
+    sample.close()
+
+    [result] = score_database(db_path, [_item("SELECT name FROM t ORDER BY score DESC LIMIT 1")], 30.0, quick=True)
+    assert result["accuracy"] and result["scored_on"] == "full"
+
+    [result] = score_database(db_path, [_item(GOLD)], 30.0, quick=True)
+    assert result["accuracy"] and result["scored_on"] == "sample"
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-27 10:00
+# @Author  : jwm
+# @File    : test_schema_generator.py
+# @description: Schema generators: M_Schema lookup behind replica connections, DDL schema table order.
+
+import json
+import os
+import sqlite3
+
+from process_data.replica import ReplicaManager
+from process_data.schema_generator import ddl_schema, m_schema
+
+
+def _database(path: str) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, total REAL)")
+    conn.commit()
+    conn.close()
+
+
+def test_m_schema_on_replica_connection(tmp_path, monkeypatch):
+    schema_dir = tmp_path / "data" / "m_schema"
+    schema_dir.mkdir(parents=True)
+    # another database's file sorts first, an unresolved path ('') would match it
+    (schema_dir / "airline.json").write_text(json.dumps({"db_id": "airline", "schema": "", "tables": ["flights"]}))
+    (schema_dir / "shop.json").write_text(json.dumps({"db_id": "shop", "schema": "", "tables": ["orders"]}))
+    work = tmp_path / "work"
+    work.mkdir()
+    monkeypatch.chdir(work)
+    listdir = os.listdir
+    monkeypatch.setattr(os, "listdir", lambda path: sorted(listdir(path)))
+
+    db_path = str(tmp_path / "shop.sqlite")
+    _database(db_path)
+    replicas = ReplicaManager(budget=1 << 24)
+    conn = replicas.connect(db_path)
+    assert conn is not None
+    assert conn.execute("PRAGMA database_list").fetchall()[0][2] == ""
+    try:
+        assert m_schema(conn) == {"db_id": "shop", "tables": ["orders"]}
+    finally:
+        conn.close()
+
+
+def test_m_schema_without_database_file(tmp_path, monkeypatch):
+    schema_dir = tmp_path / "data" / "m_schema"
+    schema_dir.mkdir(parents=True)
+    (schema_dir / "airline.json").write_text(json.dumps({"db_id": "airline", "schema": ""}))
+    (tmp_path / "work").mkdir()
+    monkeypatch.chdir(tmp_path / "work")
+    assert m_schema(sqlite3.connect(":memory:")) == {}
+
+
+def test_ddl_schema_keeps_creation_order(tmp_path, monkeypatch):
+    monkeypatch.setenv("ARTIFACT_CACHE_DIR", str(tmp_path / "cache"))
+    db_path = str(tmp_path / "zoo.sqlite")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE Zebra (Id INTEGER, b TEXT, a TEXT)")
+    conn.execute("CREATE TABLE ape (id INTEGER)")
+    conn.commit()
+    try:
+        assert list(ddl_schema(conn).items()) == [("zebra", ["id", "b", "a"]), ("ape", ["id"])]
+    finally:
+        conn.close()
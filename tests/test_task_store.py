@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-27 10:40
+# @Author  : jwm
+# @File    : test_task_store.py
+# @description: TaskStore rejects datasets whose question_ids repeat.
+
+import pytest
+
+from runner.task_store import TaskStore
+
+
+def _row(question_id: int) -> dict:
+    return {"question_id": question_id, "db_id": "shop", "question": f"q{question_id}", "evidence": ""}
+
+
+def test_duplicate_question_id_raises():
+    with pytest.raises(ValueError, match="question_id 3"):
+        TaskStore.from_rows([_row(3), _row(1), _row(3)])
+
+
+def test_out_of_order_ids_resolve():
+    store = TaskStore.from_rows([_row(5), _row(2), _row(9)])
+    assert store.get(2).question == "q2"
+    assert [task.question_id for task in store] == [5, 2, 9]
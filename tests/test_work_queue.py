@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# @Time    : 2026-10-27 11:20
+# @Author  : jwm
+# @File    : test_work_queue.py
+# @description: Several worker processes share one WorkQueue; a killed lease holder's tasks are delivered again.
+
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+
+from runner.work_queue import LeaseKeeper, WorkQueue, merge_shards, shard_name, _read_shard
+
+TASKS: int = 12
+LEASE: float = 1.0
+WORKERS = ["host-a:1", "host b/2", "host@c#3"]
+
+
+def _append(result_root: str, worker: str, question_id: int, sql: str) -> None:
+    path: str = os.path.join(result_root, "run", f"original_result.{shard_name(worker)}.json")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"question_id": question_id, "pred_sql": sql, "worker": worker}) + ",\n")
+
+
+def _doomed(queue_path: str, result_root: str, leased) -> None:
+    # leases two tasks, writes a result it never completes, then hangs until killed
+    queue: WorkQueue = WorkQueue(queue_path, lease_seconds=LEASE)
+    ids = queue.lease("0-doomed", 2)
+    _append(result_root, "0-doomed", ids[0], "stale")
+    leased.send(ids)
+    time.sleep(60)
+
+
+def _worker(queue_path: str, result_root: str, worker: str) -> None:
+    queue: WorkQueue = WorkQueue(queue_path, lease_seconds=LEASE)
+    keeper: LeaseKeeper = LeaseKeeper(queue, worker)
+    keeper.start()
+    try:
+        while not queue.finished():
+            ids = queue.lease(worker, 1)
+            if not ids:
+                time.sleep(0.05)
+                continue
+            keeper.hold(ids[0])
+            _append(result_root, worker, ids[0], f"SELECT {ids[0]}")
+            queue.complete(worker, ids[0])
+            keeper.release(ids[0])
+    finally:
+        keeper.stop()
+
+
+def test_killed_lease_holder_is_redelivered_and_merged(tmp_path):
+    queue_path: str = str(tmp_path / "queue.db")
+    result_root: str = str(tmp_path / "result")
+    os.makedirs(os.path.join(result_root, "run"))
+    WorkQueue(queue_path, lease_seconds=LEASE).enqueue(range(TASKS))
+
+    ctx = multiprocessing.get_context("fork")
+    receive, send = ctx.Pipe(duplex=False)
+    doomed = ctx.Process(target=_doomed, args=(queue_path, result_root, send))
+    doomed.start()
+    assert receive.poll(30)
+    orphaned = receive.recv()
+    doomed.kill()
+    doomed.join()
+
+    workers = [ctx.Process(target=_worker, args=(queue_path, result_root, worker)) for worker in WORKERS]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(60)
+        assert process.exitcode == 0
+
+    queue: WorkQueue = WorkQueue(queue_path, lease_seconds=LEASE)
+    assert queue.counts() == {"done": TASKS}
+    with sqlite3.connect(queue_path) as conn:
+        attempts = dict(conn.execute("SELECT question_id, attempts FROM tasks"))
+    assert all(attempts[qid] == 2 for qid in orphaned)
+    assert all(attempts[qid] == 1 for qid in range(TASKS) if qid not in orphaned)
+
+    # the killed worker's shard sorts first, the credited (sanitised) worker must still win
+    assert merge_shards(result_root, queue) == {"run": TASKS}
+    merged = {r["question_id"]: r for r in _read_shard(os.path.join(result_root, "run", "original_result.json"))}
+    credited = queue.done_by()
+    assert sorted(merged) == list(range(TASKS))
+    assert all(merged[qid]["worker"] == credited[qid] for qid in merged)
+    assert all(r["pred_sql"] != "stale" for r in merged.values())